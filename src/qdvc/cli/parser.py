@@ -6,11 +6,11 @@ import sys
 
 from . import QdvcParserError
 
-from qdvc.commands import add, init, query, commit, checkout
+from qdvc.commands import add, cache, diff, index, init, ls_queries, query, commit, checkout
 
 logger = logging.getLogger(__name__)
 
-COMMANDS = [init, add, query, commit, checkout]
+COMMANDS = [init, add, query, commit, checkout, diff, ls_queries, cache, index]
 
 
 def _find_parser(parser, cmd_cls):
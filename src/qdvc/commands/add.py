@@ -9,7 +9,10 @@ logger = logging.getLogger(__name__)
 
 class CmdAdd(CmdBase):
     def run(self):
+        from_file = "-" if self.args.from_stdin else self.args.from_file
         try:
+            if not self.args.targets and not from_file:
+                raise Exception("Please specify the files to add, as targets or with '--from-file'.")
             self.repo.add(
                 self.args.targets,
                 recursive=self.args.recursive,
@@ -22,6 +25,9 @@ class CmdAdd(CmdBase):
                 remote=self.args.remote,
                 to_remote=self.args.to_remote,
                 jobs=self.args.jobs,
+                chunk_size=self.args.chunk_size,
+                from_file=from_file,
+                extractors=self.args.extractors,
             )
 
         except Exception:
@@ -93,18 +99,54 @@ def add_parser(subparsers, parent_parser):
         "--jobs",
         type=int,
         help=(
-            "Only used along with '--to-remote'. "
             "Number of jobs to run simultaneously "
-            "when pushing data to remote."
-            "The default value is 4 * cpu_count(). "
+            "when pushing data to remote with '--to-remote', "
+            "or when hashing files with '--chunk-size'. "
+            "The default value is 4 * cpu_count() when pushing, cpu_count() when hashing. "
         ),
         metavar="<number>",
     )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        help=(
+            "Expand the targets into files and add them by chunks of this size, hashing them in parallel. "
+            "Each chunk is staged as soon as it is added, "
+            "and files already up to date in the pool are skipped, so that an interrupted ingest can be resumed."
+        ),
+        metavar="<number>",
+    )
+    parser.add_argument(
+        "--extractor",
+        dest="extractors",
+        action="append",
+        help=(
+            "Metadata extractor run on the files added, built-in (size, mtime, image_size, exif_datetime) "
+            "or given as 'module:function'. Can be repeated. Defaults to the extractors of the 'metadata' config. "
+            "Extractors given here also run on the files already up to date in the pool, replacing their metadata."
+        ),
+        metavar="<name>",
+    )
     parser.add_argument(
         "--desc",
         type=str,
         metavar="<text>",
         help=("User description of the data (optional). " "This doesn't affect any DVC operations."),
     )
-    parser.add_argument("targets", nargs="+", help="Input files/directories to add.").complete = completion.FILE
+    from_group = parser.add_mutually_exclusive_group()
+    from_group.add_argument(
+        "--from-file",
+        help=(
+            "Add the files listed in this newline-delimited file instead of targets. "
+            "The list is consumed by chunks, and an interrupted ingest resumes after the last chunk added."
+        ),
+        metavar="<path>",
+    ).complete = completion.FILE
+    from_group.add_argument(
+        "--from-stdin",
+        action="store_true",
+        default=False,
+        help="Same as '--from-file' but reads the newline-delimited list of files from the standard input.",
+    )
+    parser.add_argument("targets", nargs="*", help="Input files/directories to add.").complete = completion.FILE
     parser.set_defaults(func=CmdAdd)
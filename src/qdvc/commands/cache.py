@@ -0,0 +1,45 @@
+import argparse
+import logging
+
+from qdvc.cli.command import CmdBase
+from qdvc.cli.utils import fix_subparsers
+
+logger = logging.getLogger(__name__)
+
+
+class CmdCacheClear(CmdBase):
+    def run(self):
+        try:
+            self.repo.clear_cache()
+
+        except Exception:
+            logger.exception("")
+            return 1
+        return 0
+
+
+def add_parser(subparsers, parent_parser):
+    CACHE_HELP = "Manage the cache of filter results"
+
+    parser = subparsers.add_parser(
+        "cache",
+        parents=[parent_parser],
+        description=CACHE_HELP,
+        help=CACHE_HELP,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    cache_subparsers = parser.add_subparsers(
+        dest="cmd",
+        help="Use `qdvc cache CMD --help` for command-specific help.",
+    )
+    fix_subparsers(cache_subparsers)
+
+    CLEAR_HELP = "Removes all the cached filter results"
+    clear_parser = cache_subparsers.add_parser(
+        "clear",
+        parents=[parent_parser],
+        description=CLEAR_HELP,
+        help=CLEAR_HELP,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    clear_parser.set_defaults(func=CmdCacheClear)
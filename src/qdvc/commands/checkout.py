@@ -1,6 +1,7 @@
 import argparse
 import logging
 from qdvc.cli.command import CmdBase
+from qdvc.repo.sampling import parse_shard
 
 
 logger = logging.getLogger(__name__)
@@ -9,11 +10,51 @@ logger = logging.getLogger(__name__)
 class CmdCheckout(CmdBase):
     def run(self):
         try:
-            self.repo.checkout(
-                self.args.query_name[0],
-                self.args.data_version[0],
-                self.args.download_files,
+            options = dict(
+                jobs=self.args.jobs,
+                batch_size=self.args.batch_size,
+                incremental=self.args.incremental is not False,
+                use_cache=self.args.cache,
+                download_jobs=self.args.download_jobs,
+                sample=self.args.sample,
+                fraction=self.args.fraction,
+                seed=self.args.seed,
+                shard=parse_shard(self.args.shard) if self.args.shard else None,
+                sparse=self.args.sparse,
             )
+            if self.args.all_queries and (self.args.sample is not None or self.args.fraction is not None):
+                raise Exception("Samples cannot be checked out with '--all-queries'.")
+            if self.args.all_queries and (self.args.download_files or self.args.shard or self.args.sparse):
+                raise Exception("'--all-queries' leaves the working tree untouched, files cannot be downloaded.")
+            if self.args.all_queries and self.args.incremental:
+                raise Exception("Queries cannot be checked out incrementally with '--all-queries'.")
+            if self.args.all_queries:
+                # Without query name, the first positional argument is a version
+                for version in self.args.query_name + self.args.data_version:
+                    self.repo.checkout_all_queries(
+                        version, jobs=self.args.jobs, batch_size=self.args.batch_size, use_cache=self.args.cache
+                    )
+            elif not self.args.data_version:
+                raise Exception("Please specify the version of the data to checkout.")
+            elif len(self.args.data_version) == 1:
+                self.repo.checkout(
+                    self.args.query_name[0],
+                    self.args.data_version[0],
+                    self.args.download_files,
+                    worktree=self.args.worktree,
+                    **options,
+                )
+            elif self.args.worktree:
+                self.repo.checkout_worktrees(
+                    self.args.query_name[0],
+                    self.args.data_version,
+                    self.args.download_files,
+                    worktree_dir=self.args.worktree_dir,
+                    **options,
+                )
+            else:
+                for version in self.args.data_version:
+                    self.repo.checkout(self.args.query_name[0], version, False, worktree=False, **options)
 
         except Exception:
             logger.exception("")
@@ -32,10 +73,122 @@ def add_parser(subparsers, parent_parser):
         formatter_class=argparse.RawDescriptionHelpFormatter,
     )
     parser.add_argument("query_name", nargs=1, help="Name of the already created query")
-    parser.add_argument("data_version", nargs=1, help="Version tag or hash on main branch")
+    parser.add_argument(
+        "data_version",
+        nargs="*",
+        help="Version tag or hash on main branch. Several versions are checked out side by side in git worktrees.",
+    )
     parser.add_argument(
         "--download_files",
         action=argparse.BooleanOptionalAction,
         help="Option to download the files after filtering them",
     )
+    parser.add_argument(
+        "--download-jobs",
+        type=int,
+        help=(
+            "Only used along with '--download_files'. "
+            "Number of jobs to run simultaneously when fetching data from the remote. "
+            "When a single version is checked out in the working tree, files are downloaded while the filter is "
+            "still running."
+        ),
+        metavar="<number>",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        help=(
+            "Number of processes evaluating the filter simultaneously. "
+            "Filters setting `FORK_SAFE = False` are always evaluated in a single process."
+        ),
+        metavar="<number>",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        help=(
+            "Number of files given at once to `Query.filter_batch`, or to each worker process. "
+            "Defaults to the `checkout.batch_size` config option."
+        ),
+        metavar="<number>",
+    )
+    parser.add_argument(
+        "--incremental",
+        action=argparse.BooleanOptionalAction,
+        help=(
+            "Reuse the closest already checked out version of the query, "
+            "and only filter the files that changed since that version. On by default, except with '--all-queries'."
+        ),
+    )
+    parser.add_argument(
+        "--cache",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="Reuse the filter decisions cached by previous checkouts, and cache the new ones.",
+    )
+    parser.add_argument(
+        "--worktree",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help=(
+            "With --no-worktree, only creates the query branch from the git objects, "
+            "without touching the working tree or the index."
+        ),
+    )
+    parser.add_argument(
+        "--sparse",
+        action=argparse.BooleanOptionalAction,
+        help=(
+            "Only check out the files of the query result, .qdvc/, .dvc/ and the files at the root of the repo, "
+            "leaving the .data/ pool in the git objects. Defaults to the `checkout.sparse` config option, false."
+        ),
+    )
+    parser.add_argument(
+        "--all-queries",
+        action="store_true",
+        default=False,
+        help=(
+            "Creates the branches of all the queries for the given versions, in a single pass over the pool. "
+            "The query name is then omitted, and the working tree is left untouched: "
+            "files cannot be downloaded, and the results are not built incrementally."
+        ),
+    )
+    parser.add_argument(
+        "--sample",
+        type=int,
+        help=(
+            "Only check out a deterministic sample of at most this number of the files accepted by the query, "
+            "on the query/<query>/<version>+sample-<N>-seed-<S> branch. "
+            "Only the sampled files are added to the query branch and downloaded."
+        ),
+        metavar="<number>",
+    )
+    parser.add_argument(
+        "--fraction",
+        type=float,
+        help="Only check out a deterministic sample of this fraction, between 0 and 1, of the files accepted.",
+        metavar="<fraction>",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Seed of the sample taken with '--sample' or '--fraction'. The same seed gives the same sample.",
+        metavar="<number>",
+    )
+    parser.add_argument(
+        "--shard",
+        help=(
+            "Only used along with '--download_files'. "
+            "Download only the i-th of n disjoint shares of the query result, e.g. 0/16 on the first of 16 nodes. "
+            "The query branch is the same on every node."
+        ),
+        metavar="<i/n>",
+    )
+    parser.add_argument(
+        "--worktree-dir",
+        help="Directory of the worktrees created when checking out several versions. Defaults to .qdvc/worktrees.",
+        metavar="<path>",
+    )
     parser.set_defaults(func=CmdCheckout)
@@ -0,0 +1,51 @@
+import argparse
+import logging
+
+from qdvc.cli.command import CmdBase
+
+logger = logging.getLogger(__name__)
+
+
+class CmdDiff(CmdBase):
+    def run(self):
+        from dvc.ui import ui
+
+        try:
+            counts = {"A": 0, "D": 0, "M": 0}
+            size_delta = 0
+            for change in self.repo.diff(self.args.query_name, self.args.old_version, self.args.new_version):
+                counts[change.status] += 1
+                size_delta += change.size_delta
+                if not self.args.stat:
+                    ui.write(f"{change.status}\t{change.path}\t{change.size_delta:+d}")
+            ui.write(
+                f"{counts['A']} added, {counts['D']} removed, {counts['M']} modified, {size_delta:+d} bytes "
+                f"from {self.args.old_version} to {self.args.new_version}"
+            )
+
+        except Exception:
+            logger.exception("")
+            return 1
+        return 0
+
+
+def add_parser(subparsers, parent_parser):
+    DIFF_HELP = "Shows the files added, removed or modified in the result of a query between two versions"
+
+    parser = subparsers.add_parser(
+        "diff",
+        parents=[parent_parser],
+        description=DIFF_HELP,
+        help=DIFF_HELP,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("query_name", help="Name of the query")
+    parser.add_argument("old_version", help="Version of the data of the old result, already checked out")
+    parser.add_argument("new_version", help="Version of the data of the new result, already checked out")
+    parser.add_argument(
+        "--stat",
+        action="store_true",
+        default=False,
+        help="Only show the number of files and the bytes added, removed and modified.",
+    )
+    parser.set_defaults(func=CmdDiff)
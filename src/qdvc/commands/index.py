@@ -0,0 +1,51 @@
+import argparse
+import logging
+
+from qdvc.cli.command import CmdBase
+from qdvc.cli.utils import fix_subparsers
+
+logger = logging.getLogger(__name__)
+
+
+class CmdIndexRebuild(CmdBase):
+    def run(self):
+        try:
+            self.repo.rebuild_index(self.args.rev)
+
+        except Exception:
+            logger.exception("")
+            return 1
+        return 0
+
+
+def add_parser(subparsers, parent_parser):
+    INDEX_HELP = "Manage the manifest of the data pool"
+
+    parser = subparsers.add_parser(
+        "index",
+        parents=[parent_parser],
+        description=INDEX_HELP,
+        help=INDEX_HELP,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    index_subparsers = parser.add_subparsers(
+        dest="cmd",
+        help="Use `qdvc index CMD --help` for command-specific help.",
+    )
+    fix_subparsers(index_subparsers)
+
+    REBUILD_HELP = "Regenerates the pool manifest from the .dvc files committed in git, and stages it"
+    rebuild_parser = index_subparsers.add_parser(
+        "rebuild",
+        parents=[parent_parser],
+        description=REBUILD_HELP,
+        help=REBUILD_HELP,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    rebuild_parser.add_argument(
+        "--rev",
+        default="HEAD",
+        help="Revision whose .data/ directory is indexed. Defaults to HEAD.",
+        metavar="<revision>",
+    )
+    rebuild_parser.set_defaults(func=CmdIndexRebuild)
@@ -0,0 +1,53 @@
+import argparse
+import logging
+
+from qdvc.cli.command import CmdBase
+
+logger = logging.getLogger(__name__)
+
+
+class CmdLsQueries(CmdBase):
+    def run(self):
+        from dvc.ui import ui
+
+        try:
+            for result in self.repo.ls_queries(contains=self.args.contains, versions=self.args.version):
+                if self.args.count:
+                    ui.write(f"{result.query}\t{result.version}\t{result.count}")
+                else:
+                    ui.write(f"{result.query}\t{result.version}")
+
+        except Exception:
+            logger.exception("")
+            return 1
+        return 0
+
+
+def add_parser(subparsers, parent_parser):
+    LS_QUERIES_HELP = "Lists the queries checked out at each version, from an index of their results"
+
+    parser = subparsers.add_parser(
+        "ls-queries",
+        parents=[parent_parser],
+        description=LS_QUERIES_HELP,
+        help=LS_QUERIES_HELP,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "--contains",
+        help="Only list the queries whose result contains this file, given by its path in the repo or in the pool.",
+        metavar="<path>",
+    )
+    parser.add_argument(
+        "--version",
+        action="append",
+        help="Only list the results at this version. Can be repeated.",
+        metavar="<version>",
+    )
+    parser.add_argument(
+        "--count",
+        action="store_true",
+        default=False,
+        help="Show the number of files of each result.",
+    )
+    parser.set_defaults(func=CmdLsQueries)
@@ -9,9 +9,24 @@ logger = logging.getLogger(__name__)
 class CmdAdd(CmdBase):
     def run(self):
         try:
-            self.repo.query(
-                self.args.name[0],
-            )
+            operations = {"union": self.args.union, "intersect": self.args.intersect, "minus": self.args.minus}
+            if self.args.name[0] == "compose" and len(self.args.name) == 2:
+                operation = next((name for name, queries in operations.items() if queries), None)
+                if operation is None:
+                    raise Exception("Please specify the queries to compose with --union, --intersect or --minus.")
+                self.repo.compose(
+                    self.args.name[1],
+                    operation,
+                    operations[operation],
+                    versions=self.args.version,
+                )
+            elif len(self.args.name) != 1 or any(operations.values()):
+                raise Exception("Please compose queries with `qdvc query compose <name> --union <query> <query>`.")
+            else:
+                self.repo.query(
+                    self.args.name[0],
+                    spec=self.args.spec,
+                )
 
         except Exception:
             logger.exception("")
@@ -29,5 +44,47 @@ def add_parser(subparsers, parent_parser):
         help=ADD_HELP,
         formatter_class=argparse.RawDescriptionHelpFormatter,
     )
-    parser.add_argument("name", nargs=1, help="Name of the new query")
+    parser.add_argument(
+        "--spec",
+        action="store_true",
+        default=False,
+        help=(
+            "Create a declarative filter.yaml, with globs, regexes and metadata conditions, instead of a filter.py. "
+            "It is evaluated in bulk by checkout."
+        ),
+    )
+    parser.add_argument(
+        "name",
+        nargs="+",
+        help="Name of the new query, or `compose` followed by the name of a new query composed from other queries",
+        metavar="[compose] <name>",
+    )
+    operations = parser.add_mutually_exclusive_group()
+    operations.add_argument(
+        "--union",
+        nargs="+",
+        help="Only used with `compose`. The result holds the files of the result of any of the queries.",
+        metavar="<query>",
+    )
+    operations.add_argument(
+        "--intersect",
+        nargs="+",
+        help="Only used with `compose`. The result holds the files of the results of all of the queries.",
+        metavar="<query>",
+    )
+    operations.add_argument(
+        "--minus",
+        nargs="+",
+        help="Only used with `compose`. The result holds the files of the first query in none of the other results.",
+        metavar="<query>",
+    )
+    parser.add_argument(
+        "--version",
+        action="append",
+        help=(
+            "Only used with `compose`. Version at which the composed result is built right away. "
+            "Composed results are built from the results of the queries, without filtering the pool."
+        ),
+        metavar="<version>",
+    )
     parser.set_defaults(func=CmdAdd)
@@ -1,5 +1,25 @@
+from voluptuous import All, Any, Boolean, Coerce, Optional, Range
+
+
 class RelPath(str):
     pass
 
 
-SCHEMA = {}
+SCHEMA = {
+    "cache": {
+        Optional("dir"): str,
+        Optional("max_entries", default=5_000_000): All(Coerce(int), Range(min=0)),
+    },
+    "checkout": {
+        Optional("batch_size", default=1000): All(Coerce(int), Range(min=1)),
+        # Only check out the files of the query result, `.qdvc/`, `.dvc/` and the files at the root of the repo
+        Optional("sparse", default=False): Boolean(),
+    },
+    "metadata": {
+        # Names of the extractors run on the files added, built-in or given as `module:function`
+        Optional("extractors", default=[]): Any([str], All(str, lambda name: [name])),
+    },
+    "git": {
+        Optional("add_batch_size", default=10000): All(Coerce(int), Range(min=1)),
+    },
+}
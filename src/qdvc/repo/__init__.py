@@ -12,14 +12,24 @@ class Repo:
 
     FILTER_MODULE_NAME = "filter"
     FILTER_FILE_NAME = FILTER_MODULE_NAME + ".py"
+    FILTER_SPEC_FILE_NAME = FILTER_MODULE_NAME + ".yaml"
+    FILTER_FILE_NAMES = (FILTER_FILE_NAME, FILTER_SPEC_FILE_NAME)
     QUERY_SEPARATOR = "/"
     QUERY_BRANCH_PREFIX = "query"
     QUERY_INIT = "init"
+    POOL_MANIFEST_FILE_NAME = "pool.manifest"
+    RESULT_MANIFEST_FILE_NAME = "result.manifest"
+    METADATA_FILE_NAME = "metadata.tsv"
 
     from qdvc.repo.add import add  # type: ignore[misc]
     from qdvc.repo.query import query  # type: ignore[misc]
+    from qdvc.repo.compose import compose  # type: ignore[misc]
     from qdvc.repo.commit import commit  # type: ignore[misc]
-    from qdvc.repo.checkout import checkout  # type: ignore[misc]
+    from qdvc.repo.checkout import checkout, checkout_all_queries, checkout_worktrees  # type: ignore[misc]
+    from qdvc.repo.cache import clear_cache  # type: ignore[misc]
+    from qdvc.repo.index import rebuild_index  # type: ignore[misc]
+    from qdvc.repo.diff import diff  # type: ignore[misc]
+    from qdvc.repo.membership import ls_queries  # type: ignore[misc]
 
     def __init__(
         self,
@@ -37,6 +47,9 @@ class Repo:
         )
         self.qdvc_dir = os.path.join(self.root_dir, self.QDVC_DIR)
         self.data_qdvc_dir = os.path.join(self.root_dir, self.QDVC_DATA_DIR)
+        self.pool_manifest_path = os.path.join(self.qdvc_dir, self.POOL_MANIFEST_FILE_NAME)
+        self.result_manifest_path = os.path.join(self.qdvc_dir, self.RESULT_MANIFEST_FILE_NAME)
+        self.metadata_path = os.path.join(self.qdvc_dir, self.METADATA_FILE_NAME)
         self.git_dir = os.path.join(self.root_dir, ".git")
         self.config = Config(self.qdvc_dir, config=config)
         self.dvc_repo: DvcRepo = dvcRepo
@@ -59,6 +72,16 @@ class Repo:
         root_dir = DvcRepo.find_root(root)
         return os.path.join(root_dir, cls.QDVC_DIR)
 
+    def find_filter(self) -> str:
+        """
+        Returns the path of the `filter.py` or of the `filter.yaml` of the query branch checked out.
+        """
+        for file_name in self.FILTER_FILE_NAMES:
+            filter_path = os.path.join(self.qdvc_dir, file_name)
+            if os.path.exists(filter_path):
+                return filter_path
+        raise Exception("Filter file in qdvc was not found")
+
     def is_query_branch(self) -> bool:
         """
         Returns if the current repo is on a query branch, or False if on master or data branch.
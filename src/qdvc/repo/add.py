@@ -1,12 +1,27 @@
-from typing import TYPE_CHECKING, Any, List
-from .githelper import checkout_master
+from typing import TYPE_CHECKING, Any, Iterator, List, Optional, Tuple
+from .githelper import add_paths, blob_sha, checkout_master, exclude
+from .cache import StatCache, open_cache_dir
+from .metadata import append_pending_metadata, extract_all, merge_pending_metadata, resolve_extractor
+from .pool import PENDING_SUFFIX, append_pending_manifest, entry_from_dvc, merge_pending_manifest, parse_dvc
+import glob as globlib
+import hashlib
+import json
+import logging
 import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from dvc.stage import Stage
 
 if TYPE_CHECKING:
     from qdvc.repo import Repo
     from qdvc.types import TargetType
 
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1000
+DVC_FILE_SUFFIX = ".dvc"
+
 
 def add(
     repo: "Repo",
@@ -15,22 +30,371 @@ def add(
     no_commit: bool = False,
     fname: str = ".",
     to_remote: bool = False,
+    chunk_size: Optional[int] = None,
+    from_file: Optional[str] = None,
+    extractors: Optional[List[str]] = None,
     **kwargs: Any,
 ) -> List[str]:
+    """
+    Adds the targets to the pool. Files whose inode, size and modification time did not change since they were
+    added are skipped, so that adding a directory again only costs the files that changed. A directory added as a
+    whole is skipped when it holds the files it had, none of them having changed.
+    With chunk_size, the targets are expanded into files that are hashed, added and staged chunk by chunk: an
+    interrupted ingest can be resumed by running the same command again.
+    With from_file, the files are read from that newline-delimited list ("-" for stdin) instead of targets.
+    The metadata extractors, those of the config by default, are run on the files added and their results are
+    written in the metadata store. Extractors given explicitly are also run on the files already up to date in the
+    pool, to fill in the metadata of files added without them.
+    The entries of each chunk are appended to journals merged once into the pool manifest and the metadata store at
+    the end, or by the next add if this one is interrupted.
+    """
     checkout_master(repo.git_repo)
-    staged = repo.dvc_repo.add(targets, recursive, no_commit, fname, to_remote, **kwargs)
+    backfill = extractors is not None
+    if extractors is None:
+        extractors = repo.config["metadata"]["extractors"]
+    for name in extractors:
+        resolve_extractor(name)  # Fails before adding anything if an extractor is unknown
+    if (chunk_size or from_file) and fname and fname != ".":
+        raise Exception("A file name cannot be given when adding files in chunks.")
+
+    pending_paths = [repo.pool_manifest_path + PENDING_SUFFIX, repo.metadata_path + PENDING_SUFFIX]
+    exclude(repo.git_repo, repo.root_dir, pending_paths)
+    _merge_pending(repo)
+    with StatCache(open_cache_dir(repo)) as stat_cache:
+        try:
+            if from_file:
+                return _add_from_file(
+                    repo,
+                    stat_cache,
+                    from_file,
+                    chunk_size or CHUNK_SIZE,
+                    no_commit,
+                    to_remote,
+                    extractors,
+                    backfill,
+                    **kwargs,
+                )
+            targets = _expand(repo, targets, recursive, kwargs.pop("glob", False))
+            if not chunk_size:
+                return _add_files(
+                    repo,
+                    stat_cache,
+                    list(targets),
+                    no_commit,
+                    to_remote,
+                    fname=fname,
+                    extractors=extractors,
+                    backfill=backfill,
+                    **kwargs,
+                )
 
+            new_paths = []
+            for chunk in iter(lambda: list(islice(targets, chunk_size)), []):
+                new_paths.extend(
+                    _add_files(
+                        repo,
+                        stat_cache,
+                        chunk,
+                        no_commit,
+                        to_remote,
+                        prehash=True,
+                        extractors=extractors,
+                        backfill=backfill,
+                        **kwargs,
+                    )
+                )
+                logger.info(f"Added {len(new_paths)} files to the pool.")
+            return new_paths
+        finally:
+            _merge_pending(repo)
+
+
+def _add_files(
+    repo: "Repo",
+    stat_cache: StatCache,
+    paths: List[str],
+    no_commit: bool,
+    to_remote: bool,
+    fname: Optional[str] = None,
+    prehash: bool = False,
+    extractors: Optional[List[str]] = None,
+    backfill: bool = False,
+    **kwargs: Any,
+) -> List[str]:
+    """
+    Adds the files of paths that are not already up to date in the pool, hashing them in parallel if prehash.
+    With backfill, the extractors are run on the files already up to date instead.
+    """
+    in_pool = [_is_in_pool(repo, stat_cache, path) for path in paths]
+    if backfill and extractors and any(in_pool):
+        files = [(path, _pool_relpath(repo, _pool_path(repo, path))) for path, done in zip(paths, in_pool) if done]
+        _extract_metadata(repo, extractors, [file for file in files if os.path.isfile(file[0])], kwargs.get("jobs"))
+    paths = [path for path, done in zip(paths, in_pool) if not done]
+    if not paths:
+        logger.info("All the files are already up to date in the pool.")
+        return []
+    if prehash:
+        _prehash(repo, paths, kwargs.get("jobs"))
+    return _add_chunk(repo, stat_cache, paths, False, no_commit, fname, to_remote, extractors, **kwargs)
+
+
+def _add_from_file(
+    repo: "Repo",
+    stat_cache: StatCache,
+    from_file: str,
+    chunk_size: int,
+    no_commit: bool,
+    to_remote: bool,
+    extractors: List[str],
+    backfill: bool = False,
+    **kwargs: Any,
+) -> List[str]:
+    """
+    Adds the files listed in from_file, streamed by chunks of chunk_size lines. After each chunk, the number of lines
+    consumed is recorded in a checkpoint, so that a restarted ingest of the same list skips the chunks already added.
+    """
+    checkpoint = AddCheckpoint(os.path.join(repo.qdvc_dir, AddCheckpoint.FILE_NAME), from_file)
+    exclude(repo.git_repo, repo.root_dir, [checkpoint.path])
     new_paths = []
+    stream = sys.stdin if from_file == "-" else open(from_file, encoding="utf-8")
+    try:
+        lines = iter(stream)
+        skipped = checkpoint.skip(lines)
+        if skipped:
+            logger.info(f"Resuming the ingest of {from_file} after {skipped} lines already added.")
+        for chunk in iter(lambda: list(islice(lines, chunk_size)), []):
+            paths = [line.rstrip("\r\n") for line in chunk if line.strip()]
+            new_paths.extend(
+                _add_files(
+                    repo,
+                    stat_cache,
+                    paths,
+                    no_commit,
+                    to_remote,
+                    prehash=True,
+                    extractors=extractors,
+                    backfill=backfill,
+                    **kwargs,
+                )
+            )
+            checkpoint.save(chunk)
+            logger.info(f"Added {len(new_paths)} files to the pool, {checkpoint.lines} lines of {from_file} done.")
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    checkpoint.remove()
+    return new_paths
+
+
+class AddCheckpoint:
+    """
+    Progress of the ingest of a list of files: the number of lines of the list already added, and their hash to
+    detect that a restarted ingest reads a different list.
+    Args:
+        path (str): path of the checkpoint file.
+        source (str): path of the list of files, or "-" for stdin.
+    """
+
+    FILE_NAME = "add.checkpoint"
+
+    def __init__(self, path: str, source: str):
+        self.path = path
+        self.source = source if source == "-" else os.path.abspath(source)
+        self.lines = 0
+        self.hash = hashlib.sha1()
+
+    def skip(self, lines: Iterator[str]) -> int:
+        """
+        Consumes from lines the lines already added according to the checkpoint file, and returns their number.
+        """
+        if not os.path.exists(self.path):
+            return 0
+        with open(self.path, encoding="utf-8") as f:
+            saved = json.load(f)
+        if saved["source"] != self.source:
+            return 0
+        done = list(islice(lines, saved["lines"]))
+        self.save(done)
+        if len(done) != saved["lines"] or self.hash.hexdigest() != saved["hash"]:
+            raise Exception(
+                f"{self.source} differs from the list whose ingest was interrupted. "
+                f"Remove {self.path} to ingest it from the start."
+            )
+        return self.lines
+
+    def save(self, lines: List[str]):
+        for line in lines:
+            self.hash.update(line.encode("utf-8"))
+        self.lines += len(lines)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"source": self.source, "lines": self.lines, "hash": self.hash.hexdigest()}, f)
+        os.replace(tmp_path, self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def _add_chunk(
+    repo: "Repo",
+    stat_cache: StatCache,
+    targets: "TargetType",
+    recursive: bool,
+    no_commit: bool,
+    fname: Optional[str],
+    to_remote: bool,
+    extractors: Optional[List[str]] = None,
+    **kwargs: Any,
+) -> List[str]:
+    """
+    Adds the targets with DVC, moves the resulting `.dvc` files into the pool and stages them.
+    The stat of the files added, and of the files of the directories added, is recorded in stat_cache, and the
+    metadata of the files added is extracted by extractors.
+    """
+    staged = repo.dvc_repo.add(targets, recursive, no_commit, fname, to_remote, **kwargs)
+
+    moves = []
     for staged_file in staged:
         staged_file: Stage
         if staged_file.path[: len(repo.root_dir)] != repo.root_dir:
             raise Exception("Cannot add a file outside repository, please try again.")
-        new_path = os.path.join(repo.data_qdvc_dir, staged_file.path[len(repo.root_dir) + 1 :])
-        dir_name = os.path.dirname(new_path)
-        if not os.path.exists(dir_name):
-            os.makedirs(dir_name)
-        os.rename(staged_file.path, new_path)
+        moves.append((staged_file.path, os.path.join(repo.data_qdvc_dir, staged_file.path[len(repo.root_dir) + 1 :])))
+
+    for dir_name in {os.path.dirname(new_path) for _, new_path in moves}:
+        os.makedirs(dir_name, exist_ok=True)
+    new_paths = []
+    entries = []
+    local_files = []
+    dir_files = []
+    for path, new_path in moves:
+        os.replace(path, new_path)
         new_paths.append(new_path)
+        with open(new_path, "rb") as f:
+            data = f.read()
+        entries.append(entry_from_dvc(_pool_relpath(repo, new_path), data.decode("utf-8"), blob_sha(data)))
+        data_path = path[: -len(DVC_FILE_SUFFIX)]
+        if os.path.isfile(data_path):
+            local_files.append((data_path, entries[-1]))
+        elif os.path.isdir(data_path):
+            dir_files.extend((file_path, entries[-1]) for file_path in _dir_files(repo, data_path))
 
-    repo.git_repo.git.add(new_paths)
+    append_pending_manifest(repo.pool_manifest_path, entries)
+    if extractors and local_files:
+        files = [(data_path, entry.path) for data_path, entry in local_files]
+        _extract_metadata(repo, extractors, files, kwargs.get("jobs"))
+    add_paths(repo.git_repo, new_paths, repo.config["git"]["add_batch_size"])
+    stat_cache.save((data_path, os.stat(data_path), entry.md5) for data_path, entry in local_files + dir_files)
     return new_paths
+
+
+def _extract_metadata(repo: "Repo", extractors: List[str], files: List[Tuple[str, str]], jobs: Optional[int]):
+    """
+    Runs the extractors on the (data path, pool path) files, and appends their metadata to the journal of the
+    metadata store, replacing the metadata they had.
+    """
+    if not files:
+        return
+    metadata = extract_all(extractors, [data_path for data_path, _ in files], jobs)
+    append_pending_metadata(repo.metadata_path, ((pool_path, m) for (_, pool_path), m in zip(files, metadata) if m))
+
+
+def _merge_pending(repo: "Repo"):
+    """
+    Merges the journals of the pool manifest and of the metadata store into them, and stages them.
+    """
+    merged = [path for path in (repo.pool_manifest_path, repo.metadata_path) if os.path.exists(path + PENDING_SUFFIX)]
+    merge_pending_manifest(repo.pool_manifest_path)
+    merge_pending_metadata(repo.metadata_path)
+    add_paths(repo.git_repo, merged, repo.config["git"]["add_batch_size"])
+
+
+def _pool_relpath(repo: "Repo", path: str) -> str:
+    return os.path.relpath(path, repo.data_qdvc_dir).replace(os.sep, "/")
+
+
+def _pool_path(repo: "Repo", path: str) -> str:
+    return os.path.join(repo.data_qdvc_dir, os.path.relpath(os.path.abspath(path), repo.root_dir) + DVC_FILE_SUFFIX)
+
+
+def _expand(repo: "Repo", targets: "TargetType", recursive: bool, glob: bool) -> Iterator[str]:
+    """
+    Yields the files of targets. Directories are expanded only when recursive, otherwise they are added as a whole.
+    Like `dvc add -R`, the files ignored by `.dvcignore`, internal to DVC, `.dvc` files, git files such as
+    `.gitignore` and files tracked by git are skipped.
+    """
+    from dvc.dvcfile import is_dvc_file
+
+    dvc_repo = repo.dvc_repo
+    scm = dvc_repo.scm
+    for target in [targets] if isinstance(targets, str) else targets:
+        for path in globlib.iglob(target, recursive=True) if glob else [target]:
+            if recursive and os.path.isdir(path):
+                for root, _, files in dvc_repo.dvcignore.walk(dvc_repo.fs, os.path.abspath(path)):
+                    for f in sorted(files):
+                        file_path = os.path.join(root, f)
+                        if (
+                            dvc_repo.is_dvc_internal(file_path)
+                            or is_dvc_file(file_path)
+                            or scm.belongs_to_scm(file_path)
+                            or scm.is_tracked(file_path)
+                        ):
+                            continue
+                        yield file_path
+            else:
+                yield path
+
+
+def _is_in_pool(repo: "Repo", stat_cache: StatCache, path: str) -> bool:
+    """
+    Returns if path is a file already added to the pool, which was not modified since then, or a directory added as a
+    whole that still holds as many files as it had, none of them being new or modified.
+    """
+    pool_path = _pool_path(repo, path)
+    if not os.path.isdir(path):
+        return _is_unchanged(stat_cache, path) and os.path.exists(pool_path)
+    if not os.path.exists(pool_path):
+        return False
+    with open(pool_path, encoding="utf-8") as f:
+        nfiles = parse_dvc(f.read()).get("nfiles")
+    if not nfiles:
+        return False
+    count = 0
+    for file_path in _dir_files(repo, path):
+        if not _is_unchanged(stat_cache, file_path):
+            return False
+        count += 1
+    return count == int(nfiles)
+
+
+def _is_unchanged(stat_cache: StatCache, path: str) -> bool:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return False
+    return stat_cache.get_md5(path, stat) is not None
+
+
+def _dir_files(repo: "Repo", path: str) -> Iterator[str]:
+    """
+    Yields the files of the directory at path that DVC adds with it, i.e. not ignored by `.dvcignore`.
+    """
+    dvc_repo = repo.dvc_repo
+    for root, _, files in dvc_repo.dvcignore.walk(dvc_repo.fs, os.path.abspath(path)):
+        for f in files:
+            yield os.path.join(root, f)
+
+
+def _prehash(repo: "Repo", paths: List[str], jobs: Optional[int]):
+    """
+    Hashes the files of paths in parallel threads, and records their md5 in the state database of DVC so that
+    `dvc add` does not hash them again.
+    """
+    from dvc_data.hashfile.hash import file_md5
+    from dvc_data.hashfile.hash_info import HashInfo
+
+    fs = repo.dvc_repo.fs
+    files = [os.path.abspath(path) for path in paths if os.path.isfile(path)]
+    with ThreadPoolExecutor(jobs or os.cpu_count()) as executor:
+        for path, md5 in zip(files, executor.map(lambda path: file_md5(path, fs), files)):
+            repo.dvc_repo.state.save(path, fs, HashInfo("md5", md5))
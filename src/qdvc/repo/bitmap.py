@@ -0,0 +1,111 @@
+"""Compressed bitmaps of integer ids, in the layout of Roaring bitmaps."""
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from itertools import groupby
+from typing import Iterable, Iterator, List, Tuple
+
+_MAGIC = b"QRB1"
+_HEADER = struct.Struct("<4sI")
+# Key of the container (the high 16 bits of its ids), kind, cardinality and offset of its payload
+_CONTAINER = struct.Struct("<HBII")
+_ARRAY = 0
+_BITMAP = 1
+# Containers with more ids are stored as bitmaps of 2^16 bits, which are then smaller than arrays of 16 bits ids
+_MAX_ARRAY_SIZE = 4096
+_BITMAP_SIZE = (1 << 16) // 8
+
+
+class RoaringBitmap:
+    """
+    Set of non-negative integer ids below 2^32, split in containers of the ids sharing their high 16 bits.
+    Sparse containers store the sorted low 16 bits of their ids, dense containers a bitmap of 2^16 bits, so the
+    size is at most 2 bytes per id plus a small header.
+    A bitmap read from bytes only decodes the containers that are accessed, so membership is tested in O(log n)
+    without reading the whole bitmap.
+    """
+
+    def __init__(self, data: bytes = b""):
+        self._data = memoryview(data or self._serialize([]))
+        magic, count = _HEADER.unpack_from(self._data)
+        if magic != _MAGIC:
+            raise Exception("Invalid bitmap, it was not written by qdvc.")
+        self._containers: List[Tuple[int, int, int, int]] = [
+            _CONTAINER.unpack_from(self._data, _HEADER.size + i * _CONTAINER.size) for i in range(count)
+        ]
+        self._keys = [container[0] for container in self._containers]
+
+    @classmethod
+    def from_sorted(cls, ids: Iterable[int]) -> "RoaringBitmap":
+        """
+        Builds the bitmap of ids, which must be sorted.
+        """
+        return cls(cls._serialize(ids))
+
+    @staticmethod
+    def _serialize(ids: Iterable[int]) -> bytes:
+        containers = []
+        for key, group in groupby(ids, key=lambda i: i >> 16):
+            lows = array("H", (i & 0xFFFF for i in group))
+            if len(lows) > _MAX_ARRAY_SIZE:
+                bits = bytearray(_BITMAP_SIZE)
+                for low in lows:
+                    bits[low >> 3] |= 1 << (low & 7)
+                containers.append((key, _BITMAP, len(lows), bytes(bits)))
+            else:
+                if sys.byteorder == "big":
+                    lows.byteswap()
+                containers.append((key, _ARRAY, len(lows), lows.tobytes()))
+        headers = []
+        offset = _HEADER.size + len(containers) * _CONTAINER.size
+        for key, kind, cardinality, payload in containers:
+            headers.append(_CONTAINER.pack(key, kind, cardinality, offset))
+            offset += len(payload)
+        payloads = [payload for _, _, _, payload in containers]
+        return _HEADER.pack(_MAGIC, len(containers)) + b"".join(headers) + b"".join(payloads)
+
+    def to_bytes(self) -> bytes:
+        return bytes(self._data)
+
+    def _lows(self, index: int) -> array:
+        _, kind, cardinality, offset = self._containers[index]
+        if kind == _BITMAP:
+            bits = self._data[offset : offset + _BITMAP_SIZE]
+            return array(
+                "H", (i << 3 | bit for i, byte in enumerate(bits) if byte for bit in range(8) if byte >> bit & 1)
+            )
+        lows = array("H", self._data[offset : offset + 2 * cardinality].tobytes())
+        if sys.byteorder == "big":
+            lows.byteswap()
+        return lows
+
+    def __contains__(self, i: int) -> bool:
+        index = bisect_left(self._keys, i >> 16)
+        if index == len(self._keys) or self._keys[index] != i >> 16:
+            return False
+        _, kind, cardinality, offset = self._containers[index]
+        low = i & 0xFFFF
+        if kind == _BITMAP:
+            return bool(self._data[offset + (low >> 3)] >> (low & 7) & 1)
+        # Binary search of the little endian 16 bits ids of the array container
+        lo, hi = 0, cardinality
+        while lo < hi:
+            mid = (lo + hi) // 2
+            value = self._data[offset + 2 * mid] | self._data[offset + 2 * mid + 1] << 8
+            if value < low:
+                lo = mid + 1
+            elif value > low:
+                hi = mid
+            else:
+                return True
+        return False
+
+    def __iter__(self) -> Iterator[int]:
+        for index, key in enumerate(self._keys):
+            high = key << 16
+            for low in self._lows(index):
+                yield high | low
+
+    def __len__(self) -> int:
+        return sum(container[2] for container in self._containers)
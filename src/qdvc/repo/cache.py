@@ -0,0 +1,189 @@
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .columnar import COLUMNAR_DIR_NAME
+from .githelper import exclude
+from .membership import MEMBERSHIP_DIR_NAME
+from .pool import read_md5
+
+if TYPE_CHECKING:
+    from qdvc.repo import Repo
+
+logger = logging.getLogger(__name__)
+
+
+class FilterCache:
+    """
+    Persistent cache of filter decisions, keyed by the hash of the filter, the pool path and the md5 of its data.
+    Entries are evicted in least recently used order once there are more than max_entries.
+    Args:
+        cache_dir (str): directory of the cache database.
+        root_dir (str): root of the repo, paths are stored relatively to it.
+        filter_hash (str): hash of the filter whose decisions are cached.
+        max_entries (int): maximum number of decisions kept in the cache.
+        md5_of (callable): returns the md5 of the `.dvc` file at a pool path. Reads the file by default.
+    """
+
+    DB_FILE_NAME = "filter.db"
+
+    def __init__(
+        self,
+        cache_dir: str,
+        root_dir: str,
+        filter_hash: str,
+        max_entries: int,
+        md5_of: Callable[[str], Optional[str]] = read_md5,
+    ):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.root_dir = root_dir
+        self.filter_hash = filter_hash
+        self.max_entries = max_entries
+        self.md5_of = md5_of
+        # Several checkouts may share the cache concurrently, each store is committed in a short transaction
+        self.db = sqlite3.connect(os.path.join(cache_dir, self.DB_FILE_NAME), timeout=60)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "filter TEXT NOT NULL, path TEXT NOT NULL, md5 TEXT NOT NULL, "
+            "keep INTEGER NOT NULL, used INTEGER NOT NULL, "
+            "PRIMARY KEY (filter, path, md5))"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS results_used ON results (used)")
+        (last_used,) = self.db.execute("SELECT COALESCE(MAX(used), 0) FROM results").fetchone()
+        self.generation = last_used + 1
+
+    @staticmethod
+    def hash_filter(filter_path: str) -> str:
+        with open(filter_path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+
+    def _relpath(self, path: str) -> str:
+        return path[len(self.root_dir) + 1 :] if path.startswith(self.root_dir + os.sep) else path
+
+    def keys(self, paths: Iterable[str]) -> List[Tuple[str, Optional[str]]]:
+        return [(path, self.md5_of(path)) for path in paths]
+
+    def lookup(self, keys: Iterable[Tuple[str, Optional[str]]]) -> Dict[str, bool]:
+        """
+        Returns the cached decisions of the (path, md5) keys found in the cache, and marks them as recently used.
+        """
+        found = {}
+        for path, md5 in keys:
+            if md5 is None:
+                continue
+            row = self.db.execute(
+                "SELECT keep FROM results WHERE filter = ? AND path = ? AND md5 = ?",
+                (self.filter_hash, self._relpath(path), md5),
+            ).fetchone()
+            if row is not None:
+                found[path] = bool(row[0])
+        if found:
+            self.db.executemany(
+                "UPDATE results SET used = ? WHERE filter = ? AND path = ? AND md5 = ?",
+                ((self.generation, self.filter_hash, self._relpath(path), md5) for path, md5 in keys if path in found),
+            )
+            self.db.commit()
+        return found
+
+    def store(self, decisions: Iterable[Tuple[str, Optional[str], bool]]):
+        self.db.executemany(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+            (
+                (self.filter_hash, self._relpath(path), md5, int(keep), self.generation)
+                for path, md5, keep in decisions
+                if md5 is not None
+            ),
+        )
+        self.db.commit()
+
+    def close(self):
+        (count,) = self.db.execute("SELECT COUNT(*) FROM results").fetchone()
+        if count > self.max_entries:
+            logger.debug(f"Evicting {count - self.max_entries} entries from the filter cache.")
+            self.db.execute(
+                "DELETE FROM results WHERE rowid IN (SELECT rowid FROM results ORDER BY used LIMIT ?)",
+                (count - self.max_entries,),
+            )
+        self.db.commit()
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class StatCache:
+    """
+    Persistent cache of the md5 of the files added to the pool, with the inode, size and modification time they had.
+    A file whose stat did not change since it was added does not need to be added again.
+    Args:
+        cache_dir (str): directory of the cache database.
+    """
+
+    DB_FILE_NAME = "stat.db"
+
+    def __init__(self, cache_dir: str):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(cache_dir, self.DB_FILE_NAME), timeout=60)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS stats ("
+            "path TEXT PRIMARY KEY, inode INTEGER NOT NULL, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, "
+            "md5 TEXT NOT NULL)"
+        )
+
+    def get_md5(self, path: str, stat: os.stat_result) -> Optional[str]:
+        """
+        Returns the md5 of the file at path if it was recorded with the same stat, None otherwise.
+        """
+        row = self.db.execute(
+            "SELECT md5 FROM stats WHERE path = ? AND inode = ? AND size = ? AND mtime_ns = ?",
+            (os.path.abspath(path), stat.st_ino, stat.st_size, stat.st_mtime_ns),
+        ).fetchone()
+        return row[0] if row else None
+
+    def save(self, items: Iterable[Tuple[str, os.stat_result, str]]):
+        self.db.executemany(
+            "INSERT OR REPLACE INTO stats VALUES (?, ?, ?, ?, ?)",
+            ((os.path.abspath(path), stat.st_ino, stat.st_size, stat.st_mtime_ns, md5) for path, stat, md5 in items),
+        )
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def open_cache_dir(repo: "Repo") -> str:
+    """
+    Creates the cache directory of repo if needed, and returns it. When it is in the working tree, it is ignored by
+    git even in repos whose `.qdvc/.gitignore` predates it.
+    """
+    cache_dir = repo.config["cache"]["dir"]
+    os.makedirs(cache_dir, exist_ok=True)
+    exclude(repo.git_repo, repo.root_dir, [cache_dir])
+    return cache_dir
+
+
+def clear_cache(repo: "Repo", **kwargs):
+    for db_file_name in (FilterCache.DB_FILE_NAME, StatCache.DB_FILE_NAME):
+        db_path = os.path.join(repo.config["cache"]["dir"], db_file_name)
+        for path in (db_path, db_path + "-wal", db_path + "-shm"):
+            if os.path.exists(path):
+                os.remove(path)
+                logger.info(f"Removed {path}")
+    for dir_name in (COLUMNAR_DIR_NAME, MEMBERSHIP_DIR_NAME):
+        index_dir = os.path.join(repo.config["cache"]["dir"], dir_name)
+        if os.path.exists(index_dir):
+            shutil.rmtree(index_dir)
+            logger.info(f"Removed {index_dir}")
@@ -1,69 +1,834 @@
 import os
-from typing import TYPE_CHECKING, Any, Optional
+from typing import TYPE_CHECKING, Any, Callable, ContextManager, Dict, Iterable, Iterator, List, Optional, Tuple
+import copy
 import logging
-import importlib.util
-import shutil
-from pathlib import Path
-import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, nullcontext
 from datetime import datetime
 
+from git.objects import Blob, Commit
+from git.repo import Repo as GitRepo
+from gitdb.exc import BadName
+
+from .cache import FilterCache, open_cache_dir
+from .compose import compose_results, load_composition
+from .diff import read_result
+from .download import Downloader
+from .filtering import dir_selector, iter_decisions, iter_filtered, load_dir_filter
+from .githelper import (
+    TreeEntry,
+    add_paths,
+    blob_shas,
+    checkout_entries,
+    commit_tree,
+    diff_name_status,
+    disable_sparse_checkout,
+    exclude,
+    ls_tree,
+    read_blob,
+    sparse_checkout,
+    walk_tree,
+    write_blob,
+)
+from .metadata import MetadataEntry, changed_metadata, metadata_digests, parse_metadata
+from .pool import PoolEntry, entry_from_dvc, manifest_lines, parse_manifest, read_md5
+from .sampling import SAMPLE_SEPARATOR, Sampler, Shard
+from .snapshot import PoolSnapshot
+
 if TYPE_CHECKING:
     from qdvc.repo import Repo
 
 logger = logging.getLogger(__name__)
 
+WORKTREES_DIR_NAME = "worktrees"
+
 
 def checkout(
     repo: "Repo",
     query: str,
     version: str,
     download_files: bool,
+    jobs: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    incremental: bool = True,
+    use_cache: bool = True,
+    worktree: bool = True,
+    download_jobs: Optional[int] = None,
+    sample: Optional[int] = None,
+    fraction: Optional[float] = None,
+    seed: int = 0,
+    shard: Optional[Tuple[int, int]] = None,
+    sparse: Optional[bool] = None,
     **kwargs: Any,
 ):
-    # Checkout the query branch
-    repo.git_repo.git.checkout(repo.QUERY_SEPARATOR.join([repo.QUERY_BRANCH_PREFIX, query, repo.QUERY_INIT]))
-
-    # Rebase on version branch
-    query_branch = repo.QUERY_SEPARATOR.join([repo.QUERY_BRANCH_PREFIX, query, version])
-    branch_already_exists = any(r.name == query_branch for r in repo.git_repo.heads)
-    if not branch_already_exists:
-        repo.git_repo.git.branch(query_branch)
+    """
+    Checks out the result of the query at version on the query/<query>/<version> branch, a merge commit of the version
+    and of the init branch of the query built like with worktree=False, and returns its hexsha.
+    With sample or fraction, only a deterministic sample of the result, chosen by a hash of the paths with seed,
+    is checked out on the query/<query>/<version>+<sample> branch.
+    With shard (i, n), only the i-th of n disjoint shares of the result is downloaded, the branch being the same.
+    With sparse, which defaults to the `checkout.sparse` config option, the `.data/` pool is left out of the working
+    tree: only the files of the result, `.qdvc/`, `.dvc/` and the files at the root of the repo are checked out.
+    With download_files, the working tree is moved to the version and the accepted files are written, staged and
+    downloaded while the filter is still running, before switching to the query branch.
+    """
+    batch_size = batch_size or repo.config["checkout"]["batch_size"]
+    sampler = _open_sampler(repo, sample, fraction, seed)
+    _open_shard(repo.root_dir, shard, download_files)
+    open_cache_dir(repo)
+    if not worktree:
+        if download_files:
+            raise Exception("Files cannot be downloaded without a working tree.")
+        return _checkout_without_worktree(repo, query, version, jobs, batch_size, incremental, use_cache, sampler)
+
+    sparse = repo.config["checkout"]["sparse"] if sparse is None else sparse
+    if not download_files:
+        # The result commit is composed from git objects, so checking it out only writes the files it adds to the
+        # version
+        commit = _checkout_without_worktree(repo, query, version, jobs, batch_size, incremental, use_cache, sampler)
+    else:
+        if sparse:
+            # The directories of the result are only known once it is written
+            sparse_checkout(repo.git_repo, _sparse_dirs(repo))
+        else:
+            disable_sparse_checkout(repo.git_repo)
+        repo.git_repo.git.checkout("--detach", version)
+        with Downloader(repo.dvc_repo, jobs=download_jobs, batch_size=batch_size) as downloader:
+            writer = _ResultWriter(repo, downloader, _open_shard(repo.root_dir, shard, True), batch_size)
+            commit = _checkout_without_worktree(
+                repo, query, version, jobs, batch_size, incremental, use_cache, sampler, writer
+            )
+            writer.flush()
+
+    query_branch = _query_branch(repo, query, version, sampler)
+    if sparse:
+        # Restricted before switching branches, so that the pool files are never written
+        sparse_checkout(repo.git_repo, _sparse_dirs(repo, query_branch))
+    else:
+        disable_sparse_checkout(repo.git_repo)
+    # The files written by the writer are staged as in the result commit, so git switches to it over them
     repo.git_repo.git.checkout(query_branch)
-    repo.git_repo.git.rebase(version)
-
-    # Applies filtering
-    p = Path(os.path.join(repo.qdvc_dir, repo.FILTER_FILE_NAME))
-    spec = importlib.util.spec_from_file_location("filter", p)
-    if not spec or not spec.loader:
-        raise Exception("Filter file in qdvc was not found")
-    mod = importlib.util.module_from_spec(spec)
-    sys.modules["filter"] = mod
-    spec.loader.exec_module(mod)
-    from filter import Query
-    query = Query()
-    new_paths = []
-    for root, subdirs, files in os.walk(repo.QDVC_DATA_DIR):
-        for f in files:
-            fp = os.path.join(repo.root_dir, root, f)
-            if query.filter(fp):  # type: ignore
-                new_path = fp[len(repo.data_qdvc_dir) + 1 :]
-                new_path = os.path.join(repo.root_dir, new_path)
-                new_paths.append(new_path)
-                if branch_already_exists:
-                    if os.path.exists(new_path):
-                        continue
-                    else:
-                        raise Exception("The query branch was already created and is now inconsistent in the results.")
-
-                shutil.copy(fp, new_path)
-    
-    #  Download file if requested
+    # notifiy that user that if he's happy, he should push the branch
+    return commit
+
+
+class _ResultWriter:
+    """
+    Writes the `.dvc` files of a result at their original location in the working tree of repo as they are
+    accepted, stages them, and downloads the data of the ones owned by owner meanwhile.
+    The files are written and staged in batches of batch_size, each batch being sent to downloader once written.
+    """
+
+    def __init__(self, repo: "Repo", downloader: Downloader, owner: Optional[Shard], batch_size: int):
+        self.repo = repo
+        self.downloader = downloader
+        self.owner = owner
+        self.batch_size = batch_size
+        self._batch: List[TreeEntry] = []
+
+    def put(self, entry: TreeEntry):
+        self._batch.append(entry)
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._batch:
+            return
+        git_repo = self.repo.git_repo
+        paths = [os.path.join(self.repo.root_dir, entry.path) for entry in self._batch]
+        checkout_entries(git_repo, self._batch, self.repo.root_dir)
+        add_paths(git_repo, paths, self.repo.config["git"]["add_batch_size"])
+        self._batch = []
+        for path in paths:
+            if self.owner is None or self.owner.owns(path):
+                self.downloader.put(path)
+
+
+def _checkout_without_worktree(
+    repo: "Repo",
+    query: str,
+    version: str,
+    jobs: Optional[int],
+    batch_size: int,
+    incremental: bool,
+    use_cache: bool,
+    sampler: Optional[Sampler] = None,
+    writer: Optional[_ResultWriter] = None,
+) -> str:
+    """
+    Creates the query/<query>/<version> branch from the git object database only, leaving the working tree and
+    the index untouched. The result is a merge commit of the version and of the init branch of the query.
+    The files of the result are also given to writer as they are accepted.
+    The filters are given the paths of the pool files in the repo, and read the pool and the metadata store of the
+    version from a snapshot.
+    """
+    git_repo = repo.git_repo
+    init_commit = git_repo.commit(repo.QUERY_SEPARATOR.join([repo.QUERY_BRANCH_PREFIX, query, repo.QUERY_INIT]))
+    version_commit = git_repo.commit(version)
+    query_branch = _query_branch(repo, query, version, sampler)
+    branch_already_exists = any(r.name == query_branch for r in git_repo.heads)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filter_blob, filter_path = _read_filter(repo, init_commit, tmp_dir)
+        composition = load_composition(filter_path)
+        if composition is not None:
+            return _write_composition(
+                repo,
+                query_branch,
+                version,
+                version_commit,
+                init_commit,
+                filter_blob,
+                composition,
+                jobs,
+                batch_size,
+                sampler,
+                writer,
+            )
+        snapshot = _open_snapshot(repo, version_commit, tmp_dir)
+        with snapshot.active():
+            filter_dir = load_dir_filter(filter_path)
+            pool = _list_pool(repo, version_commit.hexsha, filter_dir)
+            manifest = _read_pool_manifest(repo, version_commit, pool)
+            accepted = _iter_accepted(
+                repo,
+                query,
+                version,
+                filter_path,
+                pool,
+                manifest,
+                metadata_digests(_read_metadata(repo, version_commit)) if use_cache else {},
+                jobs=jobs,
+                batch_size=batch_size,
+                incremental=incremental and not branch_already_exists,
+                use_cache=use_cache,
+                snapshot=snapshot,
+            )
+            if sampler is not None:
+                accepted = sampler.sample(accepted)
+            return _write_result(
+                repo, query_branch, version_commit, init_commit, filter_blob, pool, manifest, accepted, writer
+            )
+
+
+def checkout_all_queries(
+    repo: "Repo",
+    version: str,
+    jobs: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    use_cache: bool = True,
+    **kwargs: Any,
+) -> Dict[str, str]:
+    """
+    Creates the query/<query>/<version> branch of every query in a single pass over the pool of version.
+    Each pool file is evaluated by all the queries before moving to the next chunk, so the pool is listed once and
+    every filter is loaded once. Like `checkout --no-worktree`, the working tree and the index are left untouched.
+    Each query reuses its cached decisions and skips the directories rejected by its `filter_dir`; the pool files
+    rejected by every query are not even written in the snapshot. Results are never built incrementally.
+    Returns the commit of each query.
+    """
+    git_repo = repo.git_repo
+    open_cache_dir(repo)
+    batch_size = batch_size or repo.config["checkout"]["batch_size"]
+    version_commit = git_repo.commit(version)
+    init_suffix = repo.QUERY_SEPARATOR + repo.QUERY_INIT
+    prefix = repo.QUERY_BRANCH_PREFIX + repo.QUERY_SEPARATOR
+    queries = [
+        head.name[len(prefix) : -len(init_suffix)]
+        for head in git_repo.heads
+        if head.name.startswith(prefix) and head.name.endswith(init_suffix)
+    ]
+    if not queries:
+        raise Exception("There is no query to checkout. Please create one with `qdvc query`.")
+    pool = {entry.path: entry for entry in ls_tree(git_repo, version_commit.hexsha, repo.QDVC_DATA_DIR)}
+    manifest = _read_pool_manifest(repo, version_commit, pool)
+    digests = metadata_digests(_read_metadata(repo, version_commit)) if use_cache else {}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        init_commits, filter_blobs, filter_paths = [], [], []
+        composed = []
+        for query in list(queries):
+            init_commit = git_repo.commit(prefix + query + init_suffix)
+            if _is_composed(repo, init_commit):
+                # Built from the results of the other queries once they are written
+                queries.remove(query)
+                composed.append(query)
+                continue
+            init_commits.append(init_commit)
+            query_dir = os.path.join(tmp_dir, str(len(filter_paths)))
+            os.mkdir(query_dir)
+            filter_blob, filter_path = _read_filter(repo, init_commits[-1], query_dir)
+            filter_blobs.append(filter_blob)
+            filter_paths.append(filter_path)
+        logger.info(f"Filtering the pool of {version} for the queries {', '.join(queries)}")
+
+        accepted: List[List[str]] = [[] for _ in queries]
+        snapshot = _open_snapshot(repo, version_commit, tmp_dir)
+        with snapshot.active(), ExitStack() as stack:
+            selectors = []
+            for filter_path in filter_paths:
+                filter_dir = load_dir_filter(filter_path)
+                selectors.append(None if filter_dir is None else dir_selector(repo.data_qdvc_dir, filter_dir))
+            caches = [
+                stack.enter_context(_open_cache(repo, filter_path, manifest, digests, use_cache, snapshot))
+                for filter_path in filter_paths
+            ]
+            entries = (
+                entry
+                for entry in pool.values()
+                if any(selected is None or selected(_pool_path(repo, entry.path)) for selected in selectors)
+            )
+            paths = snapshot.iter_paths(git_repo, entries, batch_size) if queries else iter(())
+            for chunk, decisions in iter_decisions(
+                filter_paths,
+                paths,
+                jobs=jobs,
+                chunk_size=batch_size,
+                caches=caches,
+                selectors=selectors,
+                snapshot=snapshot,
+            ):
+                for query_accepted, query_decisions in zip(accepted, decisions):
+                    query_accepted.extend(_tree_path(repo, path) for path, keep in zip(chunk, query_decisions) if keep)
+
+    commits = {}
+    for query, init_commit, filter_blob, query_accepted in zip(queries, init_commits, filter_blobs, accepted):
+        query_branch = repo.QUERY_SEPARATOR.join([repo.QUERY_BRANCH_PREFIX, query, version])
+        commits[query] = _write_result(
+            repo, query_branch, version_commit, init_commit, filter_blob, pool, manifest, query_accepted
+        )
+    for query in composed:
+        commits[query] = _checkout_without_worktree(repo, query, version, jobs, batch_size, True, True)
+    return commits
+
+
+def _open_sampler(repo: "Repo", sample: Optional[int], fraction: Optional[float], seed: int) -> Optional[Sampler]:
+    if sample is None and fraction is None:
+        return None
+    return Sampler(repo.QDVC_DATA_DIR, sample, fraction, seed)
+
+
+def _open_shard(root_dir: str, shard: Optional[Tuple[int, int]], download_files: bool) -> Optional[Shard]:
+    if shard is None:
+        return None
+    if not download_files:
+        raise Exception("A shard only restricts the files downloaded, please use it along with downloading files.")
+    return Shard(root_dir, *shard)
+
+
+def _query_branch(repo: "Repo", query: str, version: str, sampler: Optional[Sampler] = None) -> str:
+    """
+    Returns the name of the branch of the result of query at version, or of its sample by sampler.
+    """
+    return repo.QUERY_SEPARATOR.join([repo.QUERY_BRANCH_PREFIX, query, version + (sampler.suffix if sampler else "")])
+
+
+def _list_pool(repo: "Repo", rev: str, filter_dir: Optional[Callable[[str], bool]]) -> Dict[str, TreeEntry]:
+    """
+    Returns the pool files in the tree of rev by path, without reading the directories rejected by filter_dir: the
+    files under them are rejected without being filtered, even by incremental checkouts.
+    """
+    if filter_dir is None:
+        entries: Iterable[TreeEntry] = ls_tree(repo.git_repo, rev, repo.QDVC_DATA_DIR)
+    else:
+        entries = walk_tree(repo.git_repo, rev, repo.QDVC_DATA_DIR, lambda path: filter_dir(_pool_path(repo, path)))
+    return {entry.path: entry for entry in entries}
+
+
+def _pool_path(repo: "Repo", tree_path: str) -> str:
+    return os.path.join(repo.root_dir, *tree_path.split("/"))
+
+
+def _tree_path(repo: "Repo", pool_path: str) -> str:
+    return pool_path[len(repo.root_dir) + 1 :].replace(os.sep, "/")
+
+
+def _open_snapshot(repo: "Repo", version_commit: Commit, tmp_dir: str) -> PoolSnapshot:
+    """
+    Returns a snapshot of the pool of the version in tmp_dir, holding its metadata store. The pool files are only
+    written by `PoolSnapshot.iter_paths` when they are filtered, the filters being given their path in the repo.
+    """
+    snapshot = PoolSnapshot(os.path.join(tmp_dir, "pool"), repo.root_dir, repo.config["cache"]["dir"])
+    try:
+        metadata = version_commit.tree["/".join([repo.QDVC_DIR, repo.METADATA_FILE_NAME])]
+    except KeyError:
+        return snapshot
+    snapshot.write(repo.git_repo, [TreeEntry(f"{metadata.mode:o}", "blob", metadata.hexsha, metadata.path)])
+    return snapshot
+
+
+def _read_metadata(repo: "Repo", commit: Commit) -> Iterator[MetadataEntry]:
+    """
+    Yields the entries of the metadata store of commit, sorted by path.
+    """
+    try:
+        blob = commit.tree["/".join([repo.QDVC_DIR, repo.METADATA_FILE_NAME])]
+    except KeyError:
+        return
+    yield from parse_metadata(read_blob(repo.git_repo, blob.hexsha).decode("utf-8").splitlines())
+
+
+def _read_filter(repo: "Repo", init_commit: Commit, tmp_dir: str) -> Tuple[Blob, str]:
+    """
+    Writes the `filter.py` or `filter.yaml` of the init commit of a query in tmp_dir, and returns its blob and path.
+    """
+    filter_blob = init_commit.tree[_filter_blob_path(repo, init_commit)]
+    filter_path = os.path.join(tmp_dir, filter_blob.name)
+    with open(filter_path, "wb") as f:
+        f.write(filter_blob.data_stream.read())
+    return filter_blob, filter_path
+
+
+def _filter_blob_path(repo: "Repo", commit: Commit) -> str:
+    """
+    Returns the path in the tree of commit of its `filter.py` or `filter.yaml`.
+    """
+    for file_name in repo.FILTER_FILE_NAMES:
+        filter_blob_path = "/".join([repo.QDVC_DIR, file_name])
+        try:
+            commit.tree[filter_blob_path]
+            return filter_blob_path
+        except KeyError:
+            continue
+    raise Exception("Filter file in qdvc was not found")
+
+
+def _filter_blob_paths(repo: "Repo") -> List[str]:
+    return ["/".join([repo.QDVC_DIR, file_name]) for file_name in repo.FILTER_FILE_NAMES]
+
+
+def _is_composed(repo: "Repo", init_commit: Commit) -> bool:
+    """
+    Returns if the query of init_commit is composed from the results of other queries.
+    """
+    filter_blob_path = _filter_blob_path(repo, init_commit)
+    if not filter_blob_path.endswith(repo.FILTER_SPEC_FILE_NAME):
+        return False
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        _, filter_path = _read_filter(repo, init_commit, tmp_dir)
+        return load_composition(filter_path) is not None
+
+
+def _query_blob_paths(repo: "Repo") -> List[str]:
+    """
+    Returns the paths of the files a query result adds to its version besides the accepted files.
+    """
+    return _filter_blob_paths(repo) + [_result_manifest_blob_path(repo)]
+
+
+def _result_manifest_blob_path(repo: "Repo") -> str:
+    return "/".join([repo.QDVC_DIR, repo.RESULT_MANIFEST_FILE_NAME])
+
+
+def _result_entry(repo: "Repo", entry: TreeEntry, manifest: Dict[str, PoolEntry]) -> PoolEntry:
+    """
+    Returns the entry in the result manifest of the accepted pool file of entry, from the pool manifest, or from its
+    blob if it is missing from it.
+    """
+    path = entry.path[len(repo.QDVC_DATA_DIR) + 1 :]
+    if entry.path in manifest:
+        return manifest[entry.path]._replace(path=path)
+    return entry_from_dvc(path, read_blob(repo.git_repo, entry.sha).decode("utf-8"), entry.sha)
+
+
+def _result_manifest_entry(repo: "Repo", result: List[PoolEntry]) -> TreeEntry:
+    """
+    Stores the manifest of the result of a query as a blob, and returns its entry in the result tree.
+    """
+    data = "".join(manifest_lines(sorted(result))).encode("utf-8")
+    return TreeEntry("100644", "blob", write_blob(repo.git_repo, data), _result_manifest_blob_path(repo))
+
+
+def _write_result(
+    repo: "Repo",
+    query_branch: str,
+    version_commit: Commit,
+    init_commit: Commit,
+    filter_blob: Blob,
+    pool: Dict[str, TreeEntry],
+    manifest: Dict[str, PoolEntry],
+    accepted: Iterable[str],
+    writer: Optional[_ResultWriter] = None,
+) -> str:
+    """
+    Points query_branch to the result of a query made of the accepted files of pool, given by their path in the tree
+    of the version, at their original location. The result manifest is made of their entries in manifest, the files
+    missing from it being read from their blob.
+    """
+    entries = []
+    result = []
+    prefix_length = len(repo.QDVC_DATA_DIR) + 1
+    for path in accepted:
+        entry = pool[path]
+        entries.append(entry._replace(path=entry.path[prefix_length:]))
+        result.append(_result_entry(repo, entry, manifest))
+        if writer is not None:
+            writer.put(entries[-1])
+    return _commit_result(repo, query_branch, version_commit, init_commit, filter_blob, entries, result)
+
+
+def _write_composition(
+    repo: "Repo",
+    query_branch: str,
+    version: str,
+    version_commit: Commit,
+    init_commit: Commit,
+    filter_blob: Blob,
+    composition: Tuple[str, List[str]],
+    jobs: Optional[int],
+    batch_size: int,
+    sampler: Optional[Sampler] = None,
+    writer: Optional[_ResultWriter] = None,
+) -> str:
+    """
+    Points query_branch to the result of a composed query at the version, built from the result manifests of its
+    queries at the version, which are checked out first if needed.
+    """
+    operation, queries = composition
+    results = []
+    for query in queries:
+        branch = _query_branch(repo, query, version)
+        if not any(r.name == branch for r in repo.git_repo.heads):
+            logger.info(f"Checking out {branch} to compose {query_branch}.")
+            _checkout_without_worktree(repo, query, version, jobs, batch_size, True, True)
+        results.append(read_result(repo, branch))
+    result = list(compose_results(operation, results))
+    if sampler is not None:
+        by_path = {"/".join([repo.QDVC_DATA_DIR, entry.path]): entry for entry in result}
+        result = [by_path[path] for path in sampler.sample(by_path)]
+
+    data_paths = ["/".join([repo.QDVC_DATA_DIR, entry.path]) for entry in result]
+    shas = blob_shas(repo.git_repo, version_commit.hexsha, data_paths)
+    entries = [TreeEntry("100644", "blob", sha, entry.path) for sha, entry in zip(shas, result)]
+    if writer is not None:
+        for entry in entries:
+            writer.put(entry)
+    return _commit_result(repo, query_branch, version_commit, init_commit, filter_blob, entries, result)
+
+
+def _commit_result(
+    repo: "Repo",
+    query_branch: str,
+    version_commit: Commit,
+    init_commit: Commit,
+    filter_blob: Blob,
+    entries: List[TreeEntry],
+    result: List[PoolEntry],
+) -> str:
+    """
+    Points query_branch to a merge commit of the version and of the init commit of the query, whose tree is the tree
+    of the version with the `filter.py` of the query, the entries of the result files and the manifest of result.
+    If the branch already exists, checks that it has the same result instead.
+    """
+    git_repo = repo.git_repo
+    entries = [TreeEntry(f"{filter_blob.mode:o}", "blob", filter_blob.hexsha, filter_blob.path)] + entries
+    entries.append(_result_manifest_entry(repo, result))
+    commit = commit_tree(
+        git_repo, version_commit.hexsha, entries, _commit_message(), [version_commit.hexsha, init_commit.hexsha]
+    )
+
+    if any(r.name == query_branch for r in git_repo.heads):
+        existing = git_repo.heads[query_branch].commit
+        if git_repo.commit(commit).tree.hexsha != existing.tree.hexsha:
+            # Results committed before the result manifests only differ by it
+            manifest_path = _result_manifest_blob_path(repo)
+            if any(path != manifest_path for _, path in diff_name_status(git_repo, existing.hexsha, commit)):
+                raise Exception("The query branch was already created and is now inconsistent in the results.")
+        return existing.hexsha
+    git_repo.git.update_ref(f"refs/heads/{query_branch}", commit)
+    logger.info(f"Created {query_branch} without touching the working tree.")
+    return commit
+
+
+def checkout_worktrees(
+    repo: "Repo",
+    query: str,
+    versions: List[str],
+    download_files: bool,
+    worktree_dir: Optional[str] = None,
+    jobs: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    incremental: bool = True,
+    use_cache: bool = True,
+    download_jobs: Optional[int] = None,
+    sample: Optional[int] = None,
+    fraction: Optional[float] = None,
+    seed: int = 0,
+    shard: Optional[Tuple[int, int]] = None,
+    sparse: Optional[bool] = None,
+    **kwargs: Any,
+) -> List[str]:
+    """
+    Checks out several versions of a query side by side, each in its own git worktree under worktree_dir.
+    The query branches are built and the files downloaded in parallel, the worktrees sharing the DVC cache of repo.
+    With shard (i, n), only the i-th of n disjoint shares of each result is downloaded.
+    With sparse, the new worktrees leave out the `.data/` pool like `checkout`.
+    Returns the paths of the worktrees.
+    """
+    batch_size = batch_size or repo.config["checkout"]["batch_size"]
+    sampler = _open_sampler(repo, sample, fraction, seed)
+    _open_shard(repo.root_dir, shard, download_files)
+    worktree_dir = worktree_dir or os.path.join(repo.qdvc_dir, WORKTREES_DIR_NAME)
+    os.makedirs(worktree_dir, exist_ok=True)
+    exclude(repo.git_repo, repo.root_dir, [open_cache_dir(repo), worktree_dir])
+
+    def build(version: str) -> str:
+        # Each thread talks to git through its own persistent processes
+        thread_repo = copy.copy(repo)
+        thread_repo.git_repo = GitRepo(repo.git_dir)
+        return _checkout_without_worktree(
+            thread_repo, query, version, jobs, batch_size, incremental, use_cache, sampler
+        )
+
+    with ThreadPoolExecutor(len(versions)) as executor:
+        list(executor.map(build, versions))
+
+    paths = []
+    for version in versions:
+        query_branch = _query_branch(repo, query, version, sampler)
+        path = os.path.join(worktree_dir, query, query_branch.rsplit(repo.QUERY_SEPARATOR, 1)[-1])
+        if not os.path.exists(path):
+            if repo.config["checkout"]["sparse"] if sparse is None else sparse:
+                repo.git_repo.git.worktree("add", "--no-checkout", path, query_branch)
+                worktree_repo = GitRepo(path)
+                sparse_checkout(worktree_repo, _sparse_dirs(repo, query_branch))
+                worktree_repo.git.read_tree("-mu", "HEAD")
+            else:
+                repo.git_repo.git.worktree("add", path, query_branch)
+        _share_dvc_cache(repo, path)
+        paths.append(path)
+        logger.info(f"Checked out {query} at {version} in {path}")
+
     if download_files:
-        repo.dvc_repo.checkout(targets=new_paths)
+        with ThreadPoolExecutor(len(paths)) as executor:
+            list(executor.map(lambda path: _download_worktree(repo, path, download_jobs, batch_size, shard), paths))
+    return paths
 
-    # Add files and Commits branch
-    if not branch_already_exists:
-        repo.git_repo.git.add(new_paths)
-        repo.git_repo.git.commit('-m', f"Queried on {datetime.today().strftime('%Y-%m-%d')}")
 
-    # notifiy that user that if he's happy, he should push the branch
+def _sparse_dirs(repo: "Repo", query_branch: Optional[str] = None) -> List[str]:
+    """
+    Returns the directories checked out in cone mode for the result of query_branch: `.qdvc/`, `.dvc/` and the top
+    level directories of the files of the result. Outside of the pool, they only hold the files of the result.
+    """
+    dirs = {repo.QDVC_DIR, os.path.relpath(repo.dvc_dir, repo.root_dir).replace(os.sep, "/")}
+    if query_branch is not None:
+        dirs.update(entry.path.split("/", 1)[0] for entry in read_result(repo, query_branch) if "/" in entry.path)
+    return sorted(dirs)
+
+
+def _share_dvc_cache(repo: "Repo", path: str):
+    """
+    Configures the DVC repo of the worktree at path to use the cache of repo, linking files instead of copying them.
+    """
+    from dvc.repo import Repo as DvcRepo
+
+    with DvcRepo(path).config.edit("local") as conf:
+        conf["cache"]["dir"] = repo.dvc_repo.config["cache"]["dir"]
+        if not repo.dvc_repo.config["cache"].get("type"):
+            conf["cache"]["type"] = "reflink,hardlink,symlink,copy"
+
+
+def _download_worktree(
+    repo: "Repo", path: str, jobs: Optional[int], batch_size: int, shard: Optional[Tuple[int, int]] = None
+):
+    from dvc.repo import Repo as DvcRepo
+
+    owner = _open_shard(path, shard, True)
+    git_repo = GitRepo(path)
+    query_blob_paths = _query_blob_paths(repo)
+    result = [
+        os.path.join(path, result_path)
+        for status, result_path in diff_name_status(git_repo, "HEAD^1", "HEAD")
+        if status == "A" and result_path not in query_blob_paths
+    ]
+    with Downloader(DvcRepo(path), jobs=jobs, batch_size=batch_size) as downloader:
+        for target in result:
+            if owner is None or owner.owns(target):
+                downloader.put(target)
+
+
+def _commit_message() -> str:
+    return f"Queried on {datetime.today().strftime('%Y-%m-%d')}"
+
+
+def _iter_accepted(
+    repo: "Repo",
+    query: str,
+    version: str,
+    filter_path: str,
+    pool: Dict[str, TreeEntry],
+    manifest: Dict[str, PoolEntry],
+    digests: Dict[str, str],
+    jobs: Optional[int],
+    batch_size: int,
+    incremental: bool,
+    use_cache: bool,
+    snapshot: Optional[PoolSnapshot] = None,
+) -> Iterator[str]:
+    """
+    Yields the paths in the tree of the version of the files of pool accepted by the query of filter_path.
+    With a snapshot, the files are written in it batch by batch as they are filtered, and the filters read them from
+    it instead of the working tree.
+    The cached decisions are looked up with the md5 of the entries of manifest, the other files being parsed, and the
+    digests of their metadata.
+    """
+    with _open_cache(repo, filter_path, manifest, digests, use_cache, snapshot) as cache:
+        previous = _find_previous_result(repo, query, version) if incremental else None
+        if previous:
+            previous_branch, previous_version = previous
+            logger.info(f"Filtering only the files changed since {previous_branch}.")
+            yield from _incremental_filter(
+                repo, filter_path, pool, previous_branch, previous_version, version, jobs, batch_size, cache, snapshot
+            )
+        else:
+            paths = _iter_paths(repo, pool.values(), batch_size, snapshot)
+            accepted = iter_filtered(
+                filter_path, paths, jobs=jobs, chunk_size=batch_size, cache=cache, snapshot=snapshot
+            )
+            yield from (_tree_path(repo, path) for path in accepted)
+
+
+def _iter_paths(
+    repo: "Repo", entries: Iterable[TreeEntry], batch_size: int, snapshot: Optional[PoolSnapshot]
+) -> Iterator[str]:
+    """
+    Yields the paths given to the filters of the pool files of entries, once written in snapshot if there is one.
+    """
+    if snapshot is None:
+        return (_pool_path(repo, entry.path) for entry in entries)
+    return snapshot.iter_paths(repo.git_repo, entries, batch_size)
+
+
+def _open_cache(
+    repo: "Repo",
+    filter_path: str,
+    manifest: Dict[str, PoolEntry],
+    digests: Dict[str, str],
+    use_cache: bool,
+    snapshot: Optional[PoolSnapshot] = None,
+) -> ContextManager[Optional[FilterCache]]:
+    """
+    Opens the cache of the decisions of the query of filter_path. The decisions are keyed by the md5 of the entries
+    of manifest, the other files being parsed, followed by the hash in digests of the metadata of the file if it has
+    some, so that a file whose metadata changed is filtered again.
+    """
+    if not use_cache:
+        return nullcontext()
+    prefix_length = len(repo.QDVC_DATA_DIR) + 1
+
+    def md5_of(path: str) -> Optional[str]:
+        tree_path = _tree_path(repo, path)
+        entry = manifest.get(tree_path)
+        if entry is not None:
+            md5 = entry.md5
+        else:
+            md5 = read_md5(path if snapshot is None else snapshot.copy_path(path))
+        digest = digests.get(tree_path[prefix_length:])
+        return md5 if md5 is None or digest is None else f"{md5}+{digest}"
+
+    return FilterCache(
+        repo.config["cache"]["dir"],
+        repo.root_dir,
+        FilterCache.hash_filter(filter_path),
+        repo.config["cache"]["max_entries"],
+        md5_of,
+    )
+
+
+def _read_pool_manifest(repo: "Repo", commit: Commit, pool: Dict[str, TreeEntry]) -> Dict[str, PoolEntry]:
+    """
+    Returns the entries of the pool manifest of commit that are up to date with the files of pool, by their path in
+    the tree of commit. Entries whose blob hash differs from the committed file, e.g. after a `git rm` or a `dvc`
+    command changing the pool without qdvc, are left out: these files are parsed instead.
+    """
+    try:
+        blob = commit.tree["/".join([repo.QDVC_DIR, repo.POOL_MANIFEST_FILE_NAME])]
+    except KeyError:
+        return {}
+    manifest = {}
+    prefix = repo.QDVC_DATA_DIR + "/"
+    for entry in parse_manifest(read_blob(repo.git_repo, blob.hexsha).decode("utf-8").splitlines()):
+        tree_entry = pool.get(prefix + entry.path)
+        if tree_entry is not None and tree_entry.sha == entry.sha:
+            manifest[tree_entry.path] = entry
+    if len(manifest) < len(pool):
+        logger.debug(f"{len(pool) - len(manifest)} pool files are missing from the pool manifest or out of date.")
+    return manifest
+
+
+def _find_previous_result(repo: "Repo", query: str, version: str) -> Optional[Tuple[str, str]]:
+    """
+    Returns the (branch, version) of the already materialized result of the query that is the closest to version,
+    or None. Only results obtained with the same `filter.py` as the init branch of the query are considered.
+    """
+    git_repo = repo.git_repo
+    prefix = repo.QUERY_SEPARATOR.join([repo.QUERY_BRANCH_PREFIX, query, ""])
+    init_commit = git_repo.commit(prefix + repo.QUERY_INIT)
+    filter_blob_path = _filter_blob_path(repo, init_commit)
+    filter_blob = init_commit.tree[filter_blob_path].hexsha
+    target = git_repo.commit(version).hexsha
+
+    closest, closest_distance = None, None
+    for head in git_repo.heads:
+        previous_version = head.name[len(prefix) :]
+        if not head.name.startswith(prefix) or previous_version in (repo.QUERY_INIT, version):
+            continue
+        if SAMPLE_SEPARATOR in previous_version:
+            # Samples are not complete results
+            continue
+        try:
+            previous = git_repo.commit(previous_version).hexsha
+            if head.commit.tree[filter_blob_path].hexsha != filter_blob:
+                continue
+        except (BadName, KeyError, ValueError):
+            continue
+        distance = int(git_repo.git.rev_list("--count", f"{previous}...{target}"))
+        if closest_distance is None or distance < closest_distance:
+            closest, closest_distance = (head.name, previous_version), distance
+    return closest
+
+
+def _incremental_filter(
+    repo: "Repo",
+    filter_path: str,
+    pool: Dict[str, TreeEntry],
+    previous_branch: str,
+    previous_version: str,
+    version: str,
+    jobs: Optional[int],
+    batch_size: int,
+    cache: Optional[FilterCache],
+    snapshot: Optional[PoolSnapshot] = None,
+) -> List[str]:
+    """
+    Returns the paths in the tree of the version of the pool files accepted by the query, reusing its result at
+    previous_version. Only the pool files added or modified between both versions, or whose metadata changed, are
+    filtered.
+    """
+    git_repo = repo.git_repo
+    query_blob_paths = _query_blob_paths(repo)
+    previous_result = {
+        "/".join([repo.QDVC_DATA_DIR, path])
+        for status, path in diff_name_status(git_repo, previous_version, previous_branch)
+        if status == "A" and path not in query_blob_paths
+    }
+
+    changed = []
+    for status, path in diff_name_status(git_repo, previous_version, version, repo.QDVC_DATA_DIR):
+        previous_result.discard(path)
+        if status != "D" and path in pool:
+            changed.append(path)
+    changed_set = set(changed)
+    metadata_changes = changed_metadata(
+        _read_metadata(repo, git_repo.commit(previous_version)), _read_metadata(repo, git_repo.commit(version))
+    )
+    for pool_path in metadata_changes:
+        path = "/".join([repo.QDVC_DATA_DIR, pool_path])
+        previous_result.discard(path)
+        if path in pool and path not in changed_set:
+            changed.append(path)
+
+    paths = _iter_paths(repo, (pool[path] for path in changed), batch_size, snapshot)
+    accepted = iter_filtered(filter_path, paths, jobs=jobs, chunk_size=batch_size, cache=cache, snapshot=snapshot)
+    return sorted(previous_result.union(_tree_path(repo, path) for path in accepted))
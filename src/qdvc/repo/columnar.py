@@ -0,0 +1,272 @@
+"""Columnar, memory-mapped form of the metadata store, with a hash index on pool paths."""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence
+
+from .metadata import read_metadata
+from .snapshot import active_snapshot
+
+if TYPE_CHECKING:
+    import numpy as np
+
+COLUMNAR_DIR_NAME = "metadata"
+PATHS_FILE_NAME = "paths.npy"
+INDEX_FILE_NAME = "index.npy"
+COLUMNS_FILE_NAME = "columns.json"
+# Builds of other states of the metadata store are removed once they were not opened for this long
+STALE_BUILD_SECONDS = 24 * 3600
+_EMPTY = -1
+
+
+def _import_numpy():
+    try:
+        import numpy
+    except ImportError as exc:
+        raise ImportError(
+            "The columnar metadata store requires NumPy, install it with `pip install qdvc[metadata]`."
+        ) from exc
+    return numpy
+
+
+def _hash_path(path: str) -> int:
+    return int.from_bytes(hashlib.blake2b(path.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _digest(metadata_path: str) -> str:
+    sha = hashlib.sha1()
+    with open(metadata_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+class ColumnarMetadata:
+    """
+    Metadata of the pool files, stored column by column in memory-mapped NumPy arrays, one row per pool file.
+    Numeric columns use NaN for missing values, other columns are stored as strings, empty when missing.
+    Rows are found in O(1) by an open addressing hash table on the pool paths.
+    Args:
+        columnar_dir (str): directory of the arrays, built by `ColumnarMetadata.build`.
+    """
+
+    def __init__(self, columnar_dir: str):
+        np = _import_numpy()
+        self.columnar_dir = columnar_dir
+        self.paths = np.load(os.path.join(columnar_dir, PATHS_FILE_NAME), mmap_mode="r")
+        self._index = np.load(os.path.join(columnar_dir, INDEX_FILE_NAME), mmap_mode="r")
+        with open(os.path.join(columnar_dir, COLUMNS_FILE_NAME), encoding="utf-8") as f:
+            self._column_files: Dict[str, str] = json.load(f)
+        # All mapped at once, so that the store stays readable if its directory is removed afterwards
+        self._columns: Dict[str, "np.ndarray"] = {
+            name: np.load(os.path.join(columnar_dir, file_name), mmap_mode="r")
+            for name, file_name in self._column_files.items()
+        }
+        self.pool_dir: Optional[str] = None
+
+    @classmethod
+    def open(cls, root_dir: Optional[str] = None) -> "ColumnarMetadata":
+        """
+        Opens the columnar form of the metadata store of the repo at root_dir, found from the current directory by
+        default. While `qdvc checkout` filters a version, the metadata store of that version is opened by default.
+        It is built in the cache directory the first time the metadata store is opened in a given state.
+        """
+        from qdvc.config import Config
+        from qdvc.repo import Repo
+
+        snapshot = active_snapshot()
+        if root_dir is None and snapshot is not None:
+            root_dir, store_dir, cache_dir = snapshot.repo_dir, snapshot.root_dir, snapshot.cache_dir
+        else:
+            root_dir = store_dir = os.path.abspath(root_dir or os.path.dirname(Repo.find_qdvc_dir()))
+            cache_dir = Config(os.path.join(root_dir, Repo.QDVC_DIR))["cache"]["dir"]
+        metadata_path = os.path.join(store_dir, Repo.QDVC_DIR, Repo.METADATA_FILE_NAME)
+        if not os.path.exists(metadata_path):
+            raise Exception(f"{metadata_path} was not found, add files with metadata extractors first.")
+        parent_dir = os.path.join(cache_dir, COLUMNAR_DIR_NAME)
+        columnar_dir = os.path.join(parent_dir, _digest(metadata_path))
+        if not os.path.exists(columnar_dir):
+            cls.build(metadata_path, columnar_dir)
+        try:
+            metadata = cls(columnar_dir)
+        except FileNotFoundError:
+            # Removed as stale by another process after it was found, it is built again with a fresh modification time
+            cls.build(metadata_path, columnar_dir)
+            metadata = cls(columnar_dir)
+        try:
+            os.utime(columnar_dir)
+        except OSError:
+            # Already mapped, the store stays readable
+            pass
+        _remove_stale_builds(parent_dir)
+        metadata.pool_dir = os.path.join(root_dir, Repo.QDVC_DATA_DIR)
+        return metadata
+
+    @staticmethod
+    def build(metadata_path: str, columnar_dir: str):
+        """
+        Builds the columnar form of the metadata store at metadata_path in columnar_dir. The arrays are written in a
+        temporary directory renamed at the end, so that concurrent builds and readers never see a partial store.
+        """
+        np = _import_numpy()
+        paths: List[str] = []
+        values: Dict[str, List[Any]] = {}
+        for row, entry in enumerate(read_metadata(metadata_path)):
+            paths.append(entry.path)
+            for name, value in json.loads(entry.fields).items():
+                values.setdefault(name, [None] * row).append(value)
+            for column in values.values():
+                if len(column) == row:
+                    column.append(None)
+
+        slots = 1 << max(1, (2 * len(paths) - 1).bit_length())
+        index = np.full(slots, _EMPTY, dtype=np.int64)
+        for row, path in enumerate(paths):
+            slot = _hash_path(path) & (slots - 1)
+            while index[slot] != _EMPTY:
+                slot = (slot + 1) & (slots - 1)
+            index[slot] = row
+
+        parent_dir = os.path.dirname(columnar_dir)
+        os.makedirs(parent_dir, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=parent_dir, prefix=".tmp")
+        np.save(os.path.join(tmp_dir, PATHS_FILE_NAME), np.array(paths, dtype=str))
+        np.save(os.path.join(tmp_dir, INDEX_FILE_NAME), index)
+        column_files = {}
+        for i, (name, column) in enumerate(sorted(values.items())):
+            column_files[name] = f"column{i}.npy"
+            np.save(os.path.join(tmp_dir, column_files[name]), _to_array(np, column))
+        with open(os.path.join(tmp_dir, COLUMNS_FILE_NAME), "w", encoding="utf-8") as f:
+            json.dump(column_files, f)
+        try:
+            os.replace(tmp_dir, columnar_dir)
+        except OSError:
+            # Built concurrently by another process
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self._column_files)
+
+    def column(self, name: str) -> "np.ndarray":
+        """
+        Returns the whole column name, as a read-only memory-mapped array with one value per row.
+        """
+        if name not in self._columns:
+            raise KeyError(f"No metadata column '{name}', the columns are {', '.join(self.columns)}.")
+        return self._columns[name]
+
+    def _key(self, filepath: str) -> str:
+        if os.path.isabs(filepath) and self.pool_dir:
+            filepath = os.path.relpath(filepath, self.pool_dir)
+        return filepath.replace(os.sep, "/")
+
+    def row(self, filepath: str) -> int:
+        """
+        Returns the row of the pool file filepath, given as the path received by `Query.filter` or relative to the
+        pool directory, or -1 if it has no metadata.
+        """
+        key = self._key(filepath)
+        mask = len(self._index) - 1
+        slot = _hash_path(key) & mask
+        while True:
+            row = int(self._index[slot])
+            if row == _EMPTY or self.paths[row] == key:
+                return row
+            slot = (slot + 1) & mask
+
+    def rows(self, filepaths: Sequence[str]) -> "np.ndarray":
+        """
+        Returns the rows of filepaths, -1 for the files without metadata.
+        """
+        np = _import_numpy()
+        return np.fromiter((self.row(filepath) for filepath in filepaths), dtype=np.int64, count=len(filepaths))
+
+    def get(self, filepath: str) -> Dict[str, Any]:
+        """
+        Returns the metadata of the pool file filepath, without its missing values.
+        """
+        row = self.row(filepath)
+        if row == _EMPTY:
+            return {}
+        values = {name: self.column(name)[row].item() for name in self.columns}
+        return {name: value for name, value in values.items() if value == value and value != ""}
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+
+def _remove_stale_builds(parent_dir: str):
+    """
+    Removes the builds in parent_dir that were not opened for `STALE_BUILD_SECONDS`. Each build is renamed before
+    being deleted, so that readers either open it whole or do not find it and build it again.
+    """
+    now = time.time()
+    for name in os.listdir(parent_dir):
+        path = os.path.join(parent_dir, name)
+        removed_path = os.path.join(parent_dir, f".tmp-{name}-{os.getpid()}")
+        try:
+            if name.startswith(".tmp") or now - os.stat(path).st_mtime < STALE_BUILD_SECONDS:
+                continue
+            os.replace(path, removed_path)
+        except OSError:
+            # Removed or opened concurrently
+            continue
+        shutil.rmtree(removed_path, ignore_errors=True)
+
+
+def _to_array(np, column: List[Any]) -> "np.ndarray":
+    present = [value for value in column if value is not None]
+    if present and all(isinstance(value, bool) for value in present) and len(present) == len(column):
+        return np.array(column, dtype=bool)
+    if present and all(isinstance(value, int) and not isinstance(value, bool) for value in present):
+        if len(present) == len(column):
+            return np.array(column, dtype=np.int64)
+    if present and all(isinstance(value, (int, float)) for value in present):
+        return np.array([np.nan if value is None else value for value in column], dtype=np.float64)
+    return np.array(
+        ["" if value is None else value if isinstance(value, str) else json.dumps(value) for value in column],
+        dtype=str,
+    )
+
+
+class MetadataQuery:
+    """
+    Base class of queries deciding on metadata, evaluated as whole NumPy arrays. Subclasses implement `select`:
+
+        class Query(MetadataQuery):
+            def __init__(self):
+                super().__init__()
+                self.large = self.metadata.column("width") >= 1024
+
+            def select(self, rows):
+                return self.large[rows]
+
+    Files without metadata are rejected.
+    Args:
+        root_dir (str): root of the repo, found from the current directory by default. While `qdvc checkout` filters
+            a version, the metadata store of that version is read by default.
+    """
+
+    def __init__(self, root_dir: Optional[str] = None):
+        self.metadata = ColumnarMetadata.open(root_dir)
+
+    def select(self, rows: "np.ndarray") -> "np.ndarray":
+        """
+        Returns a boolean array telling for each of the rows of the metadata if it should be kept in the filtered data.
+        """
+        raise NotImplementedError
+
+    def filter_batch(self, filepaths: Sequence[str]) -> "np.ndarray":
+        np = _import_numpy()
+        rows = self.metadata.rows(filepaths)
+        keep = np.zeros(len(rows), dtype=bool)
+        found = rows != _EMPTY
+        keep[found] = self.select(rows[found])
+        return keep
+
+    def filter(self, filepath: str) -> bool:
+        return bool(self.filter_batch([filepath])[0])
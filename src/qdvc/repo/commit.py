@@ -18,8 +18,8 @@ def commit(
     # Check if we are on a query branch
     if not repo.is_query_branch():
         raise Exception("You tried to commit a query but you are not on a query branch. Please create a new query")
-    filter_path = os.path.join(repo.qdvc_dir, repo.FILTER_FILE_NAME)
-    # Check if only the filter.py was modified, and there is nothing else than things in .data folder
+    filter_path = repo.find_filter()
+    # Check if only the filter.py or filter.yaml was modified, and there is nothing else than things in .data folder
     diff = repo.git_repo.index.diff("HEAD")
     found_filter_file = False
     for file_diff in diff:
@@ -0,0 +1,103 @@
+"""Queries composed from the results of other queries by set operations."""
+import heapq
+import json
+import logging
+from itertools import groupby, repeat
+from typing import TYPE_CHECKING, Any, Iterable, Iterator, List, Optional, Tuple
+
+from .githelper import TreeEntry, commit_tree, write_blob
+from .pool import PoolEntry
+from .spec import is_spec, load_spec
+
+if TYPE_CHECKING:
+    from qdvc.repo import Repo
+
+logger = logging.getLogger(__name__)
+
+UNION = "union"
+INTERSECT = "intersect"
+MINUS = "minus"
+OPERATIONS = (UNION, INTERSECT, MINUS)
+
+
+def compose(
+    repo: "Repo",
+    name: str,
+    operation: str,
+    queries: List[str],
+    versions: Optional[List[str]] = None,
+    **kwargs: Any,
+) -> str:
+    """
+    Creates the init branch of the query name, whose result at a version is the union or the intersection of the
+    results of queries at that version, or the result of the first query minus the results of the others.
+    Its `filter.yaml` only declares the composition: `qdvc checkout` builds its results from the result manifests
+    of queries, checking them out first if needed, without evaluating any filter.
+    The results at versions are built right away. The working tree is left untouched.
+    """
+    git_repo = repo.git_repo
+    if operation not in OPERATIONS:
+        raise Exception(f"Unknown operation '{operation}', use one of {', '.join(OPERATIONS)}.")
+    if len(queries) < 2:
+        raise Exception(f"A {operation} needs at least 2 queries, got {len(queries)}.")
+    if name in queries:
+        raise Exception(f"The query {name} cannot be composed from itself.")
+    init_branch = repo.QUERY_SEPARATOR.join([repo.QUERY_BRANCH_PREFIX, name, repo.QUERY_INIT])
+    heads = {head.name for head in git_repo.heads}
+    if init_branch in heads:
+        raise Exception(f"The query {name} already exists.")
+    for query in queries:
+        if repo.QUERY_SEPARATOR.join([repo.QUERY_BRANCH_PREFIX, query, repo.QUERY_INIT]) not in heads:
+            raise Exception(f"The query {query} was not found. Please create it with `qdvc query`.")
+    if "master" not in heads:
+        raise Exception(
+            "Please create a first commit on master branch, e.g. by commiting config files or adding new data."
+        )
+
+    spec = (
+        "# Query composed by `qdvc query compose`, its results are built from the results of other queries at the\n"
+        "# same version by `qdvc checkout`, without filtering the pool.\n"
+        f"compose:\n  {operation}: {json.dumps(queries)}\n"
+    )
+    spec_path = "/".join([repo.QDVC_DIR, repo.FILTER_SPEC_FILE_NAME])
+    spec_entry = TreeEntry("100644", "blob", write_blob(git_repo, spec.encode("utf-8")), spec_path)
+    master = git_repo.heads.master.commit.hexsha
+    message = f"Compose {name} as the {operation} of {', '.join(queries)}"
+    git_repo.git.update_ref(f"refs/heads/{init_branch}", commit_tree(git_repo, master, [spec_entry], message, [master]))
+    logger.info(f"Created {init_branch}.")
+
+    for version in versions or []:
+        repo.checkout(name, version, False, worktree=False)
+    return name
+
+
+def load_composition(filter_path: str) -> Optional[Tuple[str, List[str]]]:
+    """
+    Returns the (operation, queries) of the query of filter_path, or None if it is not composed.
+    """
+    if not is_spec(filter_path):
+        return None
+    composition = load_spec(filter_path).get("compose")
+    if not composition:
+        return None
+    if len(composition) != 1:
+        raise Exception(f"A composed query has a single operation, got {', '.join(composition)}.")
+    ((operation, queries),) = composition.items()
+    return operation, queries
+
+
+def compose_results(operation: str, results: List[Iterable[PoolEntry]]) -> Iterator[PoolEntry]:
+    """
+    Yields the entries of the composition of results, sorted by path like each of results.
+    The results are merged in a single pass, in time proportional to their sizes.
+    """
+    merged = heapq.merge(*(zip(result, repeat(i)) for i, result in enumerate(results)))
+    for _, group in groupby(merged, key=lambda item: item[0].path):
+        members = list(group)
+        operands = {i for _, i in members}
+        if (
+            operation == UNION
+            or (operation == INTERSECT and len(operands) == len(results))
+            or (operation == MINUS and operands == {0})
+        ):
+            yield members[0][0]
@@ -0,0 +1,90 @@
+"""Differences between the results of a query at two versions, read from their result manifests."""
+import logging
+from typing import TYPE_CHECKING, Any, Iterator, NamedTuple
+
+from .githelper import diff_name_status, read_blob
+from .pool import PoolEntry, entry_from_dvc, parse_manifest
+
+if TYPE_CHECKING:
+    from qdvc.repo import Repo
+
+logger = logging.getLogger(__name__)
+
+ADDED = "A"
+REMOVED = "D"
+MODIFIED = "M"
+
+
+class ResultChange(NamedTuple):
+    """A file added, removed or modified between two results of a query, with its sizes in both."""
+
+    status: str
+    path: str
+    old_size: int
+    new_size: int
+
+    @property
+    def size_delta(self) -> int:
+        return self.new_size - self.old_size
+
+
+def diff(
+    repo: "Repo",
+    query: str,
+    old_version: str,
+    new_version: str,
+    **kwargs: Any,
+) -> Iterator[ResultChange]:
+    """
+    Yields the files added, removed or modified in the result of query between old_version and new_version, sorted
+    by path. Both results must have been checked out, they are read from git without touching the working tree.
+    """
+    old_branch, new_branch = (
+        repo.QUERY_SEPARATOR.join([repo.QUERY_BRANCH_PREFIX, query, version]) for version in (old_version, new_version)
+    )
+    return diff_results(read_result(repo, old_branch), read_result(repo, new_branch))
+
+
+def read_result(repo: "Repo", query_branch: str) -> Iterator[PoolEntry]:
+    """
+    Yields the entries of the result committed on query_branch, sorted by path.
+    Results committed without a result manifest are read from the files they add to their version.
+    """
+    git_repo = repo.git_repo
+    if not any(head.name == query_branch for head in git_repo.heads):
+        raise Exception(f"{query_branch} was not found, please checkout it first.")
+    commit = git_repo.heads[query_branch].commit
+    manifest_path = "/".join([repo.QDVC_DIR, repo.RESULT_MANIFEST_FILE_NAME])
+    try:
+        manifest = commit.tree[manifest_path]
+    except KeyError:
+        logger.warning(f"{query_branch} has no result manifest, reading its result from the tree.")
+        paths = sorted(
+            path
+            for status, path in diff_name_status(git_repo, commit.parents[0].hexsha, commit.hexsha)
+            if status == ADDED and not path.startswith(repo.QDVC_DIR + "/")
+        )
+        for path in paths:
+            sha = commit.tree[path].hexsha
+            yield entry_from_dvc(path, read_blob(git_repo, sha).decode("utf-8"), sha)
+        return
+    yield from parse_manifest(read_blob(git_repo, manifest.hexsha).decode("utf-8").splitlines())
+
+
+def diff_results(old_entries: Iterator[PoolEntry], new_entries: Iterator[PoolEntry]) -> Iterator[ResultChange]:
+    """
+    Merges two iterators of entries sorted by path, and yields the changes from the old ones to the new ones.
+    Entries are modified when their md5 or their size differ.
+    """
+    old, new = next(old_entries, None), next(new_entries, None)
+    while old is not None or new is not None:
+        if new is None or (old is not None and old.path < new.path):
+            yield ResultChange(REMOVED, old.path, old.size, 0)  # type: ignore[union-attr]
+            old = next(old_entries, None)
+        elif old is None or new.path < old.path:
+            yield ResultChange(ADDED, new.path, 0, new.size)
+            new = next(new_entries, None)
+        else:
+            if old.md5 != new.md5 or old.size != new.size:
+                yield ResultChange(MODIFIED, new.path, old.size, new.size)
+            old, new = next(old_entries, None), next(new_entries, None)
@@ -0,0 +1,80 @@
+import logging
+import queue
+import threading
+from typing import TYPE_CHECKING, List, Optional
+
+if TYPE_CHECKING:
+    from dvc.repo import Repo as DvcRepo
+
+logger = logging.getLogger(__name__)
+
+# Sentinel telling the download thread that no more targets will come
+_DONE = None
+
+
+class Downloader:
+    """
+    Downloads the data of `.dvc` files in a background thread, while they are still being produced.
+    Targets are sent in batches through a bounded queue: the producer blocks when the downloads lag behind, so the
+    memory stays flat whatever the number of targets.
+    Args:
+        dvc_repo (DvcRepo): repo whose targets are downloaded. It must not be used by other threads meanwhile.
+        jobs (int): number of jobs fetching the data from the default remote simultaneously.
+        batch_size (int): number of targets fetched and checked out at once.
+        max_pending (int): number of full batches waiting for the download thread before the producer blocks.
+    """
+
+    def __init__(self, dvc_repo: "DvcRepo", jobs: Optional[int] = None, batch_size: int = 1000, max_pending: int = 2):
+        self.dvc_repo = dvc_repo
+        self.jobs = jobs
+        self.batch_size = batch_size
+        self.error: Optional[BaseException] = None
+        self._batch: List[str] = []
+        self._queue: "queue.Queue[Optional[List[str]]]" = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, name="qdvc-download", daemon=True)
+        self._thread.start()
+
+    def put(self, target: str):
+        if self.error is not None:
+            raise self.error
+        self._batch.append(target)
+        if len(self._batch) >= self.batch_size:
+            self._queue.put(self._batch)
+            self._batch = []
+
+    def close(self):
+        if self._batch:
+            self._queue.put(self._batch)
+            self._batch = []
+        self._queue.put(_DONE)
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def _run(self):
+        while True:
+            batch = self._queue.get()
+            if batch is _DONE:
+                return
+            if self.error is not None:
+                # Keep draining the queue so that the producer never blocks after a failure
+                continue
+            try:
+                self._download(batch)
+            except BaseException as exc:  # pylint: disable=broad-except
+                self.error = exc
+
+    def _download(self, targets: List[str]):
+        if self.dvc_repo.config["core"].get("remote"):
+            self.dvc_repo.fetch(targets=targets, jobs=self.jobs)
+        self.dvc_repo.checkout(targets=targets)
+        logger.debug(f"Downloaded {len(targets)} files.")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._queue.put(_DONE)
@@ -0,0 +1,319 @@
+"""Evaluation of a query's `filter.py` over the files of the data pool."""
+import importlib.util
+import itertools
+import logging
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from importlib.machinery import SourceFileLoader
+from itertools import islice
+from typing import TYPE_CHECKING, Callable, ContextManager, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .pool import PoolRecord, read_record
+from .snapshot import activate, active_snapshot
+from .spec import is_spec, spec_query_class
+
+if TYPE_CHECKING:
+    from .cache import FilterCache
+    from .snapshot import PoolSnapshot
+
+logger = logging.getLogger(__name__)
+
+FILTER_MODULE_NAME = "filter"
+# Suffixes of the module names of the loaded filters, unique so that threads loading filters never share a module
+_module_ids = itertools.count()
+CHUNK_SIZE = 1000
+
+# Query instance of a worker process, built once by `_init_worker`
+_worker_query = None
+# Query instances of a worker process, built once by `_init_worker_many`
+_worker_queries: List = []
+
+
+def load_query_class(filter_path: str) -> type:
+    """
+    Imports the `filter.py` file at filter_path and returns its `Query` class.
+    A `filter.yaml` spec is compiled into a `SpecQuery` instead.
+    Each filter is imported as its own module, registered under a unique name, so that the filters loaded by
+    concurrent checkouts do not replace each other. While a snapshot is active, the `__file__` of the module is the
+    `filter.py` of the `.qdvc` directory of the repo, whatever the copy of the filter that is run.
+    """
+    from qdvc.repo import Repo
+
+    if is_spec(filter_path):
+        return spec_query_class(filter_path)
+    module_name = f"{FILTER_MODULE_NAME}_{next(_module_ids)}"
+    snapshot = active_snapshot()
+    origin = filter_path
+    if snapshot is not None:
+        origin = os.path.join(snapshot.repo_dir, Repo.QDVC_DIR, os.path.basename(filter_path))
+    loader = SourceFileLoader(module_name, filter_path)
+    spec = importlib.util.spec_from_file_location(module_name, origin, loader=loader)
+    if not spec or not spec.loader:
+        raise Exception("Filter file in qdvc was not found")
+    mod = importlib.util.module_from_spec(spec)
+    # Registered before running it, for the dataclasses and pickled objects defined by the filter
+    sys.modules[module_name] = mod
+    spec.loader.exec_module(mod)
+    return mod.Query  # type: ignore[attr-defined]
+
+
+def is_fork_safe(query_cls: type) -> bool:
+    """
+    Returns if the query can be evaluated in worker processes. Filters opt out by setting `FORK_SAFE = False`.
+    """
+    return bool(getattr(query_cls, "FORK_SAFE", True))
+
+
+def load_dir_filter(filter_path: str) -> Optional[Callable[[str], bool]]:
+    """
+    Returns the `filter_dir` method of a query built in the current process, or None if the query of filter_path
+    does not implement it.
+    """
+    query_cls = load_query_class(filter_path)
+    if not hasattr(query_cls, "filter_dir"):
+        return None
+    return query_cls().filter_dir
+
+
+def prune_paths(paths: Iterable[str], root_dir: str, filter_dir: Callable[[str], bool]) -> Iterator[str]:
+    """
+    Yields the paths under root_dir that are not in a directory rejected by filter_dir, in the order of paths.
+    filter_dir is called at most once per directory, and never under a rejected directory.
+    """
+    selected = dir_selector(root_dir, filter_dir)
+    return (path for path in paths if selected(path))
+
+
+def dir_selector(root_dir: str, filter_dir: Callable[[str], bool]) -> Callable[[str], bool]:
+    """
+    Returns a function telling if a path under root_dir is not in a directory rejected by filter_dir.
+    filter_dir is called at most once per directory, and never under a rejected directory.
+    """
+    decisions: Dict[str, bool] = {}
+    prefix = os.path.join(root_dir, "")
+
+    def accepted(dirpath: str) -> bool:
+        if not dirpath.startswith(prefix):
+            return True
+        if dirpath not in decisions:
+            decisions[dirpath] = accepted(os.path.dirname(dirpath)) and bool(filter_dir(dirpath))
+        return decisions[dirpath]
+
+    return lambda path: accepted(os.path.dirname(path))
+
+
+def _chunked(iterable: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _init_worker(filter_path: str, snapshot: Optional["PoolSnapshot"] = None):
+    global _worker_query
+    activate(snapshot)
+    _worker_query = load_query_class(filter_path)()
+
+
+def _filter_chunk(paths: List[str]) -> List[bool]:
+    return evaluate(_worker_query, paths)
+
+
+def _init_worker_many(filter_paths: List[str], snapshot: Optional["PoolSnapshot"] = None):
+    global _worker_queries
+    activate(snapshot)
+    _worker_queries = [load_query_class(filter_path)() for filter_path in filter_paths]
+
+
+def _filter_chunk_many(paths: List[List[str]]) -> List[List[bool]]:
+    return evaluate_many(_worker_queries, paths)
+
+
+def uses_records(query) -> bool:
+    """
+    Returns if the query decides on parsed `.dvc` records, with `filter_record`.
+    """
+    return hasattr(query, "filter_record") and not hasattr(query, "filter_batch")
+
+
+def evaluate(query, paths: Sequence[str], records: Optional[Sequence[PoolRecord]] = None) -> List[bool]:
+    """
+    Returns the decision of the query for each of the paths.
+    Queries implementing `filter_batch` are called once for all paths instead of calling `filter` per path.
+    Queries implementing `filter_record` are given the records of the paths, parsed from the `.dvc` files if None.
+    """
+    if hasattr(query, "filter_batch"):
+        keep = query.filter_batch(paths)
+        if len(keep) != len(paths):
+            raise Exception(f"Query.filter_batch returned {len(keep)} results for {len(paths)} paths.")
+        return [bool(k) for k in keep]
+    if hasattr(query, "filter_record"):
+        if records is None:
+            records = [read_record(path) for path in paths]
+        return [bool(query.filter_record(record)) for record in records]
+    return [bool(query.filter(path)) for path in paths]
+
+
+def evaluate_many(queries: List, paths: Sequence[Sequence[str]]) -> List[List[bool]]:
+    """
+    Returns the decisions of each of the queries on its own list of paths. The `.dvc` files are parsed once for all
+    the queries implementing `filter_record`. Queries without paths are not called.
+    """
+    records: Dict[str, PoolRecord] = {}
+    decisions: List[List[bool]] = []
+    for query, query_paths in zip(queries, paths):
+        if not query_paths or not uses_records(query):
+            decisions.append(evaluate(query, query_paths) if query_paths else [])
+            continue
+        for path in query_paths:
+            if path not in records:
+                records[path] = read_record(path)
+        decisions.append(evaluate(query, query_paths, [records[path] for path in query_paths]))
+    return decisions
+
+
+def iter_filtered(
+    filter_path: str,
+    paths: Iterable[str],
+    jobs: Optional[int] = None,
+    chunk_size: int = CHUNK_SIZE,
+    cache: Optional["FilterCache"] = None,
+    snapshot: Optional["PoolSnapshot"] = None,
+) -> Iterator[str]:
+    """
+    Yields the paths accepted by the query of filter_path, in the order of paths.
+    The paths are evaluated in chunks of chunk_size, which is the size of the batches given to `Query.filter_batch`.
+    With jobs > 1 the chunks are evaluated by that many worker processes, each building its own `Query`.
+    Only a bounded number of chunks is in flight at once.
+    Decisions found in cache are reused, the others are stored into it.
+    The queries are built and evaluated with snapshot active, so that they read the pool files and the metadata
+    store of its version.
+    Queries implementing `filter_record` are given the records parsed from the `.dvc` files by the process
+    evaluating the chunk.
+    """
+    with _activated(snapshot):
+        query_cls = load_query_class(filter_path)
+        if jobs and jobs > 1 and not is_fork_safe(query_cls):
+            logger.warning("The query declares itself as not fork-safe, filtering in a single process.")
+            jobs = None
+
+        if not jobs or jobs <= 1:
+            query = query_cls()
+            for chunk in _chunked(paths, chunk_size):
+                keys, known, misses = _lookup(cache, chunk)
+                yield from _accepted(cache, keys, known, misses, evaluate(query, misses) if misses else [])
+            return
+
+    with ProcessPoolExecutor(jobs, initializer=_init_worker, initargs=(filter_path, snapshot)) as executor:
+        pending: deque = deque()
+        for chunk in _chunked(paths, chunk_size):
+            keys, known, misses = _lookup(cache, chunk)
+            pending.append((keys, known, misses, executor.submit(_filter_chunk, misses) if misses else None))
+            if len(pending) >= 2 * jobs:
+                yield from _resolve(cache, *pending.popleft())
+        while pending:
+            yield from _resolve(cache, *pending.popleft())
+
+
+def iter_decisions(
+    filter_paths: List[str],
+    paths: Iterable[str],
+    jobs: Optional[int] = None,
+    chunk_size: int = CHUNK_SIZE,
+    caches: Optional[List[Optional["FilterCache"]]] = None,
+    selectors: Optional[List[Optional[Callable[[str], bool]]]] = None,
+    snapshot: Optional["PoolSnapshot"] = None,
+) -> Iterator[Tuple[List[str], List[List[bool]]]]:
+    """
+    Yields each chunk of paths, in order, with the decisions of the query of every filter path on it.
+    All the queries are evaluated on a chunk before moving to the next one, so that the paths are read only once.
+    Each query may have its own cache of decisions, used like in `iter_filtered`, and its own selector: the paths
+    it rejects are rejected by the query without being evaluated.
+    The queries are built and evaluated with snapshot active, like in `iter_filtered`.
+    """
+    caches = caches or [None] * len(filter_paths)
+    selectors = selectors or [None] * len(filter_paths)
+    with _activated(snapshot):
+        query_classes = [load_query_class(filter_path) for filter_path in filter_paths]
+        if jobs and jobs > 1 and not all(is_fork_safe(query_cls) for query_cls in query_classes):
+            logger.warning("A query declares itself as not fork-safe, filtering in a single process.")
+            jobs = None
+
+        if not jobs or jobs <= 1:
+            queries = [query_cls() for query_cls in query_classes]
+            for chunk in _chunked(paths, chunk_size):
+                lookups = _lookup_many(caches, selectors, chunk)
+                results = evaluate_many(queries, [misses for _, _, misses in lookups])
+                yield chunk, _decisions_many(caches, chunk, lookups, results)
+            return
+
+    with ProcessPoolExecutor(jobs, initializer=_init_worker_many, initargs=(filter_paths, snapshot)) as executor:
+        pending: deque = deque()
+        for chunk in _chunked(paths, chunk_size):
+            lookups = _lookup_many(caches, selectors, chunk)
+            pending.append((chunk, lookups, executor.submit(_filter_chunk_many, [misses for _, _, misses in lookups])))
+            if len(pending) >= 2 * jobs:
+                chunk, lookups, future = pending.popleft()
+                yield chunk, _decisions_many(caches, chunk, lookups, future.result())
+        while pending:
+            chunk, lookups, future = pending.popleft()
+            yield chunk, _decisions_many(caches, chunk, lookups, future.result())
+
+
+def _lookup_many(
+    caches: List[Optional["FilterCache"]], selectors: List[Optional[Callable[[str], bool]]], chunk: List[str]
+) -> List[Tuple[List, Dict[str, bool], List[str]]]:
+    lookups = []
+    for cache, selected in zip(caches, selectors):
+        lookups.append(_lookup(cache, chunk if selected is None else [path for path in chunk if selected(path)]))
+    return lookups
+
+
+def _decisions_many(
+    caches: List[Optional["FilterCache"]],
+    chunk: List[str],
+    lookups: List[Tuple[List, Dict[str, bool], List[str]]],
+    results: List[List[bool]],
+) -> List[List[bool]]:
+    decisions = []
+    for cache, (keys, known, misses), query_results in zip(caches, lookups, results):
+        accepted = set(_accepted(cache, keys, known, misses, query_results))
+        decisions.append([path in accepted for path in chunk])
+    return decisions
+
+
+def _activated(snapshot: Optional["PoolSnapshot"]) -> ContextManager:
+    return snapshot.active() if snapshot is not None else nullcontext()
+
+
+def _lookup(cache: Optional["FilterCache"], chunk: List[str]) -> Tuple[List, Dict[str, bool], List[str]]:
+    if cache is None:
+        return [(path, None) for path in chunk], {}, chunk
+    keys = cache.keys(chunk)
+    known = cache.lookup(keys)
+    return keys, known, [path for path in chunk if path not in known]
+
+
+def _resolve(cache, keys, known, misses, future) -> Iterator[str]:
+    return _accepted(cache, keys, known, misses, future.result() if future else [])
+
+
+def _accepted(
+    cache: Optional["FilterCache"],
+    keys: List[Tuple[str, Optional[str]]],
+    known: Dict[str, bool],
+    misses: List[str],
+    results: List[bool],
+) -> Iterator[str]:
+    decisions = dict(zip(misses, results))
+    if cache is not None and decisions:
+        cache.store((path, md5, decisions[path]) for path, md5 in keys if path in decisions)
+    decisions.update(known)
+    for path, _ in keys:
+        if decisions[path]:
+            yield path
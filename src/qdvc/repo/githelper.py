@@ -1,8 +1,240 @@
+import glob
+import hashlib
+import os
+import tempfile
+from io import BytesIO
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, NamedTuple, Tuple
+
+from git.exc import GitCommandError
 from git.repo import Repo as GitRepo
+from gitdb.base import IStream
 
 
 def checkout_master(repo: GitRepo):
     if repo.heads:
         repo.heads.master.checkout()
+        disable_sparse_checkout(repo)
     if repo.remotes:
         repo.remotes[0].pull()
+
+
+def sparse_checkout(repo: GitRepo, dirs: Iterable[str]):
+    """
+    Restricts the working tree of repo to the files at its root and under the top level directories dirs, in cone
+    mode. The patterns only apply from the next checkout or `git read-tree -mu HEAD` of the worktree.
+    Unlike `git sparse-checkout`, the patterns are written directly in the sparse-checkout file of the worktree so
+    that `extensions.worktreeConfig` is not turned on: the dulwich used by DVC refuses repos with that extension.
+    """
+    patterns = ["/*", "!/*/"] + [f"/{dir_name}/" for dir_name in sorted(dirs)]
+    path = _sparse_checkout_path(repo)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8", newline="\n") as f:
+        f.write("".join(pattern + "\n" for pattern in patterns))
+    # Worktrees without a sparse-checkout file are fully checked out even when the option is on
+    repo.git.config("core.sparseCheckout", "true")
+    repo.git.config("core.sparseCheckoutCone", "true")
+
+
+def disable_sparse_checkout(repo: GitRepo):
+    """
+    Checks out the whole tree again in the working tree of repo, if it was restricted by `sparse_checkout`.
+    The sparse-checkout options are unset once no worktree of the repo is sparse anymore.
+    """
+    path = _sparse_checkout_path(repo)
+    if not os.path.exists(path):
+        return
+    # Like `git sparse-checkout disable`, a pattern matching all the files brings back the files left out
+    with open(path, "w", encoding="utf-8", newline="\n") as f:
+        f.write("/*\n")
+    repo.git(c="core.sparseCheckoutCone=false").read_tree("-mu", "HEAD")
+    os.remove(path)
+    common_dir = repo.common_dir
+    sparse_paths = [os.path.join(common_dir, "info", "sparse-checkout")]
+    sparse_paths += glob.glob(os.path.join(common_dir, "worktrees", "*", "info", "sparse-checkout"))
+    if not any(os.path.exists(sparse_path) for sparse_path in sparse_paths):
+        for option in ("core.sparseCheckout", "core.sparseCheckoutCone"):
+            try:
+                repo.git.config("--unset", option)
+            except GitCommandError:
+                # The option is not set
+                pass
+
+
+def _sparse_checkout_path(repo: GitRepo) -> str:
+    # The git directory of a linked worktree is its own directory under `.git/worktrees/`
+    return os.path.join(repo.git_dir, "info", "sparse-checkout")
+
+
+def exclude(repo: GitRepo, root_dir: str, paths: Iterable[str]):
+    """
+    Makes git ignore the files or directories at paths, which hold local state such as caches, in all the worktrees
+    of repo by listing them in its `info/exclude` file. Unlike a `.gitignore`, this leaves the tree untouched.
+    Directories must exist. Paths outside of root_dir, or already listed, are skipped.
+    """
+    exclude_path = os.path.join(repo.common_dir, "info", "exclude")
+    content = ""
+    if os.path.exists(exclude_path):
+        with open(exclude_path, encoding="utf-8") as f:
+            content = f.read()
+    listed = {line.strip() for line in content.splitlines()}
+    patterns = []
+    for path in paths:
+        relpath = os.path.relpath(os.path.abspath(path), root_dir)
+        if relpath in (os.curdir, os.pardir) or relpath.startswith(os.pardir + os.sep):
+            continue
+        pattern = "/" + relpath.replace(os.sep, "/") + ("/" if os.path.isdir(path) else "")
+        if pattern not in listed:
+            listed.add(pattern)
+            patterns.append(pattern)
+    if not patterns:
+        return
+    os.makedirs(os.path.dirname(exclude_path), exist_ok=True)
+    with open(exclude_path, "a", encoding="utf-8", newline="\n") as f:
+        f.write("\n" if content and not content.endswith("\n") else "")
+        f.write("".join(pattern + "\n" for pattern in patterns))
+
+
+def diff_name_status(repo: GitRepo, a: str, b: str, *paths: str) -> List[Tuple[str, str]]:
+    """
+    Returns the (status letter, path) of the files differing between commits a and b, restricted to paths.
+    Renames are reported as a deletion and an addition.
+    """
+    out = repo.git.diff("--name-status", "--no-renames", "-z", a, b, "--", *paths)
+    fields = out.split("\0")
+    return [(fields[i][0], fields[i + 1]) for i in range(0, len(fields) - 1, 2)]
+
+
+class TreeEntry(NamedTuple):
+    mode: str
+    type: str
+    sha: str
+    path: str
+
+
+def ls_tree(repo: GitRepo, rev: str, path: str) -> List[TreeEntry]:
+    """
+    Returns the blobs found recursively under path in the tree of rev, sorted by path.
+    """
+    out = repo.git.ls_tree("-r", "-z", "--full-tree", rev, "--", path)
+    entries = []
+    for line in out.split("\0"):
+        if line:
+            info, entry_path = line.split("\t", 1)
+            entries.append(TreeEntry(*info.split(" "), entry_path))  # type: ignore[call-arg]
+    return entries
+
+
+def walk_tree(repo: GitRepo, rev: str, path: str, filter_dir: Callable[[str], bool]) -> Iterator[TreeEntry]:
+    """
+    Yields the blobs found recursively under path in the tree of rev, in the order of `ls_tree`, without reading
+    the subtrees whose path is rejected by filter_dir.
+    """
+    try:
+        tree = repo.commit(rev).tree[path]
+    except KeyError:
+        return
+    stack = [iter(tree)]
+    while stack:
+        item = next(stack[-1], None)
+        if item is None:
+            stack.pop()
+        elif item.type == "tree":
+            if filter_dir(item.path):
+                stack.append(iter(item))
+        elif item.type == "blob":
+            yield TreeEntry(f"{item.mode:o}", item.type, item.hexsha, item.path)
+
+
+def read_blob(repo: GitRepo, sha: str) -> bytes:
+    """
+    Returns the content of a blob, read through the persistent `git cat-file --batch` process of repo.
+    """
+    return repo.odb.stream(bytes.fromhex(sha)).read()
+
+
+def blob_sha(data: bytes) -> str:
+    """
+    Returns the hexsha git gives to a blob of data, without storing it.
+    """
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def blob_shas(repo: GitRepo, rev: str, paths: List[str]) -> List[str]:
+    """
+    Returns the hexsha of the blob at each of paths in the tree of rev, resolved by a single `git cat-file` process.
+    """
+    if not paths:
+        return []
+    with tempfile.TemporaryFile() as f:
+        f.write("".join(f"{rev}:{path}\n" for path in paths).encode("utf-8"))
+        f.seek(0)
+        out = repo.git.cat_file("--batch-check=%(objectname) %(objecttype)", istream=f)
+    shas = []
+    for path, line in zip(paths, out.splitlines()):
+        sha, _, object_type = line.partition(" ")
+        if object_type != "blob":
+            raise Exception(f"{path} was not found in {rev}.")
+        shas.append(sha)
+    return shas
+
+
+def write_blob(repo: GitRepo, data: bytes) -> str:
+    """
+    Stores data as a blob in the object database of repo, and returns its hexsha.
+    """
+    return repo.odb.store(IStream("blob", len(data), BytesIO(data))).binsha.hex()
+
+
+def commit_tree(repo: GitRepo, base: str, entries: Iterable[TreeEntry], message: str, parents: List[str]) -> str:
+    """
+    Creates a commit whose tree is the tree of base with the entries added, without touching the working tree
+    or the index of repo, and returns its hexsha.
+    """
+    with tempfile.TemporaryDirectory(dir=repo.git_dir) as tmp_dir:
+        index_info_path = os.path.join(tmp_dir, "index-info")
+        with open(index_info_path, "wb") as f:
+            for entry in entries:
+                f.write(f"{entry.mode} {entry.sha}\t{entry.path}\0".encode("utf-8"))
+        with repo.git.custom_environment(GIT_INDEX_FILE=os.path.join(tmp_dir, "index")):
+            repo.git.read_tree(base)
+            with open(index_info_path, "rb") as f:
+                repo.git.update_index("-z", "--index-info", istream=f)
+            tree = repo.git.write_tree()
+    parent_args = [arg for parent in parents for arg in ("-p", parent)]
+    return repo.git.commit_tree(tree, *parent_args, "-m", message)
+
+
+def checkout_entries(repo: GitRepo, entries: Iterable[TreeEntry], root_dir: str):
+    """
+    Writes the blobs of entries at their path under root_dir, through a temporary index, without touching the
+    working tree or the index of repo. The blobs are read and written by a single `git checkout-index` process.
+    """
+    with tempfile.TemporaryDirectory(dir=repo.git_dir) as tmp_dir:
+        index_info_path = os.path.join(tmp_dir, "index-info")
+        with open(index_info_path, "wb") as f:
+            for entry in entries:
+                f.write(f"{entry.mode} {entry.sha}\t{entry.path}\0".encode("utf-8"))
+        if not os.path.getsize(index_info_path):
+            return
+        with repo.git.custom_environment(GIT_INDEX_FILE=os.path.join(tmp_dir, "index")):
+            with open(index_info_path, "rb") as f:
+                repo.git.update_index("-z", "--index-info", istream=f)
+            repo.git.checkout_index("--all", "--force", f"--prefix={os.path.join(root_dir, '')}")
+
+
+def add_paths(repo: GitRepo, paths: Iterable[str], batch_size: int):
+    """
+    Stages paths, in batches of at most batch_size paths streamed to `git update-index --stdin`.
+    Unlike `git add`, the size of the command line does not depend on the number of paths and no pathspec
+    matching is done.
+    """
+    iterator = iter(paths)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        with tempfile.TemporaryFile() as f:
+            f.write(b"".join(os.fsencode(path) + b"\0" for path in batch))
+            f.seek(0)
+            repo.git.update_index("--add", "-z", "--stdin", istream=f)
@@ -0,0 +1,32 @@
+import logging
+from typing import TYPE_CHECKING, Any, Iterator
+
+from .githelper import ls_tree, read_blob
+from .pool import PoolEntry, entry_from_dvc, write_manifest
+
+if TYPE_CHECKING:
+    from qdvc.repo import Repo
+
+logger = logging.getLogger(__name__)
+
+
+def rebuild_index(
+    repo: "Repo",
+    rev: str = "HEAD",
+    **kwargs: Any,
+) -> str:
+    """
+    Regenerates the pool manifest from the `.dvc` files committed under `.data/` at rev, and stages it.
+    """
+    write_manifest(repo.pool_manifest_path, _iter_tree_entries(repo, rev))
+    repo.git_repo.git.add(repo.pool_manifest_path)
+    logger.info(f"Rebuilt {repo.pool_manifest_path} from {rev}. Commit it to version it with the data.")
+    return repo.pool_manifest_path
+
+
+def _iter_tree_entries(repo: "Repo", rev: str) -> Iterator[PoolEntry]:
+    prefix = repo.QDVC_DATA_DIR + "/"
+    for entry in ls_tree(repo.git_repo, rev, repo.QDVC_DATA_DIR):
+        if entry.type == "blob":
+            text = read_blob(repo.git_repo, entry.sha).decode("utf-8")
+            yield entry_from_dvc(entry.path[len(prefix) :], text, entry.sha)
@@ -0,0 +1,252 @@
+"""Index of the files of the query results, as compressed bitmaps over the ids of the pool files of each version."""
+import json
+import logging
+import mmap
+import os
+import shutil
+from array import array
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+from urllib.parse import quote
+
+from git.refs.head import Head
+from gitdb.exc import BadName
+
+from .bitmap import RoaringBitmap
+from .diff import read_result
+from .githelper import ls_tree
+from .sampling import SAMPLE_SEPARATOR
+
+if TYPE_CHECKING:
+    from qdvc.repo import Repo
+
+logger = logging.getLogger(__name__)
+
+MEMBERSHIP_DIR_NAME = "membership"
+RESULTS_FILE_NAME = "results.json"
+POOL_PATHS_FILE_NAME = "pool.paths"
+POOL_OFFSETS_FILE_NAME = "pool.offsets"
+BITMAP_SUFFIX = ".bitmap"
+
+
+class QueryResult(NamedTuple):
+    """The result of a query at a version, with its number of files."""
+
+    query: str
+    version: str
+    count: int
+
+
+class PoolIds:
+    """
+    Ids of the pool files of a version: the id of a file is its rank among the sorted pool paths of the version.
+    The paths are memory-mapped and searched by bisection on the offsets of their lines, without being read.
+    Args:
+        version_dir (str): directory of the version in the membership index.
+    """
+
+    def __init__(self, version_dir: str):
+        with open(os.path.join(version_dir, POOL_OFFSETS_FILE_NAME), "rb") as f:
+            self._offsets = array("Q", f.read())
+        with open(os.path.join(version_dir, POOL_PATHS_FILE_NAME), "rb") as f:
+            self._paths: Any = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if len(self._offsets) > 1 else b""
+
+    @staticmethod
+    def write(version_dir: str, paths: List[str]):
+        """
+        Writes the sorted pool paths of a version in version_dir.
+        """
+        offsets = array("Q", [0])
+        with open(os.path.join(version_dir, POOL_PATHS_FILE_NAME), "wb") as f:
+            for path in paths:
+                offsets.append(offsets[-1] + f.write(path.encode("utf-8") + b"\n"))
+        # The offsets are written last, their file tells that the paths are complete
+        offsets_path = os.path.join(version_dir, POOL_OFFSETS_FILE_NAME)
+        with open(offsets_path + ".tmp", "wb") as f:
+            f.write(offsets.tobytes())
+        os.replace(offsets_path + ".tmp", offsets_path)
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return self._paths[self._offsets[i] : self._offsets[i + 1] - 1].decode("utf-8")
+
+    def id(self, path: str) -> int:
+        """
+        Returns the id of the pool file path, relative to the pool directory, or -1 if it is not in the pool.
+        """
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self[mid] < path:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < len(self) and self[lo] == path else -1
+
+
+class MembershipIndex:
+    """
+    Index of the files of the query results, in the cache directory of repo. Each version gets a directory, named
+    after its commit, holding the ids of its pool files and a `RoaringBitmap` of the ids of each query result.
+    `results.json` maps each query branch to its bitmap, the commit it was built from and its number of files.
+    The index is brought up to date with the query branches by `sync`, which only reads the results that changed.
+    """
+
+    def __init__(self, repo: "Repo"):
+        from .cache import open_cache_dir
+
+        self.repo = repo
+        self.index_dir = os.path.join(open_cache_dir(repo), MEMBERSHIP_DIR_NAME)
+        self.results_path = os.path.join(self.index_dir, RESULTS_FILE_NAME)
+        self.results: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(self.results_path):
+            with open(self.results_path, encoding="utf-8") as f:
+                self.results = json.load(f)
+
+    def _query_branches(self) -> Iterator[Tuple[Head, str, str]]:
+        """
+        Yields the (head, query, version) of the results of the queries, without the samples.
+        """
+        git_repo = self.repo.git_repo
+        prefix = self.repo.QUERY_BRANCH_PREFIX + self.repo.QUERY_SEPARATOR
+        init_suffix = self.repo.QUERY_SEPARATOR + self.repo.QUERY_INIT
+        heads = [head for head in git_repo.heads if head.name.startswith(prefix)]
+        queries = [head.name[len(prefix) : -len(init_suffix)] for head in heads if head.name.endswith(init_suffix)]
+        for head in heads:
+            query = max(
+                (query for query in queries if head.name.startswith(prefix + query + self.repo.QUERY_SEPARATOR)),
+                key=len,
+                default=None,
+            )
+            if query is None:
+                continue
+            version = head.name[len(prefix + query + self.repo.QUERY_SEPARATOR) :]
+            if version != self.repo.QUERY_INIT and SAMPLE_SEPARATOR not in version:
+                yield head, query, version
+
+    def sync(self):
+        """
+        Indexes the query results that were created or changed since the last sync, and forgets the deleted ones.
+        """
+        git_repo = self.repo.git_repo
+        branches = set()
+        changed = False
+        for head, query, version in self._query_branches():
+            branches.add(head.name)
+            commit = head.commit.hexsha
+            if self.results.get(head.name, {}).get("commit") == commit:
+                continue
+            try:
+                version_commit = git_repo.commit(version).hexsha
+            except (BadName, ValueError):
+                logger.warning(f"The version of {head.name} was not found, it is not indexed.")
+                continue
+            self._index(head.name, query, version, version_commit, commit)
+            changed = True
+
+        for branch in set(self.results) - branches:
+            entry = self.results.pop(branch)
+            bitmap_path = os.path.join(self.index_dir, entry["version_commit"], entry["bitmap"])
+            if os.path.exists(bitmap_path):
+                os.remove(bitmap_path)
+            changed = True
+        if changed:
+            self._cleanup()
+            self._save()
+
+    def _index(self, branch: str, query: str, version: str, version_commit: str, commit: str):
+        version_dir = os.path.join(self.index_dir, version_commit)
+        if not os.path.exists(os.path.join(version_dir, POOL_OFFSETS_FILE_NAME)):
+            os.makedirs(version_dir, exist_ok=True)
+            data_prefix = self.repo.QDVC_DATA_DIR + "/"
+            entries = ls_tree(self.repo.git_repo, version_commit, self.repo.QDVC_DATA_DIR)
+            PoolIds.write(version_dir, sorted(entry.path[len(data_prefix) :] for entry in entries))
+        pool_ids = PoolIds(version_dir)
+        ids = []
+        for entry in read_result(self.repo, branch):
+            i = pool_ids.id(entry.path)
+            if i < 0:
+                logger.warning(f"{entry.path} of {branch} is not in the pool of {version}, it is not indexed.")
+            else:
+                ids.append(i)
+        bitmap = RoaringBitmap.from_sorted(ids)
+        bitmap_name = quote(branch, safe="") + BITMAP_SUFFIX
+        tmp_path = os.path.join(version_dir, bitmap_name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(bitmap.to_bytes())
+        os.replace(tmp_path, os.path.join(version_dir, bitmap_name))
+        self.results[branch] = {
+            "query": query,
+            "version": version,
+            "version_commit": version_commit,
+            "commit": commit,
+            "count": len(ids),
+            "bitmap": bitmap_name,
+        }
+        logger.debug(f"Indexed {branch}")
+
+    def _cleanup(self):
+        versions = {entry["version_commit"] for entry in self.results.values()}
+        for name in os.listdir(self.index_dir):
+            path = os.path.join(self.index_dir, name)
+            if os.path.isdir(path) and name not in versions:
+                shutil.rmtree(path)
+
+    def _save(self):
+        os.makedirs(self.index_dir, exist_ok=True)
+        tmp_path = self.results_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.results, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.results_path)
+
+    def bitmap(self, branch: str) -> RoaringBitmap:
+        entry = self.results[branch]
+        with open(os.path.join(self.index_dir, entry["version_commit"], entry["bitmap"]), "rb") as f:
+            return RoaringBitmap(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))  # type: ignore[arg-type]
+
+    def find(self, contains: Optional[str] = None, versions: Optional[List[str]] = None) -> List[QueryResult]:
+        """
+        Returns the indexed results, at versions only if given, and containing the file contains if given.
+        contains is the original path of the file, or its path in the pool.
+        """
+        entries = sorted(self.results.items(), key=lambda item: (item[1]["query"], item[1]["version"]))
+        if versions:
+            entries = [(branch, entry) for branch, entry in entries if entry["version"] in versions]
+        if contains is not None:
+            path = _pool_relative_path(self.repo, contains)
+            pool_ids: Dict[str, PoolIds] = {}
+            kept = []
+            for branch, entry in entries:
+                version_commit = entry["version_commit"]
+                if version_commit not in pool_ids:
+                    pool_ids[version_commit] = PoolIds(os.path.join(self.index_dir, version_commit))
+                i = pool_ids[version_commit].id(path)
+                if i >= 0 and i in self.bitmap(branch):
+                    kept.append((branch, entry))
+            entries = kept
+        return [QueryResult(entry["query"], entry["version"], entry["count"]) for _, entry in entries]
+
+
+def _pool_relative_path(repo: "Repo", path: str) -> str:
+    path = os.path.relpath(os.path.abspath(path), repo.root_dir) if os.path.isabs(path) else os.path.normpath(path)
+    path = path.replace(os.sep, "/")
+    if path.startswith(repo.QDVC_DATA_DIR + "/"):
+        path = path[len(repo.QDVC_DATA_DIR) + 1 :]
+    return path if path.endswith(".dvc") else path + ".dvc"
+
+
+def ls_queries(
+    repo: "Repo",
+    contains: Optional[str] = None,
+    versions: Optional[List[str]] = None,
+    **kwargs: Any,
+) -> List[QueryResult]:
+    """
+    Returns the results of the queries already checked out, with their number of files, at versions only if given,
+    and containing the file contains if given. Answered from the membership index, updated first with the results
+    checked out since the last call.
+    """
+    index = MembershipIndex(repo)
+    index.sync()
+    return index.find(contains, versions)
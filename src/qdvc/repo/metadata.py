@@ -0,0 +1,248 @@
+"""Extraction of per-file metadata at ingest time, and the metadata store read by filters."""
+import hashlib
+import importlib
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from .pool import PENDING_SUFFIX, merge_sorted
+from .snapshot import active_snapshot
+
+logger = logging.getLogger(__name__)
+
+Extractor = Callable[[str], Optional[Dict[str, Any]]]
+
+# Built-in extractors, by name
+EXTRACTORS: Dict[str, Extractor] = {}
+
+# Extractors of a worker process, resolved once by `_init_worker`
+_worker_extractors: List[Extractor] = []
+
+
+def register_extractor(name: str) -> Callable[[Extractor], Extractor]:
+    """
+    Registers the decorated function as the built-in extractor name.
+    """
+
+    def decorator(extractor: Extractor) -> Extractor:
+        EXTRACTORS[name] = extractor
+        return extractor
+
+    return decorator
+
+
+@register_extractor("size")
+def extract_size(path: str) -> Dict[str, Any]:
+    return {"size": os.path.getsize(path)}
+
+
+@register_extractor("mtime")
+def extract_mtime(path: str) -> Dict[str, Any]:
+    return {"mtime": os.path.getmtime(path)}
+
+
+@register_extractor("image_size")
+def extract_image_size(path: str) -> Optional[Dict[str, Any]]:
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        with Image.open(path) as image:
+            return {"width": image.width, "height": image.height}
+    except UnidentifiedImageError:
+        return None
+
+
+@register_extractor("exif_datetime")
+def extract_exif_datetime(path: str) -> Optional[Dict[str, Any]]:
+    from PIL import Image, UnidentifiedImageError
+
+    # DateTimeOriginal of the Exif IFD, or DateTime of the main IFD
+    exif_ifd, datetime_original, datetime = 0x8769, 0x9003, 0x0132
+    try:
+        with Image.open(path) as image:
+            exif = image.getexif()
+    except UnidentifiedImageError:
+        return None
+    value = exif.get_ifd(exif_ifd).get(datetime_original) or exif.get(datetime)
+    return {"datetime": value} if value else None
+
+
+def resolve_extractor(name: str) -> Extractor:
+    """
+    Returns the built-in extractor name, or the user-defined callable name given as `module:function`.
+    An extractor takes the path of a data file and returns a dict of metadata, or None if it does not apply.
+    """
+    if name in EXTRACTORS:
+        return EXTRACTORS[name]
+    module_name, _, attr = name.partition(":")
+    if not attr:
+        raise Exception(f"Unknown metadata extractor '{name}', use a built-in name or 'module:function'.")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+def extract(extractors: List[Extractor], path: str) -> Dict[str, Any]:
+    """
+    Returns the metadata of the file at path, merged from all extractors. Failing extractors are skipped.
+    """
+    metadata: Dict[str, Any] = {}
+    for extractor in extractors:
+        try:
+            metadata.update(extractor(path) or {})
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.warning(f"Extractor {getattr(extractor, '__name__', extractor)} failed on {path}: {exc}")
+    return metadata
+
+
+def _init_worker(names: List[str]):
+    global _worker_extractors
+    _worker_extractors = [resolve_extractor(name) for name in names]
+
+
+def _extract_one(path: str) -> Dict[str, Any]:
+    return extract(_worker_extractors, path)
+
+
+def extract_all(names: List[str], paths: List[str], jobs: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Returns the metadata of each of the paths, extracted by the extractors names in jobs worker processes.
+    """
+    if not jobs or jobs > 1:
+        with ProcessPoolExecutor(jobs, initializer=_init_worker, initargs=(names,)) as executor:
+            chunksize = max(1, len(paths) // (4 * (jobs or os.cpu_count() or 1)))
+            return list(executor.map(_extract_one, paths, chunksize=chunksize))
+    extractors = [resolve_extractor(name) for name in names]
+    return [extract(extractors, path) for path in paths]
+
+
+class MetadataEntry(NamedTuple):
+    """The metadata of a pool file, with its path relative to the pool directory, serialized in JSON."""
+
+    path: str
+    fields: str
+
+
+def read_metadata(metadata_path: str) -> Iterator[MetadataEntry]:
+    """
+    Yields the entries of the metadata store at metadata_path, sorted by path.
+    """
+    with open(metadata_path, encoding="utf-8") as f:
+        yield from parse_metadata(f)
+
+
+def parse_metadata(lines: Iterable[str]) -> Iterator[MetadataEntry]:
+    """
+    Yields the entries of the lines of a metadata store.
+    """
+    for line in lines:
+        path, fields = line.rstrip("\n").split("\t", 1)
+        yield MetadataEntry(path, fields)
+
+
+def metadata_digests(entries: Iterable[MetadataEntry]) -> Dict[str, str]:
+    """
+    Returns a short hash of the metadata of each of the entries, by path.
+    """
+    return {entry.path: hashlib.blake2b(entry.fields.encode("utf-8"), digest_size=8).hexdigest() for entry in entries}
+
+
+def changed_metadata(old_entries: Iterator[MetadataEntry], new_entries: Iterator[MetadataEntry]) -> Iterator[str]:
+    """
+    Yields the paths whose metadata differ between two iterators of entries sorted by path, including the paths
+    having metadata in only one of them.
+    """
+    old, new = next(old_entries, None), next(new_entries, None)
+    while old is not None or new is not None:
+        if new is None or (old is not None and old.path < new.path):
+            yield old.path  # type: ignore[union-attr]
+            old = next(old_entries, None)
+        elif old is None or new.path < old.path:
+            yield new.path
+            new = next(new_entries, None)
+        else:
+            if old.fields != new.fields:
+                yield new.path
+            old, new = next(old_entries, None), next(new_entries, None)
+
+
+def update_metadata(metadata_path: str, items: Iterable[Tuple[str, Dict[str, Any]]]):
+    """
+    Adds the (pool path, metadata) items to the metadata store at metadata_path, replacing the existing entries with
+    the same path. The store is merged in a single pass, without loading it in memory.
+    """
+    new_entries = iter(
+        sorted({path: MetadataEntry(path, json.dumps(fields, sort_keys=True)) for path, fields in items}.values())
+    )
+    old_entries = read_metadata(metadata_path) if os.path.exists(metadata_path) else iter(())
+    tmp_path = metadata_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8", newline="\n") as f:
+        for entry in merge_sorted(old_entries, new_entries):
+            f.write(f"{entry.path}\t{entry.fields}\n")
+    os.replace(tmp_path, metadata_path)
+
+
+def append_pending_metadata(metadata_path: str, items: Iterable[Tuple[str, Dict[str, Any]]]):
+    """
+    Appends the (pool path, metadata) items to the journal of the metadata store at metadata_path, in any order,
+    until they are merged by `merge_pending_metadata`.
+    """
+    with open(metadata_path + PENDING_SUFFIX, "a", encoding="utf-8", newline="\n") as f:
+        for path, fields in items:
+            f.write(f"{path}\t{json.dumps(fields, sort_keys=True)}\n")
+
+
+def merge_pending_metadata(metadata_path: str) -> bool:
+    """
+    Merges the journal of the metadata store at metadata_path into it in a single pass, and removes it.
+    Returns if there was a journal to merge.
+    """
+    pending_path = metadata_path + PENDING_SUFFIX
+    if not os.path.exists(pending_path):
+        return False
+    update_metadata(metadata_path, ((entry.path, json.loads(entry.fields)) for entry in read_metadata(pending_path)))
+    os.remove(pending_path)
+    return True
+
+
+class MetadataStore:
+    """
+    Metadata of the pool files extracted by `qdvc add`, to be used by filters without reading the data files:
+
+        store = MetadataStore()
+        store.get(filepath).get("width")
+
+    Args:
+        root_dir (str): root of the repo, found from the current directory by default. While `qdvc checkout` filters
+            a version, the metadata store of that version is read by default.
+    """
+
+    def __init__(self, root_dir: Optional[str] = None):
+        from qdvc.repo import Repo
+
+        snapshot = active_snapshot()
+        if root_dir is None and snapshot is not None:
+            self.root_dir, store_dir = snapshot.repo_dir, snapshot.root_dir
+        else:
+            self.root_dir = store_dir = os.path.abspath(root_dir or os.path.dirname(Repo.find_qdvc_dir()))
+        self.pool_dir = os.path.join(self.root_dir, Repo.QDVC_DATA_DIR)
+        metadata_path = os.path.join(store_dir, Repo.QDVC_DIR, Repo.METADATA_FILE_NAME)
+        self._metadata: Dict[str, str] = {}
+        if os.path.exists(metadata_path):
+            self._metadata = {entry.path: entry.fields for entry in read_metadata(metadata_path)}
+
+    def get(self, filepath: str) -> Dict[str, Any]:
+        """
+        Returns the metadata of the pool file filepath, given as the path received by `Query.filter`, or relative to
+        the pool directory. Returns an empty dict for files without metadata.
+        """
+        if os.path.isabs(filepath):
+            filepath = os.path.relpath(filepath, self.pool_dir)
+        fields = self._metadata.get(filepath.replace(os.sep, "/"))
+        return json.loads(fields) if fields else {}
+
+    def __contains__(self, filepath: str) -> bool:
+        return bool(self.get(filepath))
+
+    def __len__(self) -> int:
+        return len(self._metadata)
@@ -0,0 +1,207 @@
+"""Access to the `.dvc` pointer files of the data pool."""
+import os
+import re
+from typing import Any, Dict, Iterable, Iterator, NamedTuple, Optional
+
+from .snapshot import active_snapshot, version_path
+
+_FIELD = re.compile(r"^(\s*-\s+|\s+)(\w+):\s*(.*?)\s*$")
+# Suffix of the journals of entries appended to a manifest or a metadata store, until they are merged in it
+PENDING_SUFFIX = ".pending"
+
+
+def parse_dvc(text: str) -> Dict[str, str]:
+    """
+    Returns the scalar fields (md5, size, nfiles, path...) of the first output of a `.dvc` file.
+    This is a minimal parser for the flat files written by `dvc add`, much faster than a YAML loader.
+    """
+    fields: Dict[str, str] = {}
+    in_outs = False
+    item_indent = None
+    for line in text.splitlines():
+        if not line.strip() or line.lstrip().startswith("#"):
+            continue
+        if not line[0].isspace() and not line.startswith("-"):
+            if fields:
+                break
+            in_outs = line.startswith("outs:")
+            continue
+        match = _FIELD.match(line) if in_outs else None
+        if not match:
+            continue
+        prefix, key, value = match.groups()
+        if "-" in prefix:
+            if fields:
+                break
+            item_indent = len(prefix)
+        elif len(prefix) != item_indent:
+            continue
+        fields[key] = value.strip("'\"")
+    return fields
+
+
+def read_md5(path: str) -> Optional[str]:
+    """
+    Returns the md5 of the data pointed by the `.dvc` file at path, or None if it has none.
+    """
+    with open(path, encoding="utf-8") as f:
+        return parse_dvc(f.read()).get("md5")
+
+
+class PoolRecord:
+    """
+    A parsed `.dvc` file of the pool, as given to `Query.filter_record`.
+    Args:
+        path (str): path of the `.dvc` file in the pool, as given to `Query.filter`.
+        md5 (str): md5 of the data, ending with `.dir` for directories.
+        size (int): size of the data in bytes.
+        nfiles (int): number of files of a directory, None for a file.
+        original_path (str): path where the data is checked out, outside of the pool.
+    """
+
+    __slots__ = ("path", "md5", "size", "nfiles", "original_path")
+
+    def __init__(self, path: str, md5: str, size: int, nfiles: Optional[int], original_path: str):
+        self.path = path
+        self.md5 = md5
+        self.size = size
+        self.nfiles = nfiles
+        self.original_path = original_path
+
+    @classmethod
+    def from_dvc(cls, path: str, text: str, pool_dir: Optional[str] = None) -> "PoolRecord":
+        """
+        Returns the record of the `.dvc` file at path, of content text, in the pool directory pool_dir. Without
+        pool_dir, the pool directory is the first `.data` directory of path.
+        """
+        from qdvc.repo import Repo
+
+        fields = parse_dvc(text)
+        if pool_dir is not None:
+            original_path = os.path.join(os.path.dirname(pool_dir), os.path.relpath(path, pool_dir))
+        else:
+            marker = os.sep + Repo.QDVC_DATA_DIR + os.sep
+            original_path = path.replace(marker, os.sep, 1)
+        if original_path.endswith(".dvc"):
+            original_path = original_path[: -len(".dvc")]
+        nfiles = fields.get("nfiles")
+        return cls(
+            path, fields.get("md5", ""), int(fields.get("size") or 0), int(nfiles) if nfiles else None, original_path
+        )
+
+    def __repr__(self) -> str:
+        return f"PoolRecord(path={self.path!r}, md5={self.md5!r}, size={self.size}, nfiles={self.nfiles})"
+
+
+def read_record(path: str) -> PoolRecord:
+    """
+    Returns the record of the `.dvc` file at path. While `qdvc checkout` filters a version, the file is read from the
+    pool of that version, and the original path is in the repo of path.
+    """
+    from qdvc.repo import Repo
+
+    snapshot = active_snapshot()
+    pool_dir = None if snapshot is None else os.path.join(snapshot.repo_dir, Repo.QDVC_DATA_DIR)
+    with open(version_path(path), encoding="utf-8") as f:
+        return PoolRecord.from_dvc(path, f.read(), pool_dir)
+
+
+class PoolEntry(NamedTuple):
+    """
+    A `.dvc` file of the pool, with its path relative to the pool directory and the hash of its git blob, which tells
+    if the entry is still up to date with the file committed at that path.
+    """
+
+    path: str
+    md5: str
+    size: int
+    sha: str = ""
+
+
+def entry_from_dvc(path: str, text: str, sha: str = "") -> PoolEntry:
+    fields = parse_dvc(text)
+    return PoolEntry(path, fields.get("md5", ""), int(fields.get("size") or 0), sha)
+
+
+def read_manifest(manifest_path: str) -> Iterator[PoolEntry]:
+    """
+    Yields the entries of the pool manifest at manifest_path, sorted by path.
+    """
+    with open(manifest_path, encoding="utf-8") as f:
+        yield from parse_manifest(f)
+
+
+def parse_manifest(lines: Iterable[str]) -> Iterator[PoolEntry]:
+    """
+    Yields the entries of the lines of a manifest. Manifests written before the blob hashes have three columns.
+    """
+    for line in lines:
+        path, md5, size, *sha = line.rstrip("\n").split("\t")
+        yield PoolEntry(path, md5, int(size), *sha)
+
+
+def manifest_lines(entries: Iterable[PoolEntry]) -> Iterator[str]:
+    """
+    Yields the lines of the manifest of entries, which must be sorted by path.
+    """
+    for entry in entries:
+        yield f"{entry.path}\t{entry.md5}\t{entry.size}\t{entry.sha}\n"
+
+
+def write_manifest(manifest_path: str, entries: Iterable[PoolEntry]):
+    """
+    Writes the entries, which must be sorted by path, as the pool manifest at manifest_path.
+    """
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8", newline="\n") as f:
+        f.writelines(manifest_lines(entries))
+    os.replace(tmp_path, manifest_path)
+
+
+def update_manifest(manifest_path: str, entries: Iterable[PoolEntry]):
+    """
+    Adds the entries to the pool manifest at manifest_path, replacing the existing entries with the same path.
+    The manifest is merged in a single pass, without loading it in memory.
+    """
+    new_entries = iter(sorted({entry.path: entry for entry in entries}.values()))
+    old_entries = read_manifest(manifest_path) if os.path.exists(manifest_path) else iter(())
+    write_manifest(manifest_path, merge_sorted(old_entries, new_entries))
+
+
+def append_pending_manifest(manifest_path: str, entries: Iterable[PoolEntry]):
+    """
+    Appends the entries to the journal of the pool manifest at manifest_path, in any order, until they are merged
+    by `merge_pending_manifest`. Unlike `update_manifest`, this does not depend on the size of the manifest.
+    """
+    with open(manifest_path + PENDING_SUFFIX, "a", encoding="utf-8", newline="\n") as f:
+        f.writelines(manifest_lines(entries))
+
+
+def merge_pending_manifest(manifest_path: str) -> bool:
+    """
+    Merges the journal of the pool manifest at manifest_path into it in a single pass, and removes it.
+    Returns if there was a journal to merge.
+    """
+    pending_path = manifest_path + PENDING_SUFFIX
+    if not os.path.exists(pending_path):
+        return False
+    with open(pending_path, encoding="utf-8") as f:
+        update_manifest(manifest_path, parse_manifest(f))
+    os.remove(pending_path)
+    return True
+
+
+def merge_sorted(old_entries: Iterator[Any], new_entries: Iterator[Any]) -> Iterator[Any]:
+    """
+    Merges two iterators of entries sorted by path. New entries replace the old entries with the same path.
+    """
+    old, new = next(old_entries, None), next(new_entries, None)
+    while old is not None or new is not None:
+        if new is None or (old is not None and old.path < new.path):
+            yield old  # type: ignore[misc]
+            old = next(old_entries, None)
+        else:
+            if old is not None and old.path == new.path:
+                old = next(old_entries, None)
+            yield new
+            new = next(new_entries, None)
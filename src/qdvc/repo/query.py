@@ -12,8 +12,12 @@ if TYPE_CHECKING:
 def query(
     repo: "Repo",
     name: str,
+    spec: bool = False,
     **kwargs: Any,
 ) -> str:
+    """
+    Creates the init branch of the query name with a skeleton `filter.py`, or `filter.yaml` if spec.
+    """
     checkout_master(repo.git_repo)
 
     # Branch from master
@@ -26,15 +30,17 @@ def query(
     new_branch.checkout()
 
     # Create a filter.py file
-    filter_path = os.path.join(repo.qdvc_dir, repo.FILTER_FILE_NAME)
-    if os.path.exists(filter_path):
-        raise Exception(f"{filter_path} already exists. Please remove it from Master.")
+    for file_name in repo.FILTER_FILE_NAMES:
+        existing_path = os.path.join(repo.qdvc_dir, file_name)
+        if os.path.exists(existing_path):
+            raise Exception(f"{existing_path} already exists. Please remove it from Master.")
+    filter_path = os.path.join(repo.qdvc_dir, repo.FILTER_SPEC_FILE_NAME if spec else repo.FILTER_FILE_NAME)
 
     base_filter_path = os.path.join(
         os.path.dirname(os.path.abspath(__file__)),
         "..",
         "resources",
-        "filter_skeletton.py",
+        "filter_skeleton.yaml" if spec else "filter_skeletton.py",
     )
     shutil.copyfile(base_filter_path, filter_path)
     return name
@@ -0,0 +1,100 @@
+"""Deterministic sampling and sharding of the files accepted by a query."""
+import hashlib
+import heapq
+import os
+from typing import Iterable, Iterator, Optional, Tuple
+
+SAMPLE_SEPARATOR = "+"
+_KEY_RANGE = 1 << 64
+
+
+class Sampler:
+    """
+    Samples pool paths by a hash of their path relative to the pool and of the seed: the sample only depends on the
+    files, not on the order in which they are accepted or on the machine.
+    With fraction, each path is kept if its hash falls in that fraction of the hash range, in a streaming way.
+    With size, the size paths with the smallest hashes are kept: the sample is known once all paths are seen.
+    Args:
+        pool_dir (str): directory of the pool, the paths are hashed relatively to it.
+        size (int): number of paths to keep at most.
+        fraction (float): fraction of the paths to keep, between 0 and 1.
+        seed (int): seed of the hash, a different seed gives an independent sample.
+    """
+
+    def __init__(self, pool_dir: str, size: Optional[int] = None, fraction: Optional[float] = None, seed: int = 0):
+        if size is None and fraction is None:
+            raise Exception("A sample needs a size or a fraction.")
+        if size is not None and size < 0:
+            raise Exception(f"The size of a sample cannot be negative, got {size}.")
+        if fraction is not None and not 0 <= fraction <= 1:
+            raise Exception(f"The fraction of a sample must be between 0 and 1, got {fraction}.")
+        self.prefix_length = len(os.path.join(pool_dir, ""))
+        self.size = size
+        self.fraction = fraction
+        self.seed = seed
+
+    @property
+    def suffix(self) -> str:
+        """
+        Suffix of the version in the name of the query branch holding the sample, e.g. `+sample-1000-seed-0`.
+        """
+        parts = []
+        if self.size is not None:
+            parts.append(f"sample-{self.size}")
+        if self.fraction is not None:
+            parts.append(f"fraction-{self.fraction:g}")
+        return SAMPLE_SEPARATOR + "-".join(parts + [f"seed-{self.seed}"])
+
+    def key(self, path: str) -> int:
+        return _hash_key(path[self.prefix_length :], str(self.seed))
+
+    def sample(self, paths: Iterable[str]) -> Iterator[str]:
+        """
+        Yields the sampled paths. Only the paths kept are held in memory.
+        """
+        if self.fraction is not None:
+            threshold = self.fraction * _KEY_RANGE
+            paths = (path for path in paths if self.key(path) < threshold)
+        if self.size is None:
+            yield from paths
+        else:
+            yield from sorted(heapq.nsmallest(self.size, paths, key=self.key))
+
+
+class Shard:
+    """
+    Share of the files of a query result owned by one of count nodes, by a hash of their path relative to root_dir.
+    The shares of all the nodes are disjoint, cover the whole result, and do not depend on the machine.
+    Args:
+        root_dir (str): directory the paths are hashed relatively to.
+        index (int): index of the share, from 0 to count - 1.
+        count (int): number of shares.
+    """
+
+    def __init__(self, root_dir: str, index: int, count: int):
+        if count < 1:
+            raise Exception(f"The number of shards must be at least 1, got {count}.")
+        if not 0 <= index < count:
+            raise Exception(f"The shard index must be between 0 and {count - 1}, got {index}.")
+        self.prefix_length = len(os.path.join(root_dir, ""))
+        self.index = index
+        self.count = count
+
+    def owns(self, path: str) -> bool:
+        return _hash_key(path[self.prefix_length :], "shard") % self.count == self.index
+
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    """
+    Parses a shard given as `i/n`.
+    """
+    index, _, count = value.partition("/")
+    try:
+        return int(index), int(count)
+    except ValueError:
+        raise Exception(f"A shard is given as i/n, e.g. 0/16, got '{value}'.")
+
+
+def _hash_key(relative_path: str, salt: str) -> int:
+    digest = hashlib.blake2b(f"{salt}\0{relative_path.replace(os.sep, '/')}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
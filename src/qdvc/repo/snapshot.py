@@ -0,0 +1,103 @@
+"""Copies of the pool of a version, from which checkout reads the files the filters decide on."""
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from itertools import islice
+from typing import Iterable, Iterator, Optional
+
+from git.repo import Repo as GitRepo
+
+from .githelper import TreeEntry, checkout_entries
+
+# Snapshot whose filters are being evaluated in the current thread, or worker process
+_active: ContextVar[Optional["PoolSnapshot"]] = ContextVar("qdvc_pool_snapshot", default=None)
+
+
+class PoolSnapshot:
+    """
+    Copy of files of the pool of a version, written from the git objects under root_dir with the layout of the repo:
+    the `.dvc` files under `.data/` and the metadata store under `.qdvc/`.
+    Filters are given the paths of the pool files in the repo at repo_dir, whatever the branch checked out in its
+    working tree. While a snapshot is active, `version_path` maps these paths to their copy, `MetadataStore` and
+    `ColumnarMetadata` read the metadata store of the copy by default, and the records given to `Query.filter_record`
+    are parsed from the copy, so that filters decide on the pool of the version they filter.
+    Args:
+        root_dir (str): directory of the copy.
+        repo_dir (str): root of the repo, under which are the paths given to the filters.
+        cache_dir (str): cache directory of the repo, where the columnar form of the metadata store is built.
+    """
+
+    def __init__(self, root_dir: str, repo_dir: str, cache_dir: str):
+        self.root_dir = root_dir
+        self.repo_dir = repo_dir
+        self.cache_dir = cache_dir
+
+    def path(self, tree_path: str) -> str:
+        """
+        Returns the path given to the filters of the file or directory at tree_path in the tree of the version.
+        """
+        return os.path.join(self.repo_dir, *tree_path.split("/"))
+
+    def tree_path(self, path: str) -> str:
+        return path[len(self.repo_dir) + 1 :].replace(os.sep, "/")
+
+    def copy_path(self, path: str) -> str:
+        """
+        Returns the path of the copy of the file at path, given to the filters.
+        """
+        return os.path.join(self.root_dir, path[len(self.repo_dir) + 1 :])
+
+    def contains(self, path: str) -> bool:
+        return path.startswith(os.path.join(self.repo_dir, ""))
+
+    def write(self, git_repo: GitRepo, entries: Iterable[TreeEntry]):
+        checkout_entries(git_repo, entries, self.root_dir)
+
+    def iter_paths(self, git_repo: GitRepo, entries: Iterable[TreeEntry], batch_size: int) -> Iterator[str]:
+        """
+        Writes entries in batches of batch_size, and yields their paths given to the filters once their batch is
+        written.
+        """
+        iterator = iter(entries)
+        while True:
+            batch = list(islice(iterator, batch_size))
+            if not batch:
+                return
+            self.write(git_repo, batch)
+            for entry in batch:
+                yield self.path(entry.path)
+
+    @contextmanager
+    def active(self) -> Iterator["PoolSnapshot"]:
+        """
+        Makes the snapshot the source of the pool files for the filters built and evaluated meanwhile.
+        """
+        token = _active.set(self)
+        try:
+            yield self
+        finally:
+            _active.reset(token)
+
+
+def activate(snapshot: Optional[PoolSnapshot]):
+    """
+    Makes snapshot the source of the pool files for the rest of the current thread, e.g. in a worker process
+    evaluating filters.
+    """
+    _active.set(snapshot)
+
+
+def active_snapshot() -> Optional[PoolSnapshot]:
+    return _active.get()
+
+
+def version_path(filepath: str) -> str:
+    """
+    Returns the path to read the pool file filepath from, as given to `Query.filter`: its copy in the pool of the
+    version being filtered by `qdvc checkout`, or filepath itself elsewhere. The working tree may hold the pool of
+    another version while a query is checked out.
+    """
+    snapshot = active_snapshot()
+    if snapshot is None or not snapshot.contains(filepath):
+        return filepath
+    return snapshot.copy_path(filepath)
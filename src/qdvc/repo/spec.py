@@ -0,0 +1,215 @@
+"""Declarative queries: a `filter.yaml` spec compiled into a vectorized `Query`."""
+import operator
+import os
+import re
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Sequence
+
+if TYPE_CHECKING:
+    import numpy as np
+
+    from .columnar import ColumnarMetadata
+
+SPEC_SUFFIX = ".yaml"
+
+_OPERATORS: Dict[str, Callable[[Any, Any], Any]] = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+
+def _spec_schema():
+    from voluptuous import Any as AnyOf
+    from voluptuous import Schema
+
+    patterns = AnyOf(str, [str])
+    return Schema(
+        {
+            "include": patterns,
+            "exclude": patterns,
+            "regex": patterns,
+            "exclude_regex": patterns,
+            "metadata": {str: object},
+            "compose": {AnyOf("union", "intersect", "minus"): [str]},
+        }
+    )
+
+
+def is_spec(filter_path: str) -> bool:
+    return filter_path.endswith(SPEC_SUFFIX)
+
+
+def load_spec(spec_path: str) -> Dict[str, Any]:
+    from ruamel.yaml import YAML
+
+    with open(spec_path, encoding="utf-8") as f:
+        spec = YAML(typ="safe").load(f) or {}
+    return _spec_schema()(spec)
+
+
+def glob_to_regex(pattern: str) -> str:
+    """
+    Translates a glob on `/` separated paths into a regex: `*` and `?` do not match `/`, `**` matches any number of
+    directories.
+    """
+    regex, i = [], 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            regex.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            regex.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            regex.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            regex.append("[^/]")
+            i += 1
+        elif pattern[i] == "[" and "]" in pattern[i + 2 :]:
+            end = pattern.index("]", i + 2)
+            content = pattern[i + 1 : end]
+            regex.append("[" + ("^" + content[1:] if content[0] == "!" else content) + "]")
+            i = end + 1
+        else:
+            regex.append(re.escape(pattern[i]))
+            i += 1
+    return "".join(regex) + r"\Z"
+
+
+def _literal_prefix(glob: str) -> str:
+    """
+    Returns the directories of glob before its first wildcard, with a trailing `/`, or "" if there are none.
+    """
+    wildcard = min((i for i, c in enumerate(glob) if c in "*?["), default=len(glob))
+    return glob[: glob.rfind("/", 0, wildcard) + 1]
+
+
+def _combine(globs: List[str], regexes: List[str]) -> Optional["re.Pattern"]:
+    """
+    Returns a single regex matching the paths matched by any of globs or searched by any of regexes.
+    """
+    alternatives = [glob_to_regex(glob) for glob in globs] + [f".*?(?:{regex})" for regex in regexes]
+    return re.compile("|".join(f"(?:{alternative})" for alternative in alternatives)) if alternatives else None
+
+
+def _as_list(patterns: Any) -> List[str]:
+    if patterns is None:
+        return []
+    return [patterns] if isinstance(patterns, str) else list(patterns)
+
+
+def _compile_condition(np, column: "np.ndarray", condition: Any) -> "np.ndarray":
+    """
+    Returns the mask of the rows of column satisfying condition: a value to be equal to, or a mapping of operators
+    (==, !=, <, <=, >, >=, in, not in) to operands, which must all hold.
+    """
+    if not isinstance(condition, dict):
+        condition = {"==": condition}
+    mask = np.ones(len(column), dtype=bool)
+    for op, operand in condition.items():
+        if op in ("in", "not in"):
+            result = np.isin(column, list(operand))
+            mask &= result if op == "in" else ~result
+        elif op in _OPERATORS:
+            mask &= np.asarray(_OPERATORS[op](column, operand), dtype=bool)
+        else:
+            raise Exception(f"Unknown operator '{op}' in filter spec, use one of {', '.join(_OPERATORS)}, in, not in.")
+    return mask
+
+
+class SpecQuery:
+    """
+    Query of a `filter.yaml` spec:
+
+        include: "images/**/*.jpg"   # globs on the original paths, the files must match one of them
+        exclude: ["**/tmp/**"]       # globs of the files rejected
+        regex: "cam[0-9]"            # regexes searched in the original paths, the files must match one of them
+        exclude_regex: []            # regexes of the files rejected
+        metadata:                    # conditions on the metadata fields, which must all hold
+          width: {">=": 1024}
+          camera: {in: [front, rear]}
+          night: false
+
+    The globs and the regexes are compiled into one regex per key, and the metadata conditions into a mask over the
+    whole columns of the metadata store, computed once when the query is built. Each file of a chunk then costs a
+    match of the compiled regexes and a hash lookup of its row, the mask being gathered for the whole chunk at once.
+    """
+
+    SPEC_PATH: str = ""
+
+    def __init__(self, spec_path: Optional[str] = None, metadata: Optional["ColumnarMetadata"] = None):
+        from qdvc.repo import Repo
+
+        spec = load_spec(spec_path or self.SPEC_PATH)
+        if spec.get("compose"):
+            raise Exception("A composed query is built from the results of its queries by checkout, not by a filter.")
+        self._pool_marker = "/" + Repo.QDVC_DATA_DIR + "/"
+        self.include = _combine(_as_list(spec.get("include")), _as_list(spec.get("regex")))
+        # Directories that can contain files matched by the include globs, when there are no include regexes
+        self._include_prefixes = (
+            [_literal_prefix(glob) for glob in _as_list(spec.get("include"))]
+            if spec.get("include") and not spec.get("regex")
+            else None
+        )
+        self.exclude = _combine(_as_list(spec.get("exclude")), _as_list(spec.get("exclude_regex")))
+        self.metadata = None
+        self.rows_mask = None
+        if spec.get("metadata"):
+            from .columnar import ColumnarMetadata, _import_numpy
+
+            np = _import_numpy()
+            self.metadata = metadata or ColumnarMetadata.open()
+            self.rows_mask = np.ones(len(self.metadata), dtype=bool)
+            for name, condition in spec["metadata"].items():
+                self.rows_mask &= _compile_condition(np, self.metadata.column(name), condition)
+
+    def _original_path(self, filepath: str) -> str:
+        """
+        Returns the path of a pool file relatively to the pool directory and without its `.dvc` suffix, which is the
+        original path of the data file.
+        """
+        filepath = filepath.replace(os.sep, "/")
+        if self._pool_marker in filepath:
+            filepath = filepath[filepath.index(self._pool_marker) + len(self._pool_marker) :]
+        return filepath[: -len(".dvc")] if filepath.endswith(".dvc") else filepath
+
+    def filter_batch(self, filepaths: Sequence[str]) -> List[bool]:
+        paths = [self._original_path(filepath) for filepath in filepaths]
+        include, exclude = self.include, self.exclude
+        keep = [
+            (include is None or include.match(path) is not None) and (exclude is None or exclude.match(path) is None)
+            for path in paths
+        ]
+        if self.metadata is not None:
+            from .columnar import _import_numpy
+
+            np = _import_numpy()
+            rows = self.metadata.rows(filepaths)
+            found = rows >= 0
+            keep_rows = found.copy()
+            keep_rows[found] = self.rows_mask[rows[found]]
+            keep = (keep_rows & np.asarray(keep, dtype=bool)).tolist()
+        return keep
+
+    def filter(self, filepath: str) -> bool:
+        return bool(self.filter_batch([filepath])[0])
+
+    def filter_dir(self, dirpath: str) -> bool:
+        """
+        Rejects the pool directories in which none of the include globs can match.
+        """
+        if self._include_prefixes is None:
+            return True
+        dirpath = self._original_path(dirpath) + "/"
+        return any(prefix.startswith(dirpath) or dirpath.startswith(prefix) for prefix in self._include_prefixes)
+
+
+def spec_query_class(spec_path: str) -> type:
+    """
+    Returns the `Query` class of the spec at spec_path.
+    """
+    return type("Query", (SpecQuery,), {"SPEC_PATH": spec_path})
@@ -1,4 +1,12 @@
+# `filter`, `filter_batch` and `filter_dir` are given the paths of the pool files under `.data/` in the repo. The
+# working tree may hold the pool of another version than the one filtered, or no pool at all with `qdvc checkout
+# --sparse`: to read a `.dvc` file of that version, open `qdvc.repo.snapshot.version_path(filepath)` instead of
+# filepath.
+# The records given to `filter_record` are always read from the version filtered.
 class Query:
+    # Set to False if the query cannot be built and evaluated in worker processes (`qdvc checkout --jobs`)
+    FORK_SAFE = True
+
     def __init__(self):
         pass
 
@@ -7,3 +15,31 @@ class Query:
         Determines if the file filepath should be kept in the filtered data.
         """
         pass
+
+    # Optionally, implement `filter_batch` instead of `filter` to decide on a whole chunk of files at once,
+    # e.g. with a single metadata join. It is preferred over `filter` when present.
+    #
+    # def filter_batch(self, filepaths: list) -> list:
+    #     """
+    #     Determines for each of the filepaths if it should be kept in the filtered data.
+    #     May return a NumPy boolean array.
+    #     """
+    #     pass
+
+    # Optionally, implement `filter_dir` to skip whole directories of the pool: the files under a rejected directory
+    # are rejected without calling `filter` on them.
+    #
+    # def filter_dir(self, dirpath: str) -> bool:
+    #     """
+    #     Determines if the pool directory dirpath may contain files to keep in the filtered data.
+    #     """
+    #     return True
+
+    # Optionally, implement `filter_record` instead of `filter` to decide on the parsed `.dvc` file: the record has
+    # the attributes path, md5, size, nfiles and original_path. The `.dvc` files are parsed by the worker processes.
+    #
+    # def filter_record(self, record) -> bool:
+    #     """
+    #     Determines if the file of record should be kept in the filtered data.
+    #     """
+    #     return record.size < 10_000_000
@@ -1,10 +1,84 @@
 """
-    Dummy conftest.py for qdvc.
+Fixtures of the qdvc test suite.
 
-    If you don't know what this is for, just leave it empty.
-    Read more about conftest.py under:
-    - https://docs.pytest.org/en/stable/fixture.html
-    - https://docs.pytest.org/en/stable/writing_plugins.html
+The `repo` fixture is a qdvc repo in a temporary directory, whose pool holds images under `images/a/` and
+`images/b/`: `a/1.jpg`, `a/2.jpg` and `b/3.jpg` added on version `v1`, and `a/4.jpg` added on version `v2`.
 """
+import os
 
-# import pytest
+import pytest
+from git.repo import Repo as GitRepo
+
+from qdvc.repo import Repo
+
+# Keeps the images of `images/a/`
+FILTER_PY = """
+import os
+
+
+class Query:
+    def filter(self, filepath):
+        return os.path.basename(os.path.dirname(filepath)) == "a"
+"""
+
+
+def write(path: str, text: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def _add_version(repo: Repo, tag: str, *names: str):
+    """
+    Adds the images of names, written with their name, and commits them on master as version tag.
+    """
+    paths = [os.path.join(repo.root_dir, "images", f"{name}.jpg") for name in names]
+    for name, path in zip(names, paths):
+        write(path, name)
+    repo.add(paths, fname=None)
+    repo.git_repo.git.commit(message=tag)
+    repo.git_repo.create_tag(tag)
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    for name in ("GIT_AUTHOR", "GIT_COMMITTER"):
+        monkeypatch.setenv(f"{name}_NAME", "qdvc")
+        monkeypatch.setenv(f"{name}_EMAIL", "qdvc@example.com")
+    monkeypatch.setenv("DVC_NO_ANALYTICS", "1")
+    monkeypatch.chdir(tmp_path)
+    root_dir = str(tmp_path)
+    git_repo = GitRepo.init(root_dir, initial_branch="master")
+    Repo.init(root_dir)
+    git_repo.git.add(all=True)
+    git_repo.git.commit(message="init")
+
+    repo = Repo(root_dir)
+    _add_version(repo, "v1", "a/1", "a/2", "b/3")
+    _add_version(repo, "v2", "a/4")
+    return repo
+
+
+@pytest.fixture
+def add_version(repo):
+    """
+    Returns a function adding images to the pool as a new version, see `_add_version`.
+    """
+    return lambda tag, *names: _add_version(repo, tag, *names)
+
+
+@pytest.fixture
+def make_query(repo):
+    """
+    Returns a function creating the query name with the filter filter_text, and going back to master.
+    """
+
+    def make(name: str, filter_text: str = FILTER_PY):
+        repo.query(name)
+        filter_path = os.path.join(repo.qdvc_dir, repo.FILTER_FILE_NAME)
+        write(filter_path, filter_text)
+        repo.git_repo.git.add(filter_path)
+        repo.commit(name)
+        repo.git_repo.heads.master.checkout()
+
+    return make
@@ -0,0 +1,117 @@
+import os
+
+import pytest
+from conftest import write
+
+from qdvc.repo.add import AddCheckpoint
+from qdvc.repo.cache import StatCache
+from qdvc.repo.pool import PENDING_SUFFIX, PoolEntry, append_pending_manifest, read_manifest
+
+
+def _write_images(repo, *names: str):
+    for name in names:
+        write(os.path.join(repo.root_dir, "images", "c", f"{name}.jpg"), name)
+    return os.path.join(repo.root_dir, "images", "c")
+
+
+def test_add_in_chunks(repo):
+    images_dir = _write_images(repo, "7", "8", "9")
+    new_paths = repo.add([images_dir], recursive=True, chunk_size=2)
+    assert sorted(os.path.basename(path) for path in new_paths) == ["7.jpg.dvc", "8.jpg.dvc", "9.jpg.dvc"]
+    paths = [entry.path for entry in read_manifest(repo.pool_manifest_path)]
+    assert [path for path in paths if path.startswith("images/c/")] == [f"images/c/{i}.jpg.dvc" for i in (7, 8, 9)]
+    # Merged once, and staged
+    assert not os.path.exists(repo.pool_manifest_path + PENDING_SUFFIX)
+    assert not repo.git_repo.git.diff(repo.pool_manifest_path)
+    with open(os.path.join(repo.git_dir, "info", "exclude"), encoding="utf-8") as f:
+        assert "/.qdvc/pool.manifest.pending" in f.read().splitlines()
+
+
+def test_add_in_chunks_skips_files_in_pool(repo):
+    images_dir = _write_images(repo, "7", "8")
+    repo.add([images_dir], recursive=True, chunk_size=2)
+    _write_images(repo, "9")
+    write(os.path.join(images_dir, "8.jpg"), "modified")
+    new_paths = repo.add([images_dir], recursive=True, chunk_size=2)
+    assert sorted(os.path.basename(path) for path in new_paths) == ["8.jpg.dvc", "9.jpg.dvc"]
+
+
+def test_add_merges_pending_manifest(repo):
+    # Left by an interrupted add
+    append_pending_manifest(repo.pool_manifest_path, [PoolEntry("images/c/0.jpg.dvc", "md5", 1, "sha")])
+    repo.add([_write_images(repo, "7")], recursive=True, chunk_size=2)
+    paths = [entry.path for entry in read_manifest(repo.pool_manifest_path)]
+    assert {"images/c/0.jpg.dvc", "images/c/7.jpg.dvc"} <= set(paths)
+    assert not os.path.exists(repo.pool_manifest_path + PENDING_SUFFIX)
+
+
+def test_add_skips_unchanged_files(repo):
+    images_dir = os.path.join(repo.root_dir, "images", "a")
+    assert repo.add([images_dir], recursive=True, fname=None) == []
+    write(os.path.join(images_dir, "2.jpg"), "modified")
+    new_paths = repo.add([images_dir], recursive=True, fname=None)
+    assert [os.path.basename(path) for path in new_paths] == ["2.jpg.dvc"]
+
+
+def test_add_skips_unchanged_directory(repo):
+    images_dir = _write_images(repo, "7", "8")
+    assert [os.path.basename(path) for path in repo.add([images_dir], fname=None)] == ["c.dvc"]
+    assert repo.add([images_dir], fname=None) == []
+    # Skipped only while the directory holds the files it had, unchanged
+    _write_images(repo, "9")
+    assert [os.path.basename(path) for path in repo.add([images_dir], fname=None)] == ["c.dvc"]
+    assert repo.add([images_dir], fname=None) == []
+    write(os.path.join(images_dir, "7.jpg"), "modified")
+    assert [os.path.basename(path) for path in repo.add([images_dir], fname=None)] == ["c.dvc"]
+
+
+def test_clear_cache_removes_stat_cache(repo):
+    db_path = os.path.join(repo.config["cache"]["dir"], StatCache.DB_FILE_NAME)
+    assert os.path.exists(db_path)
+    repo.clear_cache()
+    assert not os.path.exists(db_path)
+    images_dir = os.path.join(repo.root_dir, "images", "a")
+    assert len(repo.add([images_dir], recursive=True, fname=None)) == 3
+
+
+def _write_list(repo, tmp_path, *names: str) -> str:
+    images_dir = _write_images(repo, *names)
+    list_path = tmp_path / "list.txt"
+    list_path.write_text("".join(os.path.join(images_dir, f"{name}.jpg") + "\n" for name in names), encoding="utf-8")
+    return str(list_path)
+
+
+def test_add_from_file(repo, tmp_path):
+    list_path = _write_list(repo, tmp_path, "7", "8", "9")
+    new_paths = repo.add([], from_file=list_path, chunk_size=2)
+    assert sorted(os.path.basename(path) for path in new_paths) == ["7.jpg.dvc", "8.jpg.dvc", "9.jpg.dvc"]
+    checkpoint_path = os.path.join(repo.qdvc_dir, AddCheckpoint.FILE_NAME)
+    assert not os.path.exists(checkpoint_path)
+    with open(os.path.join(repo.git_dir, "info", "exclude"), encoding="utf-8") as f:
+        assert "/.qdvc/add.checkpoint" in f.read().splitlines()
+
+
+def test_add_from_file_resumes_after_checkpoint(repo, tmp_path):
+    list_path = _write_list(repo, tmp_path, "7", "8", "9")
+    with open(list_path, encoding="utf-8") as f:
+        lines = f.readlines()
+    # Left by an ingest interrupted after its first chunk
+    AddCheckpoint(os.path.join(repo.qdvc_dir, AddCheckpoint.FILE_NAME), list_path).save(lines[:1])
+    new_paths = repo.add([], from_file=list_path, chunk_size=1)
+    assert sorted(os.path.basename(path) for path in new_paths) == ["8.jpg.dvc", "9.jpg.dvc"]
+
+
+def test_add_from_file_refuses_changed_list(repo, tmp_path):
+    list_path = _write_list(repo, tmp_path, "7", "8")
+    AddCheckpoint(os.path.join(repo.qdvc_dir, AddCheckpoint.FILE_NAME), list_path).save(["other\n"])
+    with pytest.raises(Exception, match="differs from the list"):
+        repo.add([], from_file=list_path)
+
+
+def test_checkpoint_of_other_list_is_ignored(tmp_path):
+    path = str(tmp_path / AddCheckpoint.FILE_NAME)
+    AddCheckpoint(path, str(tmp_path / "list.txt")).save(["a\n", "b\n"])
+    checkpoint = AddCheckpoint(path, str(tmp_path / "other.txt"))
+    lines = iter(["a\n", "b\n"])
+    assert checkpoint.skip(lines) == 0
+    assert list(lines) == ["a\n", "b\n"]
@@ -0,0 +1,64 @@
+import pytest
+
+from qdvc.repo.bitmap import RoaringBitmap
+from qdvc.repo.membership import PoolIds
+
+
+@pytest.mark.parametrize(
+    "ids",
+    [
+        [],
+        [0],
+        [1, 5, 65535],
+        [3, 65536, 65537, 1 << 20, (1 << 32) - 1],
+        list(range(10, 10000, 2)),  # dense container, stored as a bitmap
+        list(range(0, 70000, 3)) + [1 << 30],
+    ],
+)
+def test_round_trip(ids):
+    bitmap = RoaringBitmap.from_sorted(ids)
+    read = RoaringBitmap(bitmap.to_bytes())
+    assert list(read) == ids
+    assert len(read) == len(ids)
+
+
+def test_membership():
+    ids = [2, 7, 65536 + 4] + list(range(200000, 210000))
+    bitmap = RoaringBitmap(RoaringBitmap.from_sorted(ids).to_bytes())
+    for i in ids:
+        assert i in bitmap
+    for i in (0, 3, 65536, 65536 + 5, 199999, 210000, 1 << 31):
+        assert i not in bitmap
+
+
+def test_set_operations_on_ids():
+    a = RoaringBitmap.from_sorted([1, 2, 3, 70000, 70001])
+    b = RoaringBitmap.from_sorted([2, 3, 4, 70001])
+    assert sorted(set(a) & set(b)) == [2, 3, 70001]
+    assert sorted(set(a) | set(b)) == [1, 2, 3, 4, 70000, 70001]
+    assert [i for i in a if i not in b] == [1, 70000]
+
+
+def test_dense_container_is_smaller_than_array():
+    dense = RoaringBitmap.from_sorted(range(60000))
+    assert len(dense.to_bytes()) < 2 * 60000
+
+
+def test_invalid_data():
+    with pytest.raises(Exception, match="Invalid bitmap"):
+        RoaringBitmap(b"\0" * 8)
+
+
+def test_pool_ids(tmp_path):
+    paths = ["a/1.jpg.dvc", "a/2.jpg.dvc", "b/é.jpg.dvc"]
+    PoolIds.write(str(tmp_path), paths)
+    ids = PoolIds(str(tmp_path))
+    assert len(ids) == 3
+    assert [ids.id(path) for path in paths] == [0, 1, 2]
+    assert ids.id("a/0.jpg.dvc") == -1
+    assert ids.id("c.dvc") == -1
+
+
+def test_empty_pool_ids(tmp_path):
+    PoolIds.write(str(tmp_path), [])
+    assert PoolIds(str(tmp_path)).id("a.dvc") == -1
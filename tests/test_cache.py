@@ -0,0 +1,71 @@
+import os
+
+from qdvc.repo.cache import FilterCache, StatCache
+
+
+def _cache(tmp_path, filter_hash="filter", max_entries=100, md5s=None):
+    md5s = md5s if md5s is not None else {}
+    return FilterCache(str(tmp_path / "cache"), str(tmp_path), filter_hash, max_entries, md5s.get)
+
+
+def test_filter_cache(tmp_path):
+    paths = [os.path.join(str(tmp_path), ".data", name) for name in ("a.dvc", "b.dvc", "c.dvc")]
+    md5s = dict(zip(paths, ["1", "2", None]))
+    with _cache(tmp_path, md5s=md5s) as cache:
+        keys = cache.keys(paths)
+        assert keys == list(md5s.items())
+        assert cache.lookup(keys) == {}
+        cache.store((path, md5, path.endswith("a.dvc")) for path, md5 in keys)
+    with _cache(tmp_path, md5s=md5s) as cache:
+        # Files without md5 are never cached
+        assert cache.lookup(cache.keys(paths)) == {paths[0]: True, paths[1]: False}
+
+
+def test_filter_cache_is_keyed_by_filter_and_md5(tmp_path):
+    path = os.path.join(str(tmp_path), ".data", "a.dvc")
+    with _cache(tmp_path) as cache:
+        cache.store([(path, "1", True)])
+    with _cache(tmp_path, filter_hash="other") as cache:
+        assert cache.lookup([(path, "1")]) == {}
+    with _cache(tmp_path) as cache:
+        assert cache.lookup([(path, "2")]) == {}
+        assert cache.lookup([(path, "1")]) == {path: True}
+
+
+def test_filter_cache_stores_paths_relative_to_the_root(tmp_path):
+    with _cache(tmp_path) as cache:
+        cache.store([(os.path.join(str(tmp_path), ".data", "a.dvc"), "1", True)])
+    moved_root = tmp_path / "moved"
+    with FilterCache(str(tmp_path / "cache"), str(moved_root), "filter", 100) as cache:
+        assert cache.lookup([(os.path.join(str(moved_root), ".data", "a.dvc"), "1")])
+
+
+def test_filter_cache_evicts_least_recently_used(tmp_path):
+    paths = [os.path.join(str(tmp_path), ".data", f"{i}.dvc") for i in range(4)]
+    with _cache(tmp_path, max_entries=3) as cache:
+        cache.store((path, "1", True) for path in paths[:3])
+    with _cache(tmp_path, max_entries=3) as cache:
+        cache.lookup([(paths[0], "1")])
+        cache.store([(paths[3], "1", True)])
+    with _cache(tmp_path, max_entries=3) as cache:
+        assert set(cache.lookup((path, "1") for path in paths)) == {paths[0], paths[2], paths[3]}
+
+
+def test_hash_filter(tmp_path):
+    filter_path = tmp_path / "filter.py"
+    filter_path.write_text("class Query: pass\n")
+    filter_hash = FilterCache.hash_filter(str(filter_path))
+    filter_path.write_text("class Query: pass  \n")
+    assert FilterCache.hash_filter(str(filter_path)) != filter_hash
+
+
+def test_stat_cache(tmp_path):
+    path = tmp_path / "1.jpg"
+    path.write_text("1")
+    with StatCache(str(tmp_path / "cache")) as cache:
+        assert cache.get_md5(str(path), os.stat(path)) is None
+        cache.save([(str(path), os.stat(path), "md5")])
+    with StatCache(str(tmp_path / "cache")) as cache:
+        assert cache.get_md5(str(path), os.stat(path)) == "md5"
+        path.write_text("modified")
+        assert cache.get_md5(str(path), os.stat(path)) is None
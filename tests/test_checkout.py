@@ -0,0 +1,440 @@
+import os
+
+import pytest
+from git.repo import Repo as GitRepo
+
+from qdvc.cli.main import main
+from qdvc.repo.metadata import update_metadata
+
+# Keeps the images of `images/a/`, and logs the files it filters
+LOGGING_FILTER_PY = """
+import os
+
+
+class Query:
+    def filter(self, filepath):
+        with open({log_path!r}, "a") as f:
+            f.write(os.path.basename(filepath) + "\\n")
+        return os.path.basename(os.path.dirname(filepath)) == "a"
+"""
+
+V2_RESULT = ["images/a/1.jpg.dvc", "images/a/2.jpg.dvc", "images/a/4.jpg.dvc"]
+V3_RESULT = V2_RESULT + ["images/a/5.jpg.dvc"]
+
+
+def _result(repo, branch: str):
+    """
+    Returns the files of the query branch outside `.qdvc/` and `.data/`, which are the files of its result.
+    """
+    files = repo.git_repo.git.ls_tree("-r", "--name-only", branch).splitlines()
+    return sorted(path for path in files if path.startswith("images/"))
+
+
+@pytest.fixture
+def filtered(repo, make_query, tmp_path_factory):
+    """
+    Creates the query `day` logging the files it filters, and returns a function popping the logged files.
+    """
+    log_path = str(tmp_path_factory.mktemp("log") / "filtered")
+    make_query("day", LOGGING_FILTER_PY.format(log_path=log_path))
+
+    def pop():
+        if not os.path.exists(log_path):
+            return []
+        with open(log_path, encoding="utf-8") as f:
+            names = sorted(f.read().split())
+        os.remove(log_path)
+        return names
+
+    return pop
+
+
+@pytest.mark.parametrize("jobs", [None, 2])
+def test_checkout(repo, make_query, jobs):
+    make_query("day")
+    repo.checkout("day", "v2", download_files=False, jobs=jobs)
+    assert _result(repo, "query/day/v2") == V2_RESULT
+
+
+def test_incremental_checkout(repo, filtered, add_version):
+    repo.checkout("day", "v2", download_files=False)
+    assert filtered() == ["1.jpg.dvc", "2.jpg.dvc", "3.jpg.dvc", "4.jpg.dvc"]
+    add_version("v3", "a/5", "b/6")
+    repo.checkout("day", "v3", download_files=False)
+    assert filtered() == ["5.jpg.dvc", "6.jpg.dvc"]
+    assert _result(repo, "query/day/v2") == V2_RESULT
+    assert _result(repo, "query/day/v3") == V3_RESULT
+
+
+def test_checkout_without_incremental(repo, filtered, add_version):
+    repo.checkout("day", "v2", download_files=False)
+    filtered()
+    add_version("v3", "a/5", "b/6")
+    repo.checkout("day", "v3", download_files=False, incremental=False, use_cache=False)
+    assert filtered() == ["1.jpg.dvc", "2.jpg.dvc", "3.jpg.dvc", "4.jpg.dvc", "5.jpg.dvc", "6.jpg.dvc"]
+    assert _result(repo, "query/day/v3") == V3_RESULT
+
+
+def test_checkout_with_cache(repo, filtered, add_version):
+    repo.checkout("day", "v2", download_files=False, incremental=False, use_cache=False)
+    filtered()
+    repo.checkout("day", "v2", download_files=False)
+    assert filtered() == ["1.jpg.dvc", "2.jpg.dvc", "3.jpg.dvc", "4.jpg.dvc"]
+    add_version("v3", "a/5")
+    repo.checkout("day", "v3", download_files=False, incremental=False)
+    assert filtered() == ["5.jpg.dvc"]
+    assert _result(repo, "query/day/v3") == V2_RESULT + ["images/a/5.jpg.dvc"]
+    # Ignored even if `.qdvc/.gitignore` does not list it
+    with open(os.path.join(repo.git_dir, "info", "exclude"), encoding="utf-8") as f:
+        assert "/.qdvc/cache/" in f.read().splitlines()
+
+
+def test_checkout_with_stale_manifest(repo, filtered):
+    repo.checkout("day", "v2", download_files=False)
+    filtered()
+    # Committed with git alone: the manifest does not list it
+    pool_dir = os.path.join(repo.data_qdvc_dir, "images", "a")
+    with open(os.path.join(pool_dir, "1.jpg.dvc"), encoding="utf-8") as f:
+        text = f.read()
+    with open(os.path.join(pool_dir, "7.jpg.dvc"), "w", encoding="utf-8") as f:
+        f.write(text.replace("1.jpg", "7.jpg"))
+    repo.git_repo.git.add(pool_dir)
+    repo.git_repo.git.commit(message="v3")
+    repo.git_repo.create_tag("v3")
+    repo.checkout("day", "v3", download_files=False, incremental=False)
+    assert filtered() == ["7.jpg.dvc"]
+    assert _result(repo, "query/day/v3") == V2_RESULT + ["images/a/7.jpg.dvc"]
+
+
+# Keeps the images whose metadata has `keep`, and logs the files it filters
+METADATA_FILTER_PY = """
+import os
+
+from qdvc.repo.metadata import MetadataStore
+
+
+class Query:
+    def __init__(self):
+        self.metadata = MetadataStore()
+
+    def filter(self, filepath):
+        with open({log_path!r}, "a") as f:
+            f.write(os.path.basename(filepath) + "\\n")
+        return self.metadata.get(filepath).get("keep", False)
+"""
+
+
+@pytest.fixture
+def kept(repo, make_query, tmp_path_factory):
+    """
+    Creates the query `day` keeping the images whose metadata has `keep`, and returns a function committing the
+    metadata of names as a new version, and a function popping the logged files.
+    """
+    log_path = str(tmp_path_factory.mktemp("log") / "filtered")
+    make_query("day", METADATA_FILTER_PY.format(log_path=log_path))
+
+    def commit(tag, *names):
+        update_metadata(repo.metadata_path, [(f"images/{name}.jpg.dvc", {"keep": True}) for name in names])
+        repo.git_repo.git.add(repo.metadata_path)
+        repo.git_repo.git.commit(message=tag)
+        repo.git_repo.create_tag(tag)
+
+    def pop():
+        with open(log_path, encoding="utf-8") as f:
+            names = sorted(f.read().split())
+        os.remove(log_path)
+        return names
+
+    return commit, pop
+
+
+def test_checkout_with_cache_refilters_changed_metadata(repo, kept):
+    commit, pop = kept
+    commit("v3", "a/1")
+    repo.checkout("day", "v3", download_files=False, incremental=False)
+    assert _result(repo, "query/day/v3") == ["images/a/1.jpg.dvc"]
+    assert pop() == ["1.jpg.dvc", "2.jpg.dvc", "3.jpg.dvc", "4.jpg.dvc"]
+    commit("v4", "a/2")
+    repo.checkout("day", "v4", download_files=False, incremental=False)
+    # Only the file whose metadata changed misses the cache
+    assert pop() == ["2.jpg.dvc"]
+    assert _result(repo, "query/day/v4") == ["images/a/1.jpg.dvc", "images/a/2.jpg.dvc"]
+
+
+@pytest.mark.parametrize("worktree", [True, False])
+def test_incremental_checkout_refilters_changed_metadata(repo, kept, worktree):
+    commit, pop = kept
+    commit("v3", "a/1")
+    repo.checkout("day", "v3", download_files=False, worktree=worktree)
+    pop()
+    commit("v4", "b/3")
+    repo.checkout("day", "v4", download_files=False, use_cache=False, worktree=worktree)
+    assert pop() == ["3.jpg.dvc"]
+    assert _result(repo, "query/day/v4") == ["images/a/1.jpg.dvc", "images/b/3.jpg.dvc"]
+
+
+def test_checkout_without_worktree_reads_metadata_of_version(repo, kept):
+    commit, pop = kept
+    commit("v3", "a/1")
+    commit("v4", "a/2")
+    repo.git_repo.git.checkout("v4")
+    repo.checkout("day", "v3", download_files=False, worktree=False)
+    assert _result(repo, "query/day/v3") == ["images/a/1.jpg.dvc"]
+
+
+# Keeps the images of `images/a/` found in the version filtered, and logs its `__file__` and the paths it is given
+VERSION_FILTER_PY = """
+import os
+
+from qdvc.repo.snapshot import version_path
+
+
+class Query:
+    def filter(self, filepath):
+        with open({log_path!r}, "a") as f:
+            f.write(__file__ + "\\n" + filepath + "\\n")
+        return os.path.basename(os.path.dirname(filepath)) == "a" and os.path.exists(version_path(filepath))
+"""
+
+
+@pytest.mark.parametrize("jobs", [None, 2])
+def test_checkout_without_worktree(repo, make_query, tmp_path_factory, jobs):
+    log_path = str(tmp_path_factory.mktemp("log") / "filtered")
+    make_query("day", VERSION_FILTER_PY.format(log_path=log_path))
+    repo.git_repo.git.checkout("v1")
+    head, status = repo.git_repo.head.commit.hexsha, repo.git_repo.git.status("--porcelain")
+    repo.checkout("day", "v2", download_files=False, jobs=jobs, worktree=False)
+    assert _result(repo, "query/day/v2") == V2_RESULT
+    assert (repo.git_repo.head.commit.hexsha, repo.git_repo.git.status("--porcelain")) == (head, status)
+    # Stable paths in the repo, though `a/4.jpg.dvc` is only found in the snapshot of v2
+    with open(log_path, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    assert set(lines[::2]) == {os.path.join(repo.qdvc_dir, "filter.py")}
+    assert os.path.join(repo.data_qdvc_dir, "images", "a", "4.jpg.dvc") in lines[1::2]
+    assert not os.path.exists(os.path.join(repo.data_qdvc_dir, "images", "a", "4.jpg.dvc"))
+
+
+def test_checkout_without_worktree_cannot_download(repo, make_query):
+    make_query("day")
+    with pytest.raises(Exception, match="without a working tree"):
+        repo.checkout("day", "v2", download_files=True, worktree=False)
+
+
+def test_checkout_downloads_files(repo, make_query, add_version):
+    make_query("day")
+    add_version("v3", "a/5", "b/6")
+    images = [os.path.join(repo.root_dir, "images", "a", f"{name}.jpg") for name in ("1", "2", "4", "5")]
+    for path in images:
+        os.remove(path)
+    repo.checkout("day", "v3", download_files=True, download_jobs=2)
+    assert _result(repo, "query/day/v3") == V3_RESULT
+    assert all(os.path.exists(path) for path in images)
+
+
+def test_checkout_composes_tree(repo, make_query):
+    make_query("day")
+    pool_file = os.path.join(repo.data_qdvc_dir, "images", "b", "3.jpg.dvc")
+    mtime = os.stat(pool_file).st_mtime_ns
+    commit = repo.checkout("day", "v2", download_files=False)
+    head = repo.git_repo.head.commit
+    assert (repo.git_repo.active_branch.name, head.hexsha) == ("query/day/v2", commit)
+    assert head.parents == (repo.git_repo.commit("v2"), repo.git_repo.commit("query/day/init"))
+    # The pool is not rewritten in the working tree
+    assert os.stat(pool_file).st_mtime_ns == mtime
+    assert repo.git_repo.git.status("--porcelain", "--untracked-files=no") == ""
+
+
+def test_checkout_downloads_existing_result(repo, make_query):
+    make_query("day")
+    commit = repo.checkout("day", "v2", download_files=False, worktree=False)
+    images = [os.path.join(repo.root_dir, "images", "a", f"{name}.jpg") for name in ("1", "2", "4")]
+    for path in images:
+        os.remove(path)
+    assert repo.checkout("day", "v2", download_files=True) == commit
+    assert repo.git_repo.active_branch.name == "query/day/v2"
+    assert all(os.path.exists(path) for path in images)
+    assert repo.git_repo.git.status("--porcelain", "--untracked-files=no") == ""
+
+
+def test_checkout_downloads_shard(repo, make_query):
+    make_query("day")
+    images = [os.path.join(repo.root_dir, "images", "a", f"{name}.jpg") for name in ("1", "2", "4")]
+    for path in images:
+        os.remove(path)
+    repo.checkout("day", "v2", download_files=True, shard=(0, 2))
+    first = [os.path.exists(path) for path in images]
+    repo.git_repo.heads.master.checkout()
+    for path in images:
+        if os.path.exists(path):
+            os.remove(path)
+    repo.checkout("day", "v2", download_files=True, shard=(1, 2))
+    second = [os.path.exists(path) for path in images]
+    # The shares are disjoint and cover the result
+    assert [a != b for a, b in zip(first, second)] == [True] * len(images)
+    with pytest.raises(Exception, match="along with downloading files"):
+        repo.checkout("day", "v2", download_files=False, shard=(0, 2))
+
+
+def test_checkout_worktrees(repo, make_query, add_version):
+    make_query("day")
+    add_version("v3", "a/5", "b/6")
+    status = repo.git_repo.git.status("--porcelain")
+    paths = repo.checkout_worktrees("day", ["v2", "v3"], download_files=True)
+    assert paths == [os.path.join(repo.qdvc_dir, "worktrees", "day", version) for version in ("v2", "v3")]
+    assert _result(repo, "query/day/v2") == V2_RESULT
+    assert _result(repo, "query/day/v3") == V3_RESULT
+    for path, result in zip(paths, [V2_RESULT, V3_RESULT]):
+        worktree_repo = GitRepo(path)
+        assert worktree_repo.active_branch.name == "query/day/" + os.path.basename(path)
+        # Downloaded from the cache of the main repo
+        assert all(os.path.exists(os.path.join(path, dvc_path[: -len(".dvc")])) for dvc_path in result)
+    assert repo.git_repo.active_branch.name == "master"
+    assert repo.git_repo.git.status("--porcelain") == status
+    with open(os.path.join(repo.git_dir, "info", "exclude"), encoding="utf-8") as f:
+        assert "/.qdvc/worktrees/" in f.read().splitlines()
+
+
+def test_checkout_sparse(repo, make_query):
+    make_query("day")
+    assert not repo.config["checkout"]["sparse"]
+    repo.checkout("day", "v2", download_files=False, sparse=True)
+    assert repo.git_repo.active_branch.name == "query/day/v2"
+    assert not os.path.exists(repo.data_qdvc_dir)
+    assert all(os.path.exists(os.path.join(repo.root_dir, path)) for path in V2_RESULT)
+    assert os.path.exists(os.path.join(repo.qdvc_dir, "filter.py"))
+    # Still readable by DVC, and whole again on the main branch
+    repo.add([os.path.join(repo.root_dir, "images", "a")], recursive=True, fname=None)
+    assert repo.git_repo.active_branch.name == "master"
+    assert os.path.exists(os.path.join(repo.data_qdvc_dir, "images", "b", "3.jpg.dvc"))
+    repo.checkout("day", "v2", download_files=True, sparse=True)
+    assert not os.path.exists(repo.data_qdvc_dir)
+    repo.checkout("day", "v1", download_files=False)
+    assert os.path.exists(os.path.join(repo.data_qdvc_dir, "images", "b", "3.jpg.dvc"))
+
+
+def test_checkout_worktrees_sparse(repo, make_query):
+    make_query("day")
+    (path,) = repo.checkout_worktrees("day", ["v2"], download_files=True, sparse=True)
+    assert not os.path.exists(os.path.join(path, repo.QDVC_DATA_DIR))
+    assert all(os.path.exists(os.path.join(path, dvc_path[: -len(".dvc")])) for dvc_path in V2_RESULT)
+    assert os.path.exists(os.path.join(repo.data_qdvc_dir, "images", "b", "3.jpg.dvc"))
+
+
+# Keeps the images of `images/a/` from their records, and logs their original paths
+RECORD_FILTER_PY = """
+import os
+
+
+class Query:
+    def filter(self, filepath):
+        raise AssertionError("filter_record is preferred")
+
+    def filter_record(self, record):
+        with open({log_path!r}, "a") as f:
+            f.write(record.original_path + "\\n")
+        return record.size == 3 and os.path.basename(os.path.dirname(record.original_path)) == "a"
+"""
+
+
+@pytest.mark.parametrize("worktree, jobs", [(True, None), (False, None), (False, 2)])
+def test_checkout_with_records(repo, make_query, tmp_path_factory, worktree, jobs):
+    log_path = tmp_path_factory.mktemp("log") / "filtered"
+    make_query("day", RECORD_FILTER_PY.format(log_path=str(log_path)))
+    repo.checkout("day", "v2", download_files=False, worktree=worktree, jobs=jobs)
+    assert _result(repo, "query/day/v2") == V2_RESULT
+    # Where the data is checked out in the repo
+    assert sorted(log_path.read_text().split()) == [
+        os.path.join(repo.root_dir, "images", *name.split("/")) for name in ("a/1.jpg", "a/2.jpg", "a/4.jpg", "b/3.jpg")
+    ]
+
+
+# Keeps the images of `images/a/`, logs the files it filters, and skips the other directories
+DIR_FILTER_PY = (
+    LOGGING_FILTER_PY
+    + """
+    def filter_dir(self, dirpath):
+        return os.path.basename(dirpath) != "b"
+"""
+)
+
+
+@pytest.mark.parametrize("worktree", [True, False])
+def test_checkout_prunes_directories(repo, make_query, add_version, tmp_path_factory, worktree):
+    log_path = tmp_path_factory.mktemp("log") / "filtered"
+    make_query("day", DIR_FILTER_PY.format(log_path=str(log_path)))
+    repo.checkout("day", "v2", download_files=False, worktree=worktree)
+    assert _result(repo, "query/day/v2") == V2_RESULT
+    assert sorted(log_path.read_text().split()) == ["1.jpg.dvc", "2.jpg.dvc", "4.jpg.dvc"]
+    log_path.unlink()
+    repo.git_repo.heads.master.checkout()
+    add_version("v3", "a/5", "b/6")
+    repo.checkout("day", "v3", download_files=False, worktree=worktree)
+    assert _result(repo, "query/day/v3") == V3_RESULT
+    assert log_path.read_text().split() == ["5.jpg.dvc"]
+
+
+# Keeps the images of `images/b/`, and logs the files it filters
+LOGGING_NIGHT_FILTER_PY = LOGGING_FILTER_PY.replace('== "a"', '== "b"')
+
+
+def test_checkout_all_queries(repo, filtered, make_query, add_version, tmp_path_factory):
+    night_log_path = str(tmp_path_factory.mktemp("log") / "filtered")
+    make_query("night", LOGGING_NIGHT_FILTER_PY.format(log_path=night_log_path))
+    status = repo.git_repo.git.status("--porcelain")
+    commits = repo.checkout_all_queries("v2", jobs=2)
+    assert sorted(commits) == ["day", "night"]
+    assert _result(repo, "query/day/v2") == V2_RESULT
+    assert _result(repo, "query/night/v2") == ["images/b/3.jpg.dvc"]
+    assert repo.git_repo.git.status("--porcelain") == status
+    assert filtered() == ["1.jpg.dvc", "2.jpg.dvc", "3.jpg.dvc", "4.jpg.dvc"]
+    # Each query only filters the files it has no cached decision for
+    add_version("v3", "a/5", "b/6")
+    repo.checkout_all_queries("v3")
+    assert filtered() == ["5.jpg.dvc", "6.jpg.dvc"]
+    with open(night_log_path, encoding="utf-8") as f:
+        assert sorted(f.read().split()) == [f"{i}.jpg.dvc" for i in range(1, 7)]
+    assert _result(repo, "query/day/v3") == V3_RESULT
+    assert _result(repo, "query/night/v3") == ["images/b/3.jpg.dvc", "images/b/6.jpg.dvc"]
+    # Already created branches are checked instead
+    assert repo.checkout_all_queries("v2", use_cache=False) == commits
+
+
+def test_checkout_all_queries_prunes_directories(repo, make_query, tmp_path_factory):
+    log_path = tmp_path_factory.mktemp("log") / "filtered"
+    make_query("day", DIR_FILTER_PY.format(log_path=str(log_path)))
+    make_query("night", LOGGING_NIGHT_FILTER_PY.format(log_path=str(log_path)))
+    repo.checkout_all_queries("v2", use_cache=False)
+    assert _result(repo, "query/day/v2") == V2_RESULT
+    assert _result(repo, "query/night/v2") == ["images/b/3.jpg.dvc"]
+    # `b/3.jpg` is only filtered by the query that does not reject its directory
+    names = log_path.read_text().split()
+    assert sorted(set(names)) == ["1.jpg.dvc", "2.jpg.dvc", "3.jpg.dvc", "4.jpg.dvc"]
+    assert names.count("3.jpg.dvc") == 1
+
+
+@pytest.mark.parametrize("worktree", [True, False])
+def test_checkout_sample(repo, make_query, worktree):
+    make_query("day")
+    repo.checkout("day", "v2", download_files=False, worktree=worktree, sample=2, seed=1)
+    sample = _result(repo, "query/day/v2+sample-2-seed-1")
+    assert len(sample) == 2 and set(sample) < set(V2_RESULT)
+    assert "query/day/v2" not in repo.git_repo.heads
+    repo.git_repo.heads.master.checkout()
+    # Samples are not reused as previous results
+    repo.checkout("day", "v2", download_files=False, worktree=worktree)
+    assert _result(repo, "query/day/v2") == V2_RESULT
+    repo.git_repo.heads.master.checkout()
+    repo.checkout("day", "v2", download_files=False, worktree=False, fraction=1, seed=1)
+    assert _result(repo, "query/day/v2+fraction-1-seed-1") == V2_RESULT
+
+
+@pytest.mark.parametrize("option", ["--download_files", "--incremental"])
+def test_checkout_all_queries_rejects_options(repo, make_query, option):
+    make_query("day")
+    assert main(["checkout", "--all-queries", "v2", option]) == 1
+    assert main(["checkout", "--all-queries", "v2", "--sample", "1"]) == 1
+    assert main(["checkout", "--all-queries", "v2", "--shard", "0/2"]) == 1
+    assert main(["checkout", "--all-queries", "v2", "--sparse"]) == 1
+    assert "query/day/v2" not in repo.git_repo.heads
+    assert main(["checkout", "--all-queries", "v2"]) == 0
+    assert _result(repo, "query/day/v2") == V2_RESULT
@@ -0,0 +1,93 @@
+import os
+
+import pytest
+
+from qdvc.repo.columnar import COLUMNAR_DIR_NAME, STALE_BUILD_SECONDS, ColumnarMetadata, MetadataQuery
+from qdvc.repo.metadata import update_metadata
+
+np = pytest.importorskip("numpy")
+
+METADATA = [
+    ("images/a/1.jpg.dvc", {"width": 2048, "night": False, "camera": "front"}),
+    ("images/a/2.jpg.dvc", {"width": 512, "night": True}),
+    ("images/b/3.jpg.dvc", {"width": 1024.5, "night": False, "camera": "rear"}),
+]
+
+
+@pytest.fixture
+def metadata(repo):
+    update_metadata(repo.metadata_path, METADATA)
+    return ColumnarMetadata.open(repo.root_dir)
+
+
+def test_columnar_metadata(repo, metadata):
+    assert len(metadata) == 3
+    assert sorted(metadata.columns) == ["camera", "night", "width"]
+    assert metadata.column("width").dtype == np.float64
+    assert metadata.column("night").dtype == bool
+    rows = metadata.rows([os.path.join(repo.data_qdvc_dir, "images", "b", "3.jpg.dvc"), "images/a/1.jpg.dvc", "x"])
+    assert list(metadata.column("camera")[rows[:2]]) == ["rear", "front"]
+    assert rows[2] == -1
+    # Missing values are left out
+    assert metadata.get("images/a/2.jpg.dvc") == {"width": 512.0, "night": True}
+    with pytest.raises(KeyError, match="No metadata column 'height'"):
+        metadata.column("height")
+
+
+def test_columnar_metadata_built_once_per_state(repo, metadata):
+    parent_dir = os.path.dirname(metadata.columnar_dir)
+    assert ColumnarMetadata.open(repo.root_dir).columnar_dir == metadata.columnar_dir
+    update_metadata(repo.metadata_path, [("images/a/4.jpg.dvc", {"width": 1})])
+    updated = ColumnarMetadata.open(repo.root_dir)
+    assert updated.columnar_dir != metadata.columnar_dir
+    assert len(updated) == 4
+    # Other builds are kept while they may be read, and removed once stale
+    assert os.path.exists(metadata.columnar_dir)
+    stale = os.stat(metadata.columnar_dir).st_mtime - STALE_BUILD_SECONDS - 1
+    os.utime(metadata.columnar_dir, (stale, stale))
+    ColumnarMetadata.open(repo.root_dir)
+    assert os.listdir(parent_dir) == [os.path.basename(updated.columnar_dir)]
+    # Still readable after its removal
+    assert metadata.get("images/a/1.jpg.dvc")["camera"] == "front"
+
+
+def test_clear_cache_removes_columnar_metadata(repo, metadata):
+    repo.clear_cache()
+    assert not os.path.exists(os.path.join(repo.config["cache"]["dir"], COLUMNAR_DIR_NAME))
+
+
+class _Large(MetadataQuery):
+    def select(self, rows):
+        return self.metadata.column("width")[rows] >= 1024
+
+
+def test_metadata_query(repo, metadata):
+    query = _Large(repo.root_dir)
+    paths = [os.path.join(repo.data_qdvc_dir, *path.split("/")) for path, _ in METADATA] + ["images/a/4.jpg.dvc"]
+    assert list(query.filter_batch(paths)) == [True, False, True, False]
+    assert query.filter(paths[0])
+
+
+# Keeps the images whose metadata has `keep`
+METADATA_QUERY_PY = """
+from qdvc.repo.columnar import MetadataQuery
+
+
+class Query(MetadataQuery):
+    def select(self, rows):
+        return self.metadata.column("keep")[rows]
+"""
+
+
+@pytest.mark.parametrize("jobs", [None, 2])
+def test_checkout_with_metadata_query(repo, make_query, jobs):
+    make_query("day", METADATA_QUERY_PY)
+    for tag, kept in [("v3", [True, False]), ("v4", [False, True])]:
+        update_metadata(repo.metadata_path, [(f"images/a/{i}.jpg.dvc", {"keep": k}) for i, k in zip((1, 2), kept)])
+        repo.git_repo.git.add(repo.metadata_path)
+        repo.git_repo.git.commit(message=tag)
+        repo.git_repo.create_tag(tag)
+    # Reads the metadata store of v3, though v4 is checked out
+    repo.checkout("day", "v3", download_files=False, jobs=jobs, worktree=False)
+    files = repo.git_repo.git.ls_tree("-r", "--name-only", "query/day/v3").splitlines()
+    assert [path for path in files if path.startswith("images/")] == ["images/a/1.jpg.dvc"]
@@ -0,0 +1,97 @@
+import os
+
+import pytest
+from conftest import FILTER_PY
+
+from qdvc.cli.main import main
+from qdvc.repo.compose import INTERSECT, MINUS, UNION, compose_results
+from qdvc.repo.pool import PoolEntry
+
+
+def _entries(*paths):
+    return [PoolEntry(path, f"md5-{path}", len(path)) for path in paths]
+
+
+@pytest.mark.parametrize(
+    "operation, expected",
+    [
+        (UNION, ["a", "b", "c", "d", "e"]),
+        (INTERSECT, ["c"]),
+        (MINUS, ["a"]),
+    ],
+)
+def test_compose_results(operation, expected):
+    results = [_entries("a", "c", "d"), _entries("b", "c", "d"), _entries("c", "e")]
+    assert [entry.path for entry in compose_results(operation, results)] == expected
+
+
+def test_compose_keeps_entries_once():
+    composed = list(compose_results(UNION, [_entries("a", "b"), _entries("a", "b")]))
+    assert composed == _entries("a", "b")
+
+
+def test_compose_empty_results():
+    assert list(compose_results(UNION, [[], []])) == []
+    assert list(compose_results(INTERSECT, [_entries("a"), []])) == []
+    assert list(compose_results(MINUS, [_entries("a"), []])) == _entries("a")
+    assert list(compose_results(MINUS, [[], _entries("a")])) == []
+
+
+def test_compose_streams_iterators():
+    composed = compose_results(INTERSECT, [iter(_entries("a", "b")), iter(_entries("b"))])
+    assert [entry.path for entry in composed] == ["b"]
+
+
+# Keeps the images of `images/b/`
+NIGHT_FILTER_PY = FILTER_PY.replace('== "a"', '== "b"')
+
+
+@pytest.fixture
+def queries(repo, make_query):
+    """
+    Creates the queries `day`, keeping `images/a/`, and `night`, keeping `images/b/`.
+    """
+    make_query("day")
+    make_query("night", NIGHT_FILTER_PY)
+
+
+def _result(repo, branch: str):
+    files = repo.git_repo.git.ls_tree("-r", "--name-only", branch).splitlines()
+    return sorted(path for path in files if path.startswith("images/"))
+
+
+def test_compose(repo, queries):
+    status = repo.git_repo.git.status("--porcelain")
+    repo.compose("all", UNION, ["day", "night"], versions=["v2"])
+    assert _result(repo, "query/all/v2") == [f"images/{name}.jpg.dvc" for name in ("a/1", "a/2", "a/4", "b/3")]
+    # The composed queries were checked out first
+    assert _result(repo, "query/day/v2") == [f"images/a/{i}.jpg.dvc" for i in (1, 2, 4)]
+    assert repo.git_repo.git.status("--porcelain") == status
+    repo.compose("no_night", MINUS, ["all", "night"])
+    repo.checkout("no_night", "v2", download_files=False)
+    assert repo.git_repo.active_branch.name == "query/no_night/v2"
+    assert _result(repo, "query/no_night/v2") == _result(repo, "query/day/v2")
+    assert os.path.exists(os.path.join(repo.root_dir, "images", "a", "4.jpg.dvc"))
+    assert not os.path.exists(os.path.join(repo.root_dir, "images", "b", "3.jpg.dvc"))
+
+
+def test_checkout_all_queries_with_composed(repo, queries):
+    repo.compose("both", INTERSECT, ["day", "night"])
+    commits = repo.checkout_all_queries("v2")
+    assert sorted(commits) == ["both", "day", "night"]
+    assert _result(repo, "query/both/v2") == []
+    assert _result(repo, "query/night/v2") == ["images/b/3.jpg.dvc"]
+
+
+def test_compose_errors(repo, queries):
+    with pytest.raises(Exception, match="at least 2 queries"):
+        repo.compose("all", UNION, ["day"])
+    with pytest.raises(Exception, match="was not found"):
+        repo.compose("all", UNION, ["day", "evening"])
+    repo.compose("all", UNION, ["day", "night"])
+    with pytest.raises(Exception, match="already exists"):
+        repo.compose("all", UNION, ["day", "night"])
+    assert main(["query", "compose", "other"]) == 1
+    assert main(["query", "other", "--union", "day", "night"]) == 1
+    assert main(["query", "compose", "other", "--minus", "day", "night"]) == 0
+    assert "query/other/init" in repo.git_repo.heads
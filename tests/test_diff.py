@@ -0,0 +1,61 @@
+import pytest
+
+from qdvc.cli.main import main
+from qdvc.repo.diff import ADDED, MODIFIED, REMOVED, ResultChange, diff_results, read_result
+from qdvc.repo.pool import PoolEntry
+
+
+def test_diff_results():
+    old = [PoolEntry("a", "1", 10), PoolEntry("b", "2", 20), PoolEntry("c", "3", 30), PoolEntry("e", "5", 50)]
+    new = [PoolEntry("b", "2", 20), PoolEntry("c", "4", 35), PoolEntry("d", "6", 60), PoolEntry("e", "5", 50)]
+    changes = list(diff_results(iter(old), iter(new)))
+    assert changes == [
+        ResultChange(REMOVED, "a", 10, 0),
+        ResultChange(MODIFIED, "c", 30, 35),
+        ResultChange(ADDED, "d", 0, 60),
+    ]
+    assert [change.size_delta for change in changes] == [-10, 5, 60]
+
+
+def test_diff_same_size_different_md5():
+    changes = list(diff_results(iter([PoolEntry("a", "1", 10)]), iter([PoolEntry("a", "2", 10)])))
+    assert changes == [ResultChange(MODIFIED, "a", 10, 10)]
+
+
+def test_diff_ignores_blob_hashes():
+    old = [PoolEntry("a", "1", 10, "")]
+    new = [PoolEntry("a", "1", 10, "sha")]
+    assert list(diff_results(iter(old), iter(new))) == []
+
+
+def test_diff_empty():
+    assert list(diff_results(iter([]), iter([]))) == []
+    assert list(diff_results(iter([]), iter([PoolEntry("a", "1", 1)]))) == [ResultChange(ADDED, "a", 0, 1)]
+    assert list(diff_results(iter([PoolEntry("a", "1", 1)]), iter([]))) == [ResultChange(REMOVED, "a", 1, 0)]
+
+
+@pytest.mark.parametrize("worktree", [True, False])
+def test_diff_of_results(repo, make_query, add_version, capsys, worktree):
+    make_query("day")
+    add_version("v3", "a/5", "b/6")
+    repo.checkout("day", "v2", download_files=False, worktree=worktree)
+    repo.git_repo.heads.master.checkout()
+    repo.checkout("day", "v3", download_files=False, worktree=worktree)
+    result = list(read_result(repo, "query/day/v3"))
+    assert [entry.path for entry in result] == [f"images/a/{i}.jpg.dvc" for i in (1, 2, 4, 5)]
+    assert all(entry.md5 and entry.size == 3 and entry.sha for entry in result)
+    assert list(repo.diff("day", "v2", "v3")) == [ResultChange(ADDED, "images/a/5.jpg.dvc", 0, 3)]
+    assert main(["diff", "day", "v2", "v3", "--stat"]) == 0
+    assert "1 added, 0 removed, 0 modified, +3 bytes from v2 to v3" in capsys.readouterr().out
+    with pytest.raises(Exception, match="was not found"):
+        list(repo.diff("day", "v2", "v4"))
+
+
+def test_read_result_without_manifest(repo, make_query):
+    make_query("day")
+    repo.checkout("day", "v2", download_files=False, worktree=False)
+    manifest = list(read_result(repo, "query/day/v2"))
+    repo.git_repo.git.checkout("query/day/v2")
+    repo.git_repo.git.rm(repo.result_manifest_path)
+    repo.git_repo.git.commit("--amend", "--no-edit")
+    assert list(read_result(repo, "query/day/v2")) == manifest
@@ -0,0 +1,52 @@
+import threading
+
+import pytest
+
+from qdvc.repo.download import Downloader
+
+
+class _DvcRepo:
+    """
+    Records the targets checked out, from the download thread.
+    """
+
+    def __init__(self, remote=None, fail=False):
+        self.config = {"core": {"remote": remote} if remote else {}}
+        self.fail = fail
+        self.fetched = []
+        self.checked_out = []
+        self.threads = set()
+
+    def fetch(self, targets, jobs):
+        self.fetched.append((list(targets), jobs))
+
+    def checkout(self, targets):
+        self.threads.add(threading.current_thread().name)
+        if self.fail:
+            raise Exception("checkout failed")
+        self.checked_out.append(list(targets))
+
+
+def test_downloader_batches():
+    dvc_repo = _DvcRepo()
+    with Downloader(dvc_repo, batch_size=2) as downloader:
+        for i in range(5):
+            downloader.put(f"{i}.dvc")
+    assert dvc_repo.checked_out == [["0.dvc", "1.dvc"], ["2.dvc", "3.dvc"], ["4.dvc"]]
+    assert dvc_repo.threads == {"qdvc-download"}
+    assert dvc_repo.fetched == []
+
+
+def test_downloader_fetches_from_remote():
+    dvc_repo = _DvcRepo(remote="storage")
+    with Downloader(dvc_repo, jobs=4, batch_size=2) as downloader:
+        for i in range(3):
+            downloader.put(f"{i}.dvc")
+    assert dvc_repo.fetched == [(["0.dvc", "1.dvc"], 4), (["2.dvc"], 4)]
+
+
+def test_downloader_raises_errors():
+    with pytest.raises(Exception, match="checkout failed"):
+        with Downloader(_DvcRepo(fail=True), batch_size=1, max_pending=1) as downloader:
+            for i in range(10):
+                downloader.put(f"{i}.dvc")
@@ -0,0 +1,174 @@
+import os
+import sys
+
+import pytest
+
+from qdvc.repo.filtering import (
+    dir_selector,
+    evaluate_many,
+    iter_decisions,
+    iter_filtered,
+    load_query_class,
+    prune_paths,
+)
+
+PATHS = [os.path.join("pool", ".data", f"{i}.jpg") for i in range(50)]
+
+# Keeps the even images, and records the process that evaluated each of them
+EVEN_PY = """
+import os
+
+
+class Query:
+    FORK_SAFE = {fork_safe}
+
+    def filter(self, filepath):
+        with open(os.path.join({log_dir!r}, os.path.basename(filepath)), "w") as f:
+            f.write(str(os.getpid()))
+        return int(os.path.basename(filepath).split(".")[0]) % 2 == 0
+"""
+
+
+def _write_filter(tmp_path, text: str) -> str:
+    filter_path = tmp_path / "filter.py"
+    filter_path.write_text(text, encoding="utf-8")
+    return str(filter_path)
+
+
+def _even_filter(tmp_path, fork_safe: bool = True) -> str:
+    log_dir = tmp_path / "log"
+    log_dir.mkdir()
+    return _write_filter(tmp_path, EVEN_PY.format(fork_safe=fork_safe, log_dir=str(log_dir)))
+
+
+def _evaluating_pids(tmp_path):
+    return {(tmp_path / "log" / name).read_text() for name in os.listdir(tmp_path / "log")}
+
+
+@pytest.mark.parametrize("jobs", [None, 1, 2])
+def test_iter_filtered_keeps_order(tmp_path, jobs):
+    filter_path = _even_filter(tmp_path)
+    accepted = list(iter_filtered(filter_path, PATHS, jobs=jobs, chunk_size=7))
+    assert accepted == PATHS[::2]
+
+
+def test_iter_filtered_in_worker_processes(tmp_path):
+    filter_path = _even_filter(tmp_path)
+    list(iter_filtered(filter_path, PATHS, jobs=2, chunk_size=7))
+    assert str(os.getpid()) not in _evaluating_pids(tmp_path)
+
+
+def test_iter_filtered_not_fork_safe(tmp_path):
+    filter_path = _even_filter(tmp_path, fork_safe=False)
+    assert list(iter_filtered(filter_path, PATHS, jobs=2, chunk_size=7)) == PATHS[::2]
+    assert _evaluating_pids(tmp_path) == {str(os.getpid())}
+
+
+# Records the sizes of the batches it is given, and keeps the even images
+BATCH_PY = """
+import os
+import uuid
+
+
+class Query:
+    def filter(self, filepath):
+        raise AssertionError("filter_batch is preferred")
+
+    def filter_batch(self, filepaths):
+        with open(os.path.join({log_dir!r}, uuid.uuid4().hex), "w") as f:
+            f.write(str(len(filepaths)))
+        return [int(os.path.basename(filepath).split(".")[0]) % 2 == 0 for filepath in filepaths]{extra}
+"""
+
+
+@pytest.mark.parametrize("jobs", [None, 2])
+def test_iter_filtered_in_batches(tmp_path, jobs):
+    log_dir = tmp_path / "log"
+    log_dir.mkdir()
+    filter_path = _write_filter(tmp_path, BATCH_PY.format(log_dir=str(log_dir), extra=""))
+    assert list(iter_filtered(filter_path, PATHS, jobs=jobs, chunk_size=20)) == PATHS[::2]
+    assert sorted(int(path.read_text()) for path in log_dir.iterdir()) == [10, 20, 20]
+
+
+def test_filter_batch_with_wrong_length(tmp_path):
+    log_dir = tmp_path / "log"
+    log_dir.mkdir()
+    filter_path = _write_filter(tmp_path, BATCH_PY.format(log_dir=str(log_dir), extra="[:-1]"))
+    with pytest.raises(Exception, match="returned 19 results for 20 paths"):
+        list(iter_filtered(filter_path, PATHS, chunk_size=20))
+
+
+def test_load_query_class_in_own_module(tmp_path):
+    first = load_query_class(_even_filter(tmp_path))
+    second = load_query_class(str(tmp_path / "filter.py"))
+    assert first is not second
+    assert first.__module__ != second.__module__
+    assert sys.modules[first.__module__].__file__ == str(tmp_path / "filter.py")
+
+
+class _Odd:
+    def filter(self, filepath):
+        return not _Even().filter(filepath)
+
+
+class _Even:
+    def filter(self, filepath):
+        return int(os.path.basename(filepath).split(".")[0]) % 2 == 0
+
+
+class _Unused:
+    def filter_batch(self, filepaths):
+        raise AssertionError("not called without paths")
+
+
+def test_evaluate_many():
+    assert evaluate_many([_Even(), _Odd(), _Unused()], [PATHS[:3], PATHS[1:3], []]) == [
+        [True, False, True],
+        [True, False],
+        [],
+    ]
+
+
+@pytest.mark.parametrize("jobs", [None, 2])
+def test_iter_decisions(tmp_path, jobs):
+    filter_path = _even_filter(tmp_path)
+    chunks = list(iter_decisions([filter_path, filter_path], PATHS, jobs=jobs, chunk_size=20))
+    assert [chunk for chunk, _ in chunks] == [PATHS[:20], PATHS[20:40], PATHS[40:]]
+    for chunk, (even, again) in chunks:
+        assert even == again == [int(os.path.basename(path).split(".")[0]) % 2 == 0 for path in chunk]
+
+
+def test_iter_decisions_with_selectors(tmp_path):
+    filter_path = _even_filter(tmp_path)
+    selectors = [None, lambda path: int(os.path.basename(path).split(".")[0]) < 10]
+    chunks = list(iter_decisions([filter_path, filter_path], PATHS, chunk_size=20, selectors=selectors))
+    for chunk, (even, small_even) in chunks:
+        assert small_even == [
+            keep and int(os.path.basename(path).split(".")[0]) < 10 for path, keep in zip(chunk, even)
+        ]
+
+
+def test_prune_paths():
+    root = os.path.join("pool", ".data")
+    paths = [
+        os.path.join(root, "a", "1.dvc"),
+        os.path.join(root, "a", "skip", "2.dvc"),
+        os.path.join(root, "a", "skip", "deep", "3.dvc"),
+        os.path.join(root, "b", "4.dvc"),
+        os.path.join(root, "5.dvc"),
+    ]
+    calls = []
+
+    def filter_dir(dirpath):
+        calls.append(dirpath)
+        return os.path.basename(dirpath) != "skip"
+
+    assert list(prune_paths(paths, root, filter_dir)) == [paths[0], paths[3], paths[4]]
+    # Each directory is decided once, and never below a rejected one
+    assert sorted(calls) == sorted([os.path.join(root, "a"), os.path.join(root, "a", "skip"), os.path.join(root, "b")])
+
+
+def test_dir_selector_ignores_paths_outside_root():
+    selected = dir_selector(os.path.join("pool", ".data"), lambda dirpath: False)
+    assert selected(os.path.join("elsewhere", "a", "1.dvc"))
+    assert not selected(os.path.join("pool", ".data", "a", "1.dvc"))
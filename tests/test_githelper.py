@@ -0,0 +1,114 @@
+import os
+
+import pytest
+from git.repo import Repo as GitRepo
+
+from qdvc.repo.githelper import (
+    add_paths,
+    blob_sha,
+    blob_shas,
+    checkout_entries,
+    commit_tree,
+    diff_name_status,
+    disable_sparse_checkout,
+    exclude,
+    ls_tree,
+    read_blob,
+    sparse_checkout,
+    walk_tree,
+    write_blob,
+)
+
+
+def test_diff_name_status(repo):
+    assert diff_name_status(repo.git_repo, "v1", "v2", repo.QDVC_DATA_DIR) == [("A", ".data/images/a/4.jpg.dvc")]
+    assert diff_name_status(repo.git_repo, "v2", "v1", repo.QDVC_DATA_DIR) == [("D", ".data/images/a/4.jpg.dvc")]
+    assert diff_name_status(repo.git_repo, "v1", "v1") == []
+
+
+def test_walk_tree(repo):
+    visited = []
+
+    def filter_dir(path):
+        visited.append(path)
+        return not path.endswith("/b")
+
+    entries = list(walk_tree(repo.git_repo, "v2", repo.QDVC_DATA_DIR, filter_dir))
+    assert entries == [entry for entry in ls_tree(repo.git_repo, "v2", repo.QDVC_DATA_DIR) if "/b/" not in entry.path]
+    assert sorted(visited) == [".data/images", ".data/images/a", ".data/images/b"]
+    assert list(walk_tree(repo.git_repo, "v2", "missing", filter_dir)) == []
+
+
+def test_exclude(tmp_path):
+    git_repo = GitRepo.init(str(tmp_path))
+    exclude_path = tmp_path / ".git" / "info" / "exclude"
+    exclude_path.write_text("# patterns\n/listed", encoding="utf-8")
+    (tmp_path / "cache").mkdir()
+    paths = [str(tmp_path / "cache"), str(tmp_path / "state.db"), str(tmp_path / "listed"), str(tmp_path.parent)]
+    exclude(git_repo, str(tmp_path), paths)
+    exclude(git_repo, str(tmp_path), paths)
+    assert exclude_path.read_text(encoding="utf-8") == "# patterns\n/listed\n/cache/\n/state.db\n"
+
+
+def test_commit_tree(repo):
+    status = repo.git_repo.git.status("--porcelain")
+    entries = [entry._replace(path="copy/" + entry.path) for entry in ls_tree(repo.git_repo, "v1", repo.QDVC_DATA_DIR)]
+    commit = commit_tree(repo.git_repo, "v2", entries, "copy", ["v2"])
+    files = repo.git_repo.git.ls_tree("-r", "--name-only", commit).splitlines()
+    assert [path for path in files if path.startswith("copy/")] == [entry.path for entry in entries]
+    assert set(repo.git_repo.git.ls_tree("-r", "--name-only", "v2").splitlines()) < set(files)
+    assert repo.git_repo.commit(commit).parents == (repo.git_repo.commit("v2"),)
+    assert repo.git_repo.git.status("--porcelain") == status
+
+
+def test_write_blob(repo):
+    sha = write_blob(repo.git_repo, b"result")
+    assert sha == blob_sha(b"result")
+    assert read_blob(repo.git_repo, sha) == b"result"
+
+
+def test_blob_shas(repo):
+    entries = ls_tree(repo.git_repo, "v2", repo.QDVC_DATA_DIR)
+    assert blob_shas(repo.git_repo, "v2", [entry.path for entry in entries]) == [entry.sha for entry in entries]
+    assert blob_shas(repo.git_repo, "v2", []) == []
+    with pytest.raises(Exception, match="was not found in v1"):
+        blob_shas(repo.git_repo, "v1", [".data/images/a/4.jpg.dvc"])
+
+
+def test_checkout_entries(repo, tmp_path_factory):
+    root_dir = str(tmp_path_factory.mktemp("copy"))
+    status = repo.git_repo.git.status("--porcelain")
+    entries = ls_tree(repo.git_repo, "v1", repo.QDVC_DATA_DIR)
+    checkout_entries(repo.git_repo, entries, root_dir)
+    checkout_entries(repo.git_repo, [], root_dir)
+    for entry in entries:
+        with open(os.path.join(root_dir, *entry.path.split("/")), encoding="utf-8") as f:
+            with open(os.path.join(repo.root_dir, *entry.path.split("/")), encoding="utf-8") as g:
+                assert f.read() == g.read()
+    assert repo.git_repo.git.status("--porcelain") == status
+
+
+def test_add_paths(repo):
+    paths = [os.path.join(repo.root_dir, "new", f"{i}.txt") for i in range(5)]
+    os.makedirs(os.path.dirname(paths[0]))
+    for path in paths:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(path)
+    add_paths(repo.git_repo, iter(paths), 2)
+    staged = repo.git_repo.git.diff("--cached", "--name-only").splitlines()
+    assert staged == [f"new/{i}.txt" for i in range(5)]
+
+
+def test_sparse_checkout(repo):
+    git_repo = repo.git_repo
+    sparse_checkout(git_repo, [repo.QDVC_DIR])
+    git_repo.git.read_tree("-mu", "HEAD")
+    assert not os.path.exists(repo.data_qdvc_dir)
+    assert os.path.exists(os.path.join(repo.qdvc_dir, repo.POOL_MANIFEST_FILE_NAME))
+    # Left off, as the dulwich used by DVC refuses repos with it
+    assert "extensions.worktreeconfig" not in git_repo.git.config("--list", "--local").lower()
+    disable_sparse_checkout(git_repo)
+    assert os.path.exists(os.path.join(repo.data_qdvc_dir, "images", "a", "1.jpg.dvc"))
+    assert "sparsecheckout" not in git_repo.git.config("--list", "--local").lower()
+    assert not os.path.exists(os.path.join(repo.git_dir, "info", "sparse-checkout"))
+    disable_sparse_checkout(git_repo)
@@ -0,0 +1,27 @@
+import os
+
+from qdvc.repo.pool import read_manifest
+
+
+def test_manifest_updated_by_add(repo):
+    entries = list(read_manifest(repo.pool_manifest_path))
+    assert [entry.path for entry in entries] == [
+        "images/a/1.jpg.dvc",
+        "images/a/2.jpg.dvc",
+        "images/a/4.jpg.dvc",
+        "images/b/3.jpg.dvc",
+    ]
+    assert "" not in {entry.sha for entry in entries}
+
+
+def test_rebuild_index(repo):
+    expected = list(read_manifest(repo.pool_manifest_path))
+    os.remove(repo.pool_manifest_path)
+    repo.rebuild_index("v2")
+    assert list(read_manifest(repo.pool_manifest_path)) == expected
+    repo.rebuild_index("v1")
+    assert [entry.path for entry in read_manifest(repo.pool_manifest_path)] == [
+        "images/a/1.jpg.dvc",
+        "images/a/2.jpg.dvc",
+        "images/b/3.jpg.dvc",
+    ]
@@ -0,0 +1,39 @@
+import os
+
+from conftest import FILTER_PY
+
+from qdvc.cli.main import main
+from qdvc.repo.membership import MEMBERSHIP_DIR_NAME, QueryResult
+
+
+def test_ls_queries(repo, make_query):
+    make_query("day")
+    make_query("night", FILTER_PY.replace('== "a"', '== "b"'))
+    for query, version in [("day", "v1"), ("day", "v2"), ("night", "v2")]:
+        repo.checkout(query, version, download_files=False, worktree=False)
+    repo.checkout("day", "v2", download_files=False, worktree=False, sample=1)
+    # Samples are not indexed
+    assert repo.ls_queries() == [
+        QueryResult("day", "v1", 2),
+        QueryResult("day", "v2", 3),
+        QueryResult("night", "v2", 1),
+    ]
+    assert repo.ls_queries(versions=["v2"]) == [QueryResult("day", "v2", 3), QueryResult("night", "v2", 1)]
+    assert repo.ls_queries(contains=os.path.join("images", "a", "4.jpg")) == [QueryResult("day", "v2", 3)]
+    assert repo.ls_queries(contains=".data/images/b/3.jpg.dvc") == [QueryResult("night", "v2", 1)]
+    assert repo.ls_queries(contains="images/c/5.jpg") == []
+
+
+def test_ls_queries_syncs_branches(repo, make_query):
+    make_query("day")
+    repo.checkout("day", "v1", download_files=False, worktree=False)
+    assert repo.ls_queries() == [QueryResult("day", "v1", 2)]
+    repo.git_repo.delete_head("query/day/v1", force=True)
+    repo.checkout("day", "v2", download_files=False, worktree=False)
+    assert repo.ls_queries() == [QueryResult("day", "v2", 3)]
+    index_dir = os.path.join(repo.config["cache"]["dir"], MEMBERSHIP_DIR_NAME)
+    assert sorted(os.listdir(index_dir)) == sorted([repo.git_repo.commit("v2").hexsha, "results.json"])
+    repo.clear_cache()
+    assert not os.path.exists(index_dir)
+    assert main(["ls-queries", "--count"]) == 0
+    assert os.path.exists(index_dir)
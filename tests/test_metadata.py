@@ -0,0 +1,82 @@
+import os
+
+import pytest
+from conftest import write
+
+from qdvc.repo.metadata import (
+    MetadataEntry,
+    MetadataStore,
+    append_pending_metadata,
+    changed_metadata,
+    extract,
+    merge_pending_metadata,
+    metadata_digests,
+    read_metadata,
+    resolve_extractor,
+    update_metadata,
+)
+
+
+def test_update_metadata(tmp_path):
+    metadata_path = str(tmp_path / "metadata.tsv")
+    update_metadata(metadata_path, [("b.dvc", {"size": 1}), ("a.dvc", {"size": 2, "mtime": 3})])
+    update_metadata(metadata_path, [("b.dvc", {"size": 4})])
+    assert list(read_metadata(metadata_path)) == [
+        MetadataEntry("a.dvc", '{"mtime": 3, "size": 2}'),
+        MetadataEntry("b.dvc", '{"size": 4}'),
+    ]
+
+
+def test_pending_metadata(tmp_path):
+    metadata_path = str(tmp_path / "metadata.tsv")
+    append_pending_metadata(metadata_path, [("b.dvc", {"size": 1}), ("a.dvc", {"size": 2})])
+    append_pending_metadata(metadata_path, [("b.dvc", {"size": 3})])
+    assert not os.path.exists(metadata_path)
+    assert merge_pending_metadata(metadata_path)
+    assert [tuple(entry) for entry in read_metadata(metadata_path)] == [
+        ("a.dvc", '{"size": 2}'),
+        ("b.dvc", '{"size": 3}'),
+    ]
+    assert not merge_pending_metadata(metadata_path)
+
+
+def test_changed_metadata():
+    old = [MetadataEntry("a", "1"), MetadataEntry("b", "2"), MetadataEntry("c", "3")]
+    new = [MetadataEntry("b", "2"), MetadataEntry("c", "4"), MetadataEntry("d", "5")]
+    assert list(changed_metadata(iter(old), iter(new))) == ["a", "c", "d"]
+
+
+def test_metadata_digests():
+    digests = metadata_digests([MetadataEntry("a", "1"), MetadataEntry("b", "1"), MetadataEntry("c", "2")])
+    assert digests["a"] == digests["b"] != digests["c"]
+
+
+def _failing(path):
+    raise ValueError(path)
+
+
+def test_extract_skips_failing_extractors(tmp_path):
+    path = tmp_path / "1.jpg"
+    path.write_text("1")
+    assert extract([_failing, resolve_extractor("size")], str(path)) == {"size": 1}
+    assert resolve_extractor("os.path:getsize") is os.path.getsize
+    with pytest.raises(Exception, match="Unknown metadata extractor"):
+        resolve_extractor("unknown")
+
+
+def test_add_with_extractor(repo):
+    write(os.path.join(repo.root_dir, "images", "c", "7.jpg"), "seven")
+    repo.add([os.path.join(repo.root_dir, "images", "c")], recursive=True, fname=None, extractors=["size"])
+    store = MetadataStore(repo.root_dir)
+    assert store.get(os.path.join(repo.data_qdvc_dir, "images", "c", "7.jpg.dvc")) == {"size": 5}
+    assert store.get("images/a/1.jpg.dvc") == {}
+    assert not os.path.exists(repo.metadata_path + ".pending")
+    assert not repo.git_repo.git.diff(repo.metadata_path)
+
+
+def test_add_backfills_metadata(repo):
+    images_dir = os.path.join(repo.root_dir, "images", "a")
+    # Up to date in the pool, but added without extractors
+    assert repo.add([images_dir], recursive=True, fname=None, extractors=["size"]) == []
+    store = MetadataStore(repo.root_dir)
+    assert [store.get(f"images/a/{name}.jpg.dvc") for name in (1, 2, 4)] == [{"size": 3}] * 3
@@ -0,0 +1,155 @@
+import os
+
+import pytest
+
+from qdvc.repo.githelper import blob_sha
+from qdvc.repo.pool import (
+    PoolEntry,
+    PoolRecord,
+    append_pending_manifest,
+    entry_from_dvc,
+    merge_pending_manifest,
+    merge_sorted,
+    parse_dvc,
+    parse_manifest,
+    read_manifest,
+    read_md5,
+    read_record,
+    update_manifest,
+)
+from qdvc.repo.snapshot import PoolSnapshot
+
+FILE_DVC = """outs:
+- md5: 1b656a7a9b7b456cceb83f59e3348e84
+  size: 6
+  path: 1.jpg
+"""
+
+DIR_DVC = """# comment
+outs:
+- md5: 'a304afb96060aad90176268345e10355.dir'
+  size: 1024
+  nfiles: 3
+  path: images
+  meta:
+    size: 5
+- md5: ffffffffffffffffffffffffffffffff
+  size: 1
+  path: other
+"""
+
+
+def test_parse_dvc_file():
+    assert parse_dvc(FILE_DVC) == {"md5": "1b656a7a9b7b456cceb83f59e3348e84", "size": "6", "path": "1.jpg"}
+
+
+def test_parse_dvc_first_output_only():
+    fields = parse_dvc(DIR_DVC)
+    # The nested fields of the output and the fields of the next outputs are left out
+    assert (fields["md5"], fields["size"], fields["nfiles"], fields["path"]) == (
+        "a304afb96060aad90176268345e10355.dir",
+        "1024",
+        "3",
+        "images",
+    )
+
+
+def test_parse_dvc_without_outputs():
+    assert parse_dvc("deps:\n- path: a\n") == {}
+    assert parse_dvc("") == {}
+
+
+def test_read_md5(tmp_path):
+    path = tmp_path / "1.jpg.dvc"
+    path.write_text(FILE_DVC, encoding="utf-8")
+    assert read_md5(str(path)) == "1b656a7a9b7b456cceb83f59e3348e84"
+    path.write_text("outs:\n- path: 1.jpg\n", encoding="utf-8")
+    assert read_md5(str(path)) is None
+
+
+def test_entry_from_dvc():
+    assert entry_from_dvc("a/1.jpg.dvc", FILE_DVC, "abc") == PoolEntry(
+        "a/1.jpg.dvc", "1b656a7a9b7b456cceb83f59e3348e84", 6, "abc"
+    )
+
+
+def test_record_original_path():
+    path = os.path.join("repo", ".data", "images", "1.jpg.dvc")
+    record = PoolRecord.from_dvc(path, FILE_DVC)
+    assert record.original_path == os.path.join("repo", "images", "1.jpg")
+    assert (record.md5, record.size, record.nfiles) == ("1b656a7a9b7b456cceb83f59e3348e84", 6, None)
+    assert PoolRecord.from_dvc(path, DIR_DVC).nfiles == 3
+
+
+def test_read_record_of_snapshot(tmp_path):
+    # The repo itself is under a `.data` directory
+    repo_dir = str(tmp_path / ".data" / "repo")
+    snapshot = PoolSnapshot(str(tmp_path / "copy"), repo_dir, str(tmp_path / "cache"))
+    path = os.path.join(repo_dir, ".data", "images", "1.jpg.dvc")
+    os.makedirs(os.path.dirname(snapshot.copy_path(path)))
+    with open(snapshot.copy_path(path), "w", encoding="utf-8") as f:
+        f.write(FILE_DVC)
+    with snapshot.active():
+        record = read_record(path)
+    assert record.path == path
+    assert record.original_path == os.path.join(repo_dir, "images", "1.jpg")
+    assert record.md5 == "1b656a7a9b7b456cceb83f59e3348e84"
+
+
+def test_blob_sha_matches_git():
+    assert blob_sha(b"") == "e69de29bb2d1d6434b8b29ae775ad8c2e48c5391"
+    assert blob_sha(b"hello\n") == "ce013625030ba8dba906f756967f9e9ca394464a"
+
+
+class _Entry:
+    def __init__(self, path, value):
+        self.path = path
+        self.value = value
+
+
+@pytest.mark.parametrize(
+    "old, new, expected",
+    [
+        ([], [], []),
+        (["a", "c"], [], ["a", "c"]),
+        ([], ["b"], ["b"]),
+        (["a", "c", "e"], ["b", "c", "f"], ["a", "b", "c", "e", "f"]),
+    ],
+)
+def test_merge_sorted(old, new, expected):
+    merged = list(merge_sorted(iter([_Entry(p, "old") for p in old]), iter([_Entry(p, "new") for p in new])))
+    assert [entry.path for entry in merged] == expected
+    # New entries replace the old ones with the same path
+    assert all(entry.value == "new" for entry in merged if entry.path in new)
+
+
+def test_parse_manifest_with_and_without_blob_hashes():
+    entries = list(parse_manifest(["a.dvc\tmd5a\t1\tsha\n", "b.dvc\tmd5b\t2\n"]))
+    assert entries == [PoolEntry("a.dvc", "md5a", 1, "sha"), PoolEntry("b.dvc", "md5b", 2, "")]
+
+
+def test_update_manifest(tmp_path):
+    manifest_path = str(tmp_path / "pool.manifest")
+    update_manifest(manifest_path, [PoolEntry("b.dvc", "1", 1, "s1"), PoolEntry("a.dvc", "2", 2, "s2")])
+    update_manifest(manifest_path, [PoolEntry("b.dvc", "3", 3, "s3"), PoolEntry("c.dvc", "4", 4, "s4")])
+    assert [tuple(entry) for entry in read_manifest(manifest_path)] == [
+        ("a.dvc", "2", 2, "s2"),
+        ("b.dvc", "3", 3, "s3"),
+        ("c.dvc", "4", 4, "s4"),
+    ]
+
+
+def test_pending_manifest(tmp_path):
+    manifest_path = str(tmp_path / "pool.manifest")
+    update_manifest(manifest_path, [PoolEntry("a.dvc", "1", 1, "s1")])
+    append_pending_manifest(manifest_path, [PoolEntry("c.dvc", "2", 2, "s2"), PoolEntry("a.dvc", "3", 3, "s3")])
+    append_pending_manifest(manifest_path, [PoolEntry("b.dvc", "4", 4, "s4"), PoolEntry("c.dvc", "5", 5, "s5")])
+    # Only merged on demand
+    assert [entry.path for entry in read_manifest(manifest_path)] == ["a.dvc"]
+    assert merge_pending_manifest(manifest_path)
+    assert [tuple(entry) for entry in read_manifest(manifest_path)] == [
+        ("a.dvc", "3", 3, "s3"),
+        ("b.dvc", "4", 4, "s4"),
+        ("c.dvc", "5", 5, "s5"),
+    ]
+    assert not merge_pending_manifest(manifest_path)
@@ -0,0 +1,83 @@
+import os
+
+import pytest
+
+from qdvc.repo.sampling import Sampler, Shard, parse_shard
+
+PATHS = [f".data/images/{i}.jpg.dvc" for i in range(1000)]
+
+
+def test_fraction_is_deterministic_and_order_independent():
+    sampler = Sampler(".data", fraction=0.1, seed=3)
+    sample = list(sampler.sample(PATHS))
+    assert 50 < len(sample) < 150
+    assert sorted(sampler.sample(reversed(PATHS))) == sorted(sample)
+    assert list(Sampler(".data", fraction=0.1, seed=3).sample(PATHS)) == sample
+
+
+def test_seed_changes_the_sample():
+    assert list(Sampler(".data", size=10, seed=0).sample(PATHS)) != list(
+        Sampler(".data", size=10, seed=1).sample(PATHS)
+    )
+
+
+def test_size_keeps_the_smallest_hashes():
+    sampler = Sampler(".data", size=10)
+    sample = list(sampler.sample(PATHS))
+    assert sample == sorted(sorted(PATHS, key=sampler.key)[:10])
+    assert list(Sampler(".data", size=0).sample(PATHS)) == []
+    assert len(list(Sampler(".data", size=5000).sample(PATHS))) == len(PATHS)
+
+
+def test_size_and_fraction_combined():
+    sample = list(Sampler(".data", size=10, fraction=0.5).sample(PATHS))
+    assert len(sample) == 10
+    assert set(sample) <= set(Sampler(".data", fraction=0.5).sample(PATHS))
+
+
+def test_sample_only_depends_on_pool_relative_paths():
+    pool_dir = os.path.join("some", "root", ".data")
+    moved = [os.path.join("some", "root", path) for path in PATHS]
+    sample = list(Sampler(".data", size=20).sample(PATHS))
+    assert [
+        path[len(os.path.join("some", "root", "")) :] for path in Sampler(pool_dir, size=20).sample(moved)
+    ] == sample
+
+
+def test_suffix():
+    assert Sampler(".data", size=1000).suffix == "+sample-1000-seed-0"
+    assert Sampler(".data", fraction=0.25, seed=2).suffix == "+fraction-0.25-seed-2"
+
+
+@pytest.mark.parametrize("kwargs", [{}, {"size": -1}, {"fraction": 1.5}, {"fraction": -0.1}])
+def test_invalid_sampler(kwargs):
+    with pytest.raises(Exception):
+        Sampler(".data", **kwargs)
+
+
+def test_shards_are_disjoint_and_cover():
+    count = 4
+    owners = [[path for path in PATHS if Shard("", index, count).owns(path)] for index in range(count)]
+    assert sorted(path for owned in owners for path in owned) == sorted(PATHS)
+    assert all(owned for owned in owners)
+
+
+def test_shard_only_depends_on_relative_paths():
+    root_dir = os.path.join("node", "repo")
+    assert [Shard(root_dir, 1, 3).owns(os.path.join(root_dir, path)) for path in PATHS] == [
+        Shard("worktree", 1, 3).owns(os.path.join("worktree", path)) for path in PATHS
+    ]
+
+
+@pytest.mark.parametrize("index, count", [(0, 0), (-1, 2), (2, 2)])
+def test_invalid_shard(index, count):
+    with pytest.raises(Exception):
+        Shard("", index, count)
+
+
+def test_parse_shard():
+    assert parse_shard("0/16") == (0, 16)
+    assert parse_shard("15/16") == (15, 16)
+    for value in ("1", "a/2", "1/b", ""):
+        with pytest.raises(Exception, match="i/n"):
+            parse_shard(value)
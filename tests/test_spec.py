@@ -0,0 +1,116 @@
+import os
+import re
+
+import pytest
+
+from qdvc.repo.metadata import update_metadata
+from qdvc.repo.spec import SpecQuery, glob_to_regex
+
+
+def _matches(pattern, path):
+    return re.match(glob_to_regex(pattern), path) is not None
+
+
+@pytest.mark.parametrize(
+    "pattern, path, expected",
+    [
+        ("*.jpg", "a.jpg", True),
+        ("*.jpg", "dir/a.jpg", False),
+        ("images/*.jpg", "images/a.jpg", True),
+        ("images/*.jpg", "images/sub/a.jpg", False),
+        ("images/**/*.jpg", "images/a.jpg", True),
+        ("images/**/*.jpg", "images/x/y/a.jpg", True),
+        ("images/**", "images/x/y/a.png", True),
+        ("**/tmp/**", "a/tmp/b.jpg", True),
+        ("**/tmp/**", "tmp/b.jpg", True),
+        ("**/tmp/**", "a/tmpx/b.jpg", False),
+        ("img?.jpg", "img1.jpg", True),
+        ("img?.jpg", "img/.jpg", False),
+        ("img[0-2].jpg", "img1.jpg", True),
+        ("img[!0-2].jpg", "img1.jpg", False),
+        ("img[!0-2].jpg", "img5.jpg", True),
+        ("a+b(1).jpg", "a+b(1).jpg", True),
+        ("*.jpg", "a.jpg.bak", False),
+    ],
+)
+def test_glob_to_regex(pattern, path, expected):
+    assert _matches(pattern, path) is expected
+
+
+def _spec_query(tmp_path, text):
+    spec_path = tmp_path / "filter.yaml"
+    spec_path.write_text(text, encoding="utf-8")
+    return SpecQuery(str(spec_path))
+
+
+def test_spec_query_paths(tmp_path):
+    query = _spec_query(tmp_path, 'include: "images/**/*.jpg"\nexclude: ["**/tmp/**"]\nexclude_regex: "night"\n')
+    pool = os.path.join(str(tmp_path), "pool", ".data")
+    paths = [
+        os.path.join(pool, "images", "a", "1.jpg.dvc"),
+        os.path.join(pool, "images", "tmp", "2.jpg.dvc"),
+        os.path.join(pool, "images", "night", "3.jpg.dvc"),
+        os.path.join(pool, "images", "4.png.dvc"),
+        os.path.join(pool, "other", "5.jpg.dvc"),
+    ]
+    assert query.filter_batch(paths) == [True, False, False, False, False]
+    assert query.filter(paths[0]) is True
+
+
+def test_spec_query_filter_dir(tmp_path):
+    query = _spec_query(tmp_path, 'include: ["images/cam1/*.jpg", "videos/**"]\n')
+    pool = os.path.join(str(tmp_path), ".data")
+    assert query.filter_dir(os.path.join(pool, "images"))
+    assert query.filter_dir(os.path.join(pool, "images", "cam1"))
+    assert not query.filter_dir(os.path.join(pool, "images", "cam2"))
+    assert query.filter_dir(os.path.join(pool, "videos", "2022", "01"))
+    assert not query.filter_dir(os.path.join(pool, "audio"))
+
+
+def test_spec_query_without_include_keeps_all_dirs(tmp_path):
+    query = _spec_query(tmp_path, 'regex: "cam[0-9]"\n')
+    assert query.filter_dir(os.path.join(str(tmp_path), ".data", "anything"))
+
+
+def test_spec_query_unknown_operator(repo, tmp_path):
+    pytest.importorskip("numpy")
+    update_metadata(repo.metadata_path, [("images/a/1.jpg.dvc", {"width": 2048})])
+    with pytest.raises(Exception, match="Unknown operator '=~'"):
+        _spec_query(tmp_path, 'metadata:\n  width: {"=~": 1}\n')
+
+
+def test_spec_query_metadata(repo, tmp_path):
+    pytest.importorskip("numpy")
+    update_metadata(
+        repo.metadata_path,
+        [
+            ("images/a/1.jpg.dvc", {"width": 2048, "camera": "front"}),
+            ("images/a/2.jpg.dvc", {"width": 512, "camera": "front"}),
+            ("images/b/3.jpg.dvc", {"width": 1024, "camera": "side"}),
+        ],
+    )
+    query = _spec_query(tmp_path, 'metadata:\n  width: {">=": 1024}\n  camera: {in: [front, rear]}\n')
+    paths = [
+        os.path.join(repo.data_qdvc_dir, *name.split("/")) for name in ("images/a/1.jpg.dvc", "images/a/2.jpg.dvc")
+    ]
+    paths += [os.path.join(repo.data_qdvc_dir, "images", "b", "3.jpg.dvc"), "images/c/4.jpg.dvc"]
+    # Files without metadata are rejected
+    assert query.filter_batch(paths) == [True, False, False, False]
+    assert query.filter_batch([]) == []
+
+
+def test_checkout_spec_query(repo):
+    repo.query("cam_a", spec=True)
+    spec_path = os.path.join(repo.qdvc_dir, repo.FILTER_SPEC_FILE_NAME)
+    with open(spec_path, "w", encoding="utf-8") as f:
+        f.write('include: "images/a/*.jpg"\n')
+    repo.git_repo.git.add(spec_path)
+    repo.commit("cam_a")
+    repo.git_repo.heads.master.checkout()
+    repo.checkout("cam_a", "v2", download_files=False)
+    files = repo.git_repo.git.ls_tree("-r", "--name-only", "query/cam_a/v2").splitlines()
+    assert sorted(path for path in files if path.startswith("images/")) == [
+        "images/a/1.jpg.dvc",
+        "images/a/2.jpg.dvc",
+        "images/a/4.jpg.dvc",
+    ]